@@ -2,21 +2,28 @@
 API Routes for the Maintenance 4.0 Platform.
 """
 
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import ORJSONResponse
 from sqlalchemy import func
 from sqlalchemy.orm import Session
 
-from ..database import get_db
-from ..models.site import Site
-from ..models.asset import Asset
+from ..config import settings
+from ..database import get_db, get_read_db
 from ..models.alert import Alert
 from ..models.workorder import WorkOrder
+from ..models.forecast import RuntimeForecast
+from ..services.registry import catalog
+from ..services.forecasting import is_forecastable
+from ..services.backtest import BacktestUnavailable, policy_backtester, policy_variant
+from ..services.telemetry import telemetry_backend
 from ..schemas.schemas import (
     SiteResponse, SiteListResponse,
-    AssetResponse, AssetListResponse,
+    AssetResponse, AssetListResponse, TelemetryWindowResponse,
+    AssetForecastResponse, RuntimeForecastResponse,
+    BacktestAlertResponse, PolicyBacktestResponse,
     AlertResponse, AlertListResponse, AlertUpdate,
     WorkOrderResponse, WorkOrderListResponse, WorkOrderUpdate
 )
@@ -24,42 +31,97 @@ from ..schemas.schemas import (
 router = APIRouter(prefix="/api/v1", tags=["api"])
 
 
+# ============================================
+# List serialization helpers
+# ============================================
+
+# Column sets selected by the list endpoints. Together with the catalog
+# fields added by _asset_fields() each row maps 1:1 onto the matching
+# response schema, so rows can be serialized without building intermediate
+# Pydantic objects.
+ALERT_COLUMNS = (
+    Alert.id,
+    Alert.asset_id,
+    Alert.policy_id,
+    Alert.triggered_at,
+    Alert.severity,
+    Alert.status,
+    Alert.message,
+    Alert.metric_value,
+    Alert.acknowledged_at,
+    Alert.closed_at,
+)
+
+WORK_ORDER_COLUMNS = (
+    WorkOrder.id,
+    WorkOrder.alert_id,
+    WorkOrder.created_at,
+    WorkOrder.closed_at,
+    WorkOrder.status,
+    WorkOrder.priority,
+    WorkOrder.assigned_to,
+    WorkOrder.notes,
+    Alert.message.label("alert_message"),
+    Alert.severity.label("alert_severity"),
+    Alert.asset_id.label("alert_asset_id"),
+)
+
+
+def _asset_fields(asset_id: Optional[int]) -> dict:
+    """Asset and site identifiers for an asset, served from the catalog."""
+    asset = catalog.get_asset(asset_id) if asset_id is not None else None
+    site = catalog.get_site(asset.site_id) if asset else None
+    return {
+        "asset_code": asset.code if asset else None,
+        "asset_type": asset.type if asset else None,
+        "site_code": site.code if site else None,
+    }
+
+
+def _open_alert_counts(db: Session, asset_ids: Optional[list] = None) -> dict:
+    """Open alert counts keyed by (asset_id, severity)."""
+    query = db.query(
+        Alert.asset_id,
+        Alert.severity,
+        func.count(Alert.id)
+    ).filter(Alert.status == "open")
+    if asset_ids is not None:
+        query = query.filter(Alert.asset_id.in_(asset_ids))
+    rows = query.group_by(Alert.asset_id, Alert.severity).all()
+    return {(asset_id, severity): count for asset_id, severity, count in rows}
+
+
+def _list_response(schema, key: str, items: list, total: int):
+    """
+    Build a list endpoint response from plain row dicts.
+    
+    In fast serialization mode the rows are encoded directly with orjson and
+    returned as a Response, so FastAPI skips response_model validation.
+    Otherwise the rows go through the Pydantic schema as before.
+    """
+    if settings.fast_serialization:
+        return ORJSONResponse({key: items, "total": total})
+    return schema(**{key: items, "total": total})
+
+
 # ============================================
 # Sites Endpoints
 # ============================================
 
 @router.get("/sites", response_model=SiteListResponse)
-def get_sites(db: Session = Depends(get_db)):
+def get_sites(db: Session = Depends(get_read_db)):
     """Get all sites with alert counts."""
     
-    # Query sites with aggregated alert counts
-    sites = db.query(Site).all()
+    # Open alert counts in one grouped query, rolled up per site
+    open_counts = _open_alert_counts(db)
     
     result = []
-    for site in sites:
-        # Count assets
-        total_assets = db.query(Asset).filter(Asset.site_id == site.id).count()
-        
-        # Count open alerts by severity
-        asset_ids = [a.id for a in db.query(Asset.id).filter(Asset.site_id == site.id).all()]
-        
-        high_alerts = db.query(Alert).filter(
-            Alert.asset_id.in_(asset_ids),
-            Alert.status == "open",
-            Alert.severity == "HIGH"
-        ).count() if asset_ids else 0
-        
-        medium_alerts = db.query(Alert).filter(
-            Alert.asset_id.in_(asset_ids),
-            Alert.status == "open",
-            Alert.severity == "MEDIUM"
-        ).count() if asset_ids else 0
-        
-        low_alerts = db.query(Alert).filter(
-            Alert.asset_id.in_(asset_ids),
-            Alert.status == "open",
-            Alert.severity == "LOW"
-        ).count() if asset_ids else 0
+    for site in catalog.get_sites():
+        assets = catalog.get_site_assets(site.id)
+        counts = {"HIGH": 0, "MEDIUM": 0, "LOW": 0}
+        for asset in assets:
+            for severity in counts:
+                counts[severity] += open_counts.get((asset.id, severity), 0)
         
         result.append(SiteResponse(
             id=site.id,
@@ -67,31 +129,29 @@ def get_sites(db: Session = Depends(get_db)):
             name=site.name,
             address=site.address,
             created_at=site.created_at,
-            total_assets=total_assets,
-            high_alerts=high_alerts,
-            medium_alerts=medium_alerts,
-            low_alerts=low_alerts
+            total_assets=len(assets),
+            high_alerts=counts["HIGH"],
+            medium_alerts=counts["MEDIUM"],
+            low_alerts=counts["LOW"]
         ))
     
     return SiteListResponse(sites=result, total=len(result))
 
 
 @router.get("/sites/{site_id}", response_model=SiteResponse)
-def get_site(site_id: int, db: Session = Depends(get_db)):
+def get_site(site_id: int):
     """Get a specific site by ID."""
-    site = db.query(Site).filter(Site.id == site_id).first()
+    site = catalog.get_site(site_id)
     if not site:
         raise HTTPException(status_code=404, detail="Site not found")
     
-    total_assets = db.query(Asset).filter(Asset.site_id == site.id).count()
-    
     return SiteResponse(
         id=site.id,
         code=site.code,
         name=site.name,
         address=site.address,
         created_at=site.created_at,
-        total_assets=total_assets,
+        total_assets=len(catalog.get_site_assets(site.id)),
         high_alerts=0,
         medium_alerts=0,
         low_alerts=0
@@ -99,34 +159,33 @@ def get_site(site_id: int, db: Session = Depends(get_db)):
 
 
 @router.get("/sites/{site_id}/assets", response_model=AssetListResponse)
-def get_site_assets(site_id: int, db: Session = Depends(get_db)):
+def get_site_assets(site_id: int, db: Session = Depends(get_read_db)):
     """Get all assets for a specific site."""
-    site = db.query(Site).filter(Site.id == site_id).first()
+    site = catalog.get_site(site_id)
     if not site:
         raise HTTPException(status_code=404, detail="Site not found")
     
-    assets = db.query(Asset).filter(Asset.site_id == site_id).all()
+    assets = catalog.get_site_assets(site_id)
+    open_alerts = {}
+    if assets:
+        for (asset_id, _), count in _open_alert_counts(db, [a.id for a in assets]).items():
+            open_alerts[asset_id] = open_alerts.get(asset_id, 0) + count
     
     result = []
     for asset in assets:
-        open_alerts = db.query(Alert).filter(
-            Alert.asset_id == asset.id,
-            Alert.status == "open"
-        ).count()
-        
-        result.append(AssetResponse(
-            id=asset.id,
-            code=asset.code,
-            type=asset.type,
-            status=asset.status,
-            site_id=asset.site_id,
-            site_code=site.code,
-            site_name=site.name,
-            created_at=asset.created_at,
-            open_alerts=open_alerts
-        ))
+        result.append({
+            "id": asset.id,
+            "code": asset.code,
+            "type": asset.type,
+            "status": asset.status,
+            "site_id": asset.site_id,
+            "created_at": asset.created_at,
+            "open_alerts": open_alerts.get(asset.id, 0),
+            "site_code": site.code,
+            "site_name": site.name
+        })
     
-    return AssetListResponse(assets=result, total=len(result))
+    return _list_response(AssetListResponse, "assets", result, len(result))
 
 
 # ============================================
@@ -134,13 +193,13 @@ def get_site_assets(site_id: int, db: Session = Depends(get_db)):
 # ============================================
 
 @router.get("/assets/{asset_id}", response_model=AssetResponse)
-def get_asset(asset_id: int, db: Session = Depends(get_db)):
+def get_asset(asset_id: int, db: Session = Depends(get_read_db)):
     """Get a specific asset by ID."""
-    asset = db.query(Asset).filter(Asset.id == asset_id).first()
+    asset = catalog.get_asset(asset_id)
     if not asset:
         raise HTTPException(status_code=404, detail="Asset not found")
     
-    site = db.query(Site).filter(Site.id == asset.site_id).first()
+    site = catalog.get_site(asset.site_id)
     open_alerts = db.query(Alert).filter(
         Alert.asset_id == asset.id,
         Alert.status == "open"
@@ -159,6 +218,131 @@ def get_asset(asset_id: int, db: Session = Depends(get_db)):
     )
 
 
+@router.get("/assets/{asset_id}/telemetry", response_model=TelemetryWindowResponse)
+def get_asset_telemetry(
+    asset_id: int,
+    metric: str,
+    minutes: int = Query(60, ge=1, le=1440)
+):
+    """Get the recent samples of one metric of an asset."""
+    asset = catalog.get_asset(asset_id)
+    if not asset:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    
+    timestamps, values = telemetry_backend.get_metric_window(asset.code, metric, minutes)
+    return TelemetryWindowResponse(
+        asset_id=asset.id,
+        asset_code=asset.code,
+        metric=metric,
+        window_minutes=minutes,
+        timestamps=timestamps,
+        values=values
+    )
+
+
+@router.get("/assets/{asset_id}/forecast", response_model=AssetForecastResponse)
+def get_asset_forecast(asset_id: int, db: Session = Depends(get_read_db)):
+    """Get the predicted threshold crossings of an asset's runtime policies."""
+    asset = catalog.get_asset(asset_id)
+    if not asset:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    
+    rows = {
+        f.policy_id: f
+        for f in db.query(RuntimeForecast).filter(RuntimeForecast.asset_id == asset.id).all()
+    }
+    now = datetime.utcnow()
+    
+    forecasts = []
+    for policy in catalog.get_active_policies(asset.type):
+        if not is_forecastable(policy):
+            continue
+        forecast = rows.get(policy.id)
+        predicted_at = forecast.predicted_at if forecast else None
+        forecasts.append(RuntimeForecastResponse(
+            policy_id=policy.id,
+            metric=policy.metric,
+            threshold=policy.threshold,
+            severity=policy.severity,
+            description=policy.description,
+            last_value=forecast.last_value if forecast else None,
+            last_reading_at=forecast.last_reading_at if forecast else None,
+            rate_per_hour=forecast.rate_per_hour if forecast else None,
+            predicted_at=predicted_at,
+            hours_remaining=max((predicted_at - now).total_seconds() / 3600, 0.0) if predicted_at else None,
+            next_check_at=forecast.next_check_at if forecast else None,
+            alert_id=forecast.alert_id if forecast else None
+        ))
+    
+    return AssetForecastResponse(asset_id=asset.id, asset_code=asset.code, forecasts=forecasts)
+
+
+# ============================================
+# Policies Endpoints
+# ============================================
+
+def _utc(value: datetime) -> datetime:
+    """Naive UTC datetime, as stored and indexed."""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+@router.get("/policies/{policy_id}/backtest", response_model=PolicyBacktestResponse)
+def backtest_policy(
+    policy_id: int,
+    start: datetime = Query(..., alias="from", description="Start of the replayed period"),
+    end: Optional[datetime] = Query(None, alias="to", description="End of the replayed period (default now)"),
+    threshold: Optional[float] = Query(None, description="Candidate threshold"),
+    condition: Optional[str] = Query(None, description="Candidate condition (>, <, >=, <=, =)"),
+    window_minutes: Optional[int] = Query(None, ge=1, description="Candidate window"),
+    expression: Optional[str] = Query(None, description="Candidate compound expression"),
+    interval: Optional[int] = Query(None, ge=10, le=86400, description="Evaluation interval in seconds"),
+    site_id: Optional[int] = Query(None, description="Filter by site ID"),
+    limit: int = Query(1000, le=10000)
+):
+    """Replay a policy, or a variant of it, over historical telemetry."""
+    policy = catalog.get_policy(policy_id)
+    if not policy:
+        raise HTTPException(status_code=404, detail="Policy not found")
+    
+    try:
+        variant = policy_variant(
+            policy,
+            threshold=threshold,
+            condition=condition,
+            window_minutes=window_minutes,
+            expression=expression
+        )
+        result = policy_backtester.run(
+            variant, _utc(start), _utc(end) if end else datetime.utcnow(), interval, site_id
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except BacktestUnavailable as e:
+        raise HTTPException(status_code=503, detail=f"Telemetry history unavailable: {e}")
+    
+    return PolicyBacktestResponse(
+        policy_id=policy.id,
+        rule_type=variant.rule_type,
+        metric=variant.metric,
+        threshold=variant.threshold,
+        condition=variant.condition,
+        window_minutes=variant.window_minutes,
+        expression=variant.expression,
+        severity=variant.severity,
+        start=result.start,
+        end=result.end,
+        interval_seconds=result.interval_seconds,
+        assets_evaluated=result.assets_evaluated,
+        evaluations=result.evaluations,
+        assets_alerted=len({alert.asset_id for alert in result.alerts}),
+        total=len(result.alerts),
+        alerts=[BacktestAlertResponse(**alert._asdict()) for alert in result.alerts[:limit]],
+        elapsed_ms=result.elapsed_ms
+    )
+
+
 # ============================================
 # Alerts Endpoints
 # ============================================
@@ -170,7 +354,7 @@ def get_alerts(
     site_id: Optional[int] = Query(None, description="Filter by site ID"),
     limit: int = Query(100, le=500),
     offset: int = Query(0),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get alerts with optional filters."""
     query = db.query(Alert)
@@ -180,34 +364,21 @@ def get_alerts(
     if severity:
         query = query.filter(Alert.severity == severity)
     if site_id:
-        asset_ids = [a.id for a in db.query(Asset.id).filter(Asset.site_id == site_id).all()]
+        asset_ids = [a.id for a in catalog.get_site_assets(site_id)]
         query = query.filter(Alert.asset_id.in_(asset_ids))
     
     total = query.count()
-    alerts = query.order_by(Alert.triggered_at.desc()).offset(offset).limit(limit).all()
+    rows = query.with_entities(*ALERT_COLUMNS).order_by(
+        Alert.triggered_at.desc()
+    ).offset(offset).limit(limit).all()
     
     result = []
-    for alert in alerts:
-        asset = db.query(Asset).filter(Asset.id == alert.asset_id).first()
-        site = db.query(Site).filter(Site.id == asset.site_id).first() if asset else None
-        
-        result.append(AlertResponse(
-            id=alert.id,
-            asset_id=alert.asset_id,
-            policy_id=alert.policy_id,
-            triggered_at=alert.triggered_at,
-            severity=alert.severity,
-            status=alert.status,
-            message=alert.message,
-            metric_value=alert.metric_value,
-            acknowledged_at=alert.acknowledged_at,
-            closed_at=alert.closed_at,
-            asset_code=asset.code if asset else None,
-            asset_type=asset.type if asset else None,
-            site_code=site.code if site else None
-        ))
+    for row in rows:
+        item = row._asdict()
+        item.update(_asset_fields(row.asset_id))
+        result.append(item)
     
-    return AlertListResponse(alerts=result, total=total)
+    return _list_response(AlertListResponse, "alerts", result, total)
 
 
 @router.patch("/alerts/{alert_id}", response_model=AlertResponse)
@@ -227,9 +398,6 @@ def update_alert(alert_id: int, update: AlertUpdate, db: Session = Depends(get_d
     db.commit()
     db.refresh(alert)
     
-    asset = db.query(Asset).filter(Asset.id == alert.asset_id).first()
-    site = db.query(Site).filter(Site.id == asset.site_id).first() if asset else None
-    
     return AlertResponse(
         id=alert.id,
         asset_id=alert.asset_id,
@@ -241,9 +409,7 @@ def update_alert(alert_id: int, update: AlertUpdate, db: Session = Depends(get_d
         metric_value=alert.metric_value,
         acknowledged_at=alert.acknowledged_at,
         closed_at=alert.closed_at,
-        asset_code=asset.code if asset else None,
-        asset_type=asset.type if asset else None,
-        site_code=site.code if site else None
+        **_asset_fields(alert.asset_id)
     )
 
 
@@ -256,7 +422,7 @@ def get_work_orders(
     status: Optional[str] = Query(None, description="Filter by status"),
     limit: int = Query(100, le=500),
     offset: int = Query(0),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get work orders with optional filters."""
     query = db.query(WorkOrder)
@@ -265,30 +431,19 @@ def get_work_orders(
         query = query.filter(WorkOrder.status == status)
     
     total = query.count()
-    work_orders = query.order_by(WorkOrder.created_at.desc()).offset(offset).limit(limit).all()
+    rows = query.with_entities(*WORK_ORDER_COLUMNS).outerjoin(
+        Alert, Alert.id == WorkOrder.alert_id
+    ).order_by(WorkOrder.created_at.desc()).offset(offset).limit(limit).all()
     
     result = []
-    for wo in work_orders:
-        alert = db.query(Alert).filter(Alert.id == wo.alert_id).first()
-        asset = db.query(Asset).filter(Asset.id == alert.asset_id).first() if alert else None
-        site = db.query(Site).filter(Site.id == asset.site_id).first() if asset else None
-        
-        result.append(WorkOrderResponse(
-            id=wo.id,
-            alert_id=wo.alert_id,
-            created_at=wo.created_at,
-            closed_at=wo.closed_at,
-            status=wo.status,
-            priority=wo.priority,
-            assigned_to=wo.assigned_to,
-            notes=wo.notes,
-            alert_message=alert.message if alert else None,
-            alert_severity=alert.severity if alert else None,
-            asset_code=asset.code if asset else None,
-            site_code=site.code if site else None
-        ))
+    for row in rows:
+        item = row._asdict()
+        fields = _asset_fields(item.pop("alert_asset_id"))
+        item["asset_code"] = fields["asset_code"]
+        item["site_code"] = fields["site_code"]
+        result.append(item)
     
-    return WorkOrderListResponse(work_orders=result, total=total)
+    return _list_response(WorkOrderListResponse, "work_orders", result, total)
 
 
 @router.patch("/workorders/{wo_id}", response_model=WorkOrderResponse)
@@ -311,8 +466,7 @@ def update_work_order(wo_id: int, update: WorkOrderUpdate, db: Session = Depends
     db.refresh(wo)
     
     alert = db.query(Alert).filter(Alert.id == wo.alert_id).first()
-    asset = db.query(Asset).filter(Asset.id == alert.asset_id).first() if alert else None
-    site = db.query(Site).filter(Site.id == asset.site_id).first() if asset else None
+    fields = _asset_fields(alert.asset_id if alert else None)
     
     return WorkOrderResponse(
         id=wo.id,
@@ -325,6 +479,6 @@ def update_work_order(wo_id: int, update: WorkOrderUpdate, db: Session = Depends
         notes=wo.notes,
         alert_message=alert.message if alert else None,
         alert_severity=alert.severity if alert else None,
-        asset_code=asset.code if asset else None,
-        site_code=site.code if site else None
+        asset_code=fields["asset_code"],
+        site_code=fields["site_code"]
     )
@@ -1,30 +1,89 @@
 """
 Database configuration and session management.
+
+Three connection pools are kept so that dashboard traffic and the rule
+engine cannot starve each other:
+
+- engine: background workers (rule engine, archival, catalog loads)
+- api_engine: API requests that write (PATCH endpoints)
+- read_engine: read-only API endpoints, routed to the replica when
+  DATABASE_READ_URL is set, otherwise a separate pool on the primary
+
+Services shared by both sides call service_engine() for reads that may
+lag (PostgreSQL telemetry), which returns read_engine while an API
+request is being served (see the api_request middleware in main.py), and
+primary_engine() for reads that are cached process-wide (the catalog),
+which stays on the primary but uses api_engine's pool in requests.
 """
 
+from contextvars import ContextVar
+
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 from .config import settings
 
-# Create engine
+# Worker engine (rule engine writes)
 engine = create_engine(
     settings.database_url,
     pool_pre_ping=True,
-    pool_size=5,
-    max_overflow=10
+    pool_size=settings.worker_pool_size,
+    max_overflow=settings.worker_max_overflow
+)
+
+# API engine (request-scoped writes)
+api_engine = create_engine(
+    settings.database_url,
+    pool_pre_ping=True,
+    pool_size=settings.api_pool_size,
+    max_overflow=settings.api_max_overflow,
+    pool_timeout=settings.api_pool_timeout
+)
+
+# Read-only API engine (replica if configured)
+read_engine = create_engine(
+    settings.database_read_url or settings.database_url,
+    pool_pre_ping=True,
+    pool_size=settings.read_pool_size,
+    max_overflow=settings.read_max_overflow,
+    pool_timeout=settings.api_pool_timeout,
+    execution_options={"postgresql_readonly": True}
 )
 
-# Create session factory
+# Create session factories
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ApiSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=api_engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 # Base class for models
 Base = declarative_base()
 
+# True while serving an API request (set by middleware)
+api_request: ContextVar[bool] = ContextVar("api_request", default=False)
+
+
+def service_engine():
+    """Engine for shared services: the read pool in API requests, the worker pool otherwise."""
+    return read_engine if api_request.get() else engine
+
+
+def primary_engine():
+    """Primary engine for shared services: the API pool in API requests, the worker pool otherwise."""
+    return api_engine if api_request.get() else engine
+
 
 def get_db():
     """Dependency to get database session."""
-    db = SessionLocal()
+    db = ApiSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_read_db():
+    """Dependency to get a read-only database session."""
+    db = ReadSessionLocal()
     try:
         yield db
     finally:
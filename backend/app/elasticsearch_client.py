@@ -1,10 +1,16 @@
 """
 Elasticsearch client for querying telemetry data.
+
+Telemetry indices store each metric once, as a metric_<name> doc-values
+field (see elasticsearch/templates/telemetry-template.json), sorted by
+asset_code and @timestamp. Queries therefore run entirely in filter
+context, read values from doc values rather than _source and skip
+total hit counting.
 """
 
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 from elasticsearch import Elasticsearch
 
@@ -12,6 +18,15 @@ from .config import settings
 
 logger = logging.getLogger(__name__)
 
+# Elasticsearch aggregation for each policy aggregation type
+ES_AGGREGATIONS = {"avg": "avg", "max": "max", "min": "min", "count": "value_count"}
+
+# Histogram buckets per request, below the default search.max_buckets (65536)
+HISTOGRAM_MAX_BUCKETS = 50000
+
+# Histogram of one series as columns: (bucket start epoch seconds, count, sum, min, max)
+Histogram = Tuple[List[float], List[int], List[float], List[float], List[float]]
+
 
 class ElasticsearchClient:
     """Client for interacting with Elasticsearch."""
@@ -68,13 +83,12 @@ class ElasticsearchClient:
             
             query = {
                 "size": 0,
+                "track_total_hits": False,
                 "query": {
                     "bool": {
-                        "must": [
-                            {"term": {"asset_code": asset_code}},
-                            {"range": {"@timestamp": {"gte": start_time.isoformat(), "lte": now.isoformat()}}}
-                        ],
                         "filter": [
+                            {"term": {"asset_code": asset_code}},
+                            {"range": {"@timestamp": {"gte": start_time.isoformat(), "lte": now.isoformat()}}},
                             {"exists": {"field": metric_field}}
                         ]
                     }
@@ -98,6 +112,138 @@ class ElasticsearchClient:
             logger.error(f"Error querying Elasticsearch: {e}")
             return None
     
+    def get_metric_aggregations(
+        self,
+        asset_codes: List[str],
+        metric: str,
+        window_minutes: int,
+        agg_type: str = "avg"
+    ) -> Dict[str, float]:
+        """
+        Get an aggregated metric value for many assets in one request.
+        
+        Returns:
+            Aggregated value by asset code, for assets with data
+        """
+        if not self.client or not asset_codes:
+            return {}
+        
+        try:
+            now = datetime.utcnow()
+            start_time = now - timedelta(minutes=window_minutes)
+            metric_field = f"metric_{metric}"
+            
+            query = {
+                "size": 0,
+                "track_total_hits": False,
+                "query": {
+                    "bool": {
+                        "filter": [
+                            {"terms": {"asset_code": asset_codes}},
+                            {"range": {"@timestamp": {"gte": start_time.isoformat(), "lte": now.isoformat()}}},
+                            {"exists": {"field": metric_field}}
+                        ]
+                    }
+                },
+                "aggs": {
+                    "by_asset": {
+                        "terms": {"field": "asset_code", "size": len(asset_codes)},
+                        "aggs": {"metric_agg": {agg_type: {"field": metric_field}}}
+                    }
+                }
+            }
+            
+            response = self.client.search(
+                index=settings.elasticsearch_index,
+                body=query
+            )
+            
+            buckets = response.get("aggregations", {}).get("by_asset", {}).get("buckets", [])
+            return {
+                bucket["key"]: bucket["metric_agg"]["value"]
+                for bucket in buckets
+                if bucket["metric_agg"].get("value") is not None
+            }
+            
+        except Exception as e:
+            logger.error(f"Error querying Elasticsearch: {e}")
+            return {}
+    
+    def get_asset_aggregates(
+        self,
+        asset_codes: List[str],
+        aggregates: List[Tuple[str, str]],
+        window_minutes: int
+    ) -> Dict[str, Dict[Tuple[str, str], float]]:
+        """
+        Get several (agg_type, metric) aggregates for many assets in one request.
+        
+        Used by compound policies: every metric the policies of an asset
+        type reference is computed by the same per-asset terms aggregation.
+        
+        Returns:
+            {asset_code: {(agg_type, metric): value}}, for assets with data
+        """
+        if not self.client or not asset_codes or not aggregates:
+            return {}
+        
+        try:
+            now = datetime.utcnow()
+            start_time = now - timedelta(minutes=window_minutes)
+            
+            names = {f"{agg_type}__{metric}": (agg_type, metric) for agg_type, metric in aggregates}
+            metric_aggs = {
+                name: {ES_AGGREGATIONS[agg_type]: {"field": f"metric_{metric}"}}
+                for name, (agg_type, metric) in names.items()
+            }
+            
+            query = {
+                "size": 0,
+                "track_total_hits": False,
+                "query": {
+                    "bool": {
+                        "filter": [
+                            {"terms": {"asset_code": asset_codes}},
+                            {"range": {"@timestamp": {"gte": start_time.isoformat(), "lte": now.isoformat()}}},
+                            {
+                                "bool": {
+                                    "should": [
+                                        {"exists": {"field": f"metric_{metric}"}}
+                                        for metric in {metric for _, metric in aggregates}
+                                    ],
+                                    "minimum_should_match": 1
+                                }
+                            }
+                        ]
+                    }
+                },
+                "aggs": {
+                    "by_asset": {
+                        "terms": {"field": "asset_code", "size": len(asset_codes)},
+                        "aggs": metric_aggs
+                    }
+                }
+            }
+            
+            response = self.client.search(
+                index=settings.elasticsearch_index,
+                body=query
+            )
+            
+            buckets = response.get("aggregations", {}).get("by_asset", {}).get("buckets", [])
+            return {
+                bucket["key"]: {
+                    key: bucket[name]["value"]
+                    for name, key in names.items()
+                    if bucket.get(name, {}).get("value") is not None
+                }
+                for bucket in buckets
+            }
+        
+        except Exception as e:
+            logger.error(f"Error querying Elasticsearch: {e}")
+            return {}
+    
     def get_recent_metric_values(
         self,
         asset_code: str,
@@ -123,18 +269,18 @@ class ElasticsearchClient:
             
             query = {
                 "size": count,
+                "track_total_hits": False,
                 "query": {
                     "bool": {
-                        "must": [
-                            {"term": {"asset_code": asset_code}}
-                        ],
                         "filter": [
+                            {"term": {"asset_code": asset_code}},
                             {"exists": {"field": metric_field}}
                         ]
                     }
                 },
                 "sort": [{"@timestamp": {"order": "desc"}}],
-                "_source": [metric_field]
+                "_source": False,
+                "docvalue_fields": [metric_field]
             }
             
             response = self.client.search(
@@ -144,9 +290,9 @@ class ElasticsearchClient:
             
             values = []
             for hit in response.get("hits", {}).get("hits", []):
-                value = hit.get("_source", {}).get(metric_field)
-                if value is not None:
-                    values.append(value)
+                value = hit.get("fields", {}).get(metric_field)
+                if value:
+                    values.append(value[0])
             
             return values
             
@@ -158,6 +304,170 @@ class ElasticsearchClient:
         """Get the latest value of a metric for an asset."""
         values = self.get_recent_metric_values(asset_code, metric, count=1)
         return values[0] if values else None
+    
+    def get_metric_window(
+        self,
+        asset_code: str,
+        metric: str,
+        window_minutes: int,
+        max_samples: int = 10000
+    ) -> Tuple[List[datetime], List[float]]:
+        """
+        Get the samples of a metric for an asset over a time window.
+        
+        Returns:
+            (timestamps, values), oldest first
+        """
+        if not self.client:
+            return [], []
+        
+        try:
+            metric_field = f"metric_{metric}"
+            start_time = datetime.utcnow() - timedelta(minutes=window_minutes)
+            
+            query = {
+                "size": max_samples,
+                "track_total_hits": False,
+                "query": {
+                    "bool": {
+                        "filter": [
+                            {"term": {"asset_code": asset_code}},
+                            {"range": {"@timestamp": {"gte": start_time.isoformat()}}},
+                            {"exists": {"field": metric_field}}
+                        ]
+                    }
+                },
+                "sort": [{"@timestamp": {"order": "asc"}}],
+                "_source": False,
+                "docvalue_fields": [{"field": "@timestamp", "format": "epoch_millis"}, metric_field]
+            }
+            
+            response = self.client.search(
+                index=settings.elasticsearch_index,
+                body=query
+            )
+            
+            timestamps = []
+            values = []
+            for hit in response.get("hits", {}).get("hits", []):
+                fields = hit.get("fields", {})
+                if fields.get(metric_field) and fields.get("@timestamp"):
+                    timestamps.append(datetime.utcfromtimestamp(float(fields["@timestamp"][0]) / 1000))
+                    values.append(fields[metric_field][0])
+            
+            return timestamps, values
+            
+        except Exception as e:
+            logger.error(f"Error querying Elasticsearch: {e}")
+            return [], []
+    
+    def get_metric_histograms(
+        self,
+        asset_codes: List[str],
+        metrics: List[str],
+        start: datetime,
+        end: datetime,
+        interval_seconds: int
+    ) -> Dict[str, Dict[str, Histogram]]:
+        """
+        Get per-bucket stats of several metrics for many assets over a period.
+        
+        Used by policy backtests: a date_histogram per asset (terms) with a
+        stats sub-aggregation per metric, so a month of history is read in a
+        few bulk requests. Assets and time are split across requests to stay
+        under HISTOGRAM_MAX_BUCKETS buckets each; buckets are aligned on
+        multiples of interval_seconds since the epoch.
+        
+        Unlike the other lookups, errors are raised: an unreachable cluster
+        must not look like a period without telemetry.
+        
+        Returns:
+            {asset_code: {metric: (starts, counts, sums, mins, maxs)}},
+            non-empty buckets only (order is not guaranteed across backends)
+        """
+        if not asset_codes or not metrics:
+            return {}
+        if not self.client:
+            raise ConnectionError("Elasticsearch is not connected")
+        
+        span = (end - start).total_seconds()
+        chunk_seconds = min(span, HISTOGRAM_MAX_BUCKETS * interval_seconds)
+        # Time buckets of a chunk, plus partial edge buckets and the terms bucket
+        buckets_per_asset = int(chunk_seconds // interval_seconds) + 3
+        per_request = max(1, HISTOGRAM_MAX_BUCKETS // buckets_per_asset)
+        
+        results: Dict[str, Dict[str, Histogram]] = {}
+        chunk_start = start
+        while chunk_start < end:
+            chunk_end = min(chunk_start + timedelta(seconds=chunk_seconds), end)
+            for i in range(0, len(asset_codes), per_request):
+                self._histogram_request(
+                    asset_codes[i:i + per_request], metrics, chunk_start, chunk_end, interval_seconds, results
+                )
+            chunk_start = chunk_end
+        return results
+    
+    def _histogram_request(
+        self,
+        asset_codes: List[str],
+        metrics: List[str],
+        start: datetime,
+        end: datetime,
+        interval_seconds: int,
+        results: Dict[str, Dict[str, Histogram]]
+    ):
+        """One bulk date_histogram request, merged into results."""
+        query = {
+            "size": 0,
+            "track_total_hits": False,
+            "query": {
+                "bool": {
+                    "filter": [
+                        {"terms": {"asset_code": asset_codes}},
+                        {"range": {"@timestamp": {"gte": start.isoformat(), "lt": end.isoformat()}}},
+                        {
+                            "bool": {
+                                "should": [{"exists": {"field": f"metric_{metric}"}} for metric in metrics],
+                                "minimum_should_match": 1
+                            }
+                        }
+                    ]
+                }
+            },
+            "aggs": {
+                "by_asset": {
+                    "terms": {"field": "asset_code", "size": len(asset_codes)},
+                    "aggs": {
+                        "over_time": {
+                            "date_histogram": {
+                                "field": "@timestamp",
+                                "fixed_interval": f"{interval_seconds}s",
+                                "min_doc_count": 1
+                            },
+                            "aggs": {metric: {"stats": {"field": f"metric_{metric}"}} for metric in metrics}
+                        }
+                    }
+                }
+            }
+        }
+        
+        response = self.client.search(
+            index=settings.elasticsearch_index,
+            body=query
+        )
+        
+        for asset_bucket in response.get("aggregations", {}).get("by_asset", {}).get("buckets", []):
+            series = results.setdefault(asset_bucket["key"], {})
+            for bucket in asset_bucket["over_time"]["buckets"]:
+                for metric in metrics:
+                    stats = bucket.get(metric, {})
+                    if stats.get("count"):
+                        columns = series.setdefault(metric, ([], [], [], [], []))
+                        columns[0].append(bucket["key"] / 1000)
+                        columns[1].append(stats["count"])
+                        columns[2].append(stats["sum"])
+                        columns[3].append(stats["min"])
+                        columns[4].append(stats["max"])
 
 
 # Singleton instance
@@ -4,16 +4,21 @@ Main FastAPI Application for Maintenance 4.0 Platform.
 
 import logging
 from contextlib import asynccontextmanager
+from datetime import datetime
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from apscheduler.schedulers.background import BackgroundScheduler
 
 from .config import settings
-from .database import engine, SessionLocal
+from .database import engine, api_engine, read_engine, SessionLocal, api_request
+from .profiling import install_profiling
 from .api.routes import router
 from .schemas.schemas import HealthResponse
 from .services.rule_engine import rule_engine
+from .services.archival import history_archiver
+from .services.registry import catalog
+from .services.hot_store import hot_store
 
 # Configure logging
 logging.basicConfig(
@@ -34,12 +39,27 @@ def run_rule_engine():
         logger.error(f"Rule engine error: {e}")
 
 
+def run_history_archival():
+    """Background task to archive closed alerts and work orders."""
+    try:
+        history_archiver.run()
+    except Exception as e:
+        logger.error(f"History archival error: {e}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan handler."""
     # Startup
     logger.info("Starting Maintenance 4.0 Backend...")
     
+    # Keep the catalog cache in sync with sites/assets/policies changes
+    catalog.start_listener()
+    
+    # Warm hot telemetry store, resumed from its files
+    if settings.hot_store_enabled:
+        hot_store.start()
+    
     # Start scheduler
     scheduler.add_job(
         run_rule_engine,
@@ -48,13 +68,24 @@ async def lifespan(app: FastAPI):
         id='rule_engine',
         replace_existing=True
     )
+    scheduler.add_job(
+        run_history_archival,
+        'interval',
+        hours=settings.archive_interval_hours,
+        id='history_archival',
+        replace_existing=True,
+        next_run_time=datetime.now()
+    )
     scheduler.start()
     logger.info(f"Rule engine scheduled every {settings.rule_engine_interval} seconds")
+    logger.info(f"History archival scheduled every {settings.archive_interval_hours} hours")
     
     yield
     
     # Shutdown
     scheduler.shutdown()
+    hot_store.stop()
+    catalog.stop_listener()
     logger.info("Maintenance 4.0 Backend stopped")
 
 
@@ -75,6 +106,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Catalog reloads (API pool) and telemetry reads (read pool) made while
+# serving a request stay off the worker pool of the rule engine
+@app.middleware("http")
+async def mark_api_request(request: Request, call_next):
+    token = api_request.set(True)
+    try:
+        return await call_next(request)
+    finally:
+        api_request.reset(token)
+
+# Opt-in request profiling and query tracking
+if settings.profiling_enabled:
+    install_profiling(app, [engine, api_engine, read_engine])
+
 # Include routers
 app.include_router(router)
 
@@ -16,7 +16,7 @@ class Alert(Base):
     id = Column(Integer, primary_key=True, index=True)
     asset_id = Column(Integer, ForeignKey("assets.id", ondelete="CASCADE"))
     policy_id = Column(Integer, ForeignKey("maintenance_policies.id", ondelete="SET NULL"), nullable=True)
-    triggered_at = Column(DateTime, default=func.now())
+    triggered_at = Column(DateTime, nullable=False, default=func.now())
     severity = Column(String(10), nullable=False)
     status = Column(String(10), default="open", index=True)
     message = Column(String, nullable=False)
@@ -0,0 +1,23 @@
+"""
+RuntimeForecast model.
+"""
+
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, func
+
+from ..database import Base
+
+
+class RuntimeForecast(Base):
+    """Predicted threshold crossing of a runtime policy for an asset."""
+    
+    __tablename__ = "runtime_forecasts"
+    
+    asset_id = Column(Integer, ForeignKey("assets.id", ondelete="CASCADE"), primary_key=True)
+    policy_id = Column(Integer, ForeignKey("maintenance_policies.id", ondelete="CASCADE"), primary_key=True)
+    last_value = Column(Float, nullable=False)
+    last_reading_at = Column(DateTime, nullable=False)
+    rate_per_hour = Column(Float, nullable=True)
+    predicted_at = Column(DateTime, nullable=True)
+    next_check_at = Column(DateTime, nullable=False)
+    alert_id = Column(Integer, nullable=True)  # pre-created forecast alert
+    updated_at = Column(DateTime, nullable=False, default=func.now(), onupdate=func.now())
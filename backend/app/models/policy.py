@@ -16,10 +16,12 @@ class MaintenancePolicy(Base):
     asset_type = Column(String(20), nullable=False, index=True)
     metric = Column(String(50), nullable=False)
     rule_type = Column(String(20), nullable=False)
-    threshold = Column(Float, nullable=False)
-    condition = Column(String(5), nullable=False)
+    threshold = Column(Float, nullable=True)
+    condition = Column(String(5), nullable=True)
     window_minutes = Column(Integer, nullable=True)
     severity = Column(String(10), nullable=False)
     description = Column(String, nullable=False)
     active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=func.now())
+    # Compound policies only (threshold/condition are then unused)
+    expression = Column(String, nullable=True)
@@ -2,7 +2,7 @@
 WorkOrder model.
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, func
+from sqlalchemy import Column, Integer, String, DateTime, func
 from sqlalchemy.orm import relationship
 
 from ..database import Base
@@ -14,8 +14,10 @@ class WorkOrder(Base):
     __tablename__ = "work_orders"
     
     id = Column(Integer, primary_key=True, index=True)
-    alert_id = Column(Integer, ForeignKey("alerts.id", ondelete="CASCADE"))
-    created_at = Column(DateTime, default=func.now())
+    # No foreign key: alerts is partitioned on triggered_at, so alerts.id is
+    # not unique on its own (see database/init.sql)
+    alert_id = Column(Integer, nullable=False, index=True)
+    created_at = Column(DateTime, nullable=False, default=func.now())
     closed_at = Column(DateTime, nullable=True)
     status = Column(String(20), default="open", index=True)
     priority = Column(String(10), default="MEDIUM")
@@ -23,4 +25,8 @@ class WorkOrder(Base):
     notes = Column(String, nullable=True)
     
     # Relationships
-    alert = relationship("Alert", backref="work_orders")
+    alert = relationship(
+        "Alert",
+        primaryjoin="foreign(WorkOrder.alert_id) == Alert.id",
+        backref="work_orders"
+    )
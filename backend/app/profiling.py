@@ -0,0 +1,202 @@
+"""
+Opt-in request profiling for the Maintenance 4.0 API.
+
+Two independent tools, both enabled with PROFILING_ENABLED=true:
+
+- A sampling profiler run for requests carrying the profiling header set
+  to PROFILING_TOKEN, or picked by PROFILING_SAMPLE_RATE. Stacks are written in the collapsed
+  ("folded") format read by flamegraph.pl, speedscope and inferno.
+- SQLAlchemy cursor hooks counting queries and query time per request,
+  logging statements slower than SLOW_QUERY_MS with their call site, and
+  flagging requests above QUERY_COUNT_WARN queries (N+1 patterns).
+"""
+
+import logging
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Optional
+
+from fastapi import FastAPI, Request
+from sqlalchemy import event
+from starlette.concurrency import run_in_threadpool
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# ============================================
+# Per-request query statistics
+# ============================================
+
+class QueryStats:
+    """Query counters for one request."""
+    
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+
+
+# Set by the middleware; the object is shared with the threadpool thread
+# running sync endpoints since Starlette copies the context
+_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def _call_site() -> str:
+    """First application frame outside this module issuing the query."""
+    for frame in reversed(traceback.extract_stack()):
+        if frame.filename.startswith(APP_DIR) and frame.filename != __file__:
+            return f"{os.path.relpath(frame.filename, APP_DIR)}:{frame.lineno} in {frame.name}"
+    return "unknown"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info["query_start_time"].pop()) * 1000
+    
+    stats = _query_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.total_ms += elapsed_ms
+    
+    if elapsed_ms >= settings.slow_query_ms:
+        logger.warning(
+            f"Slow query ({elapsed_ms:.1f} ms) at {_call_site()}: "
+            f"{' '.join(statement.split())}"
+        )
+
+
+def instrument_engine(engine):
+    """Attach the query hooks to an engine."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# ============================================
+# Sampling profiler
+# ============================================
+
+class StackSampler:
+    """
+    Samples the stacks of all other threads at a fixed interval.
+    
+    Sync endpoints run in the threadpool, not on the event loop thread,
+    so every thread is sampled. Concurrent requests show up in the output
+    as well; profile on an otherwise idle worker for clean results.
+    """
+    
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+    
+    def start(self):
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+    
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+    
+    def write_folded(self, path: str):
+        """Write the samples in collapsed stack format."""
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def _should_profile(request: Request) -> bool:
+    token = request.headers.get(settings.profiling_header)
+    if token and settings.profiling_token and secrets.compare_digest(token, settings.profiling_token):
+        return True
+    return settings.profiling_sample_rate > 0 and random.random() < settings.profiling_sample_rate
+
+
+def _profile_path(request: Request) -> str:
+    name = request.url.path.strip("/").replace("/", "_") or "root"
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    return os.path.join(settings.profiling_output_dir, f"{stamp}-{request.method}-{name}.folded")
+
+
+def _finish_profile(sampler: StackSampler, path: str):
+    """Stop the sampler and write its output (blocking: joins and writes a file)."""
+    sampler.stop()
+    sampler.write_folded(path)
+
+
+# ============================================
+# Installation
+# ============================================
+
+def install_profiling(app: FastAPI, engines):
+    """Install the profiling middleware and query hooks."""
+    os.makedirs(settings.profiling_output_dir, exist_ok=True)
+    
+    for engine in engines:
+        instrument_engine(engine)
+    
+    @app.middleware("http")
+    async def profiling_middleware(request: Request, call_next):
+        stats = QueryStats()
+        token = _query_stats.set(stats)
+        
+        sampler = None
+        if _should_profile(request):
+            sampler = StackSampler(settings.profiling_interval_ms / 1000)
+            sampler.start()
+        
+        start = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            _query_stats.reset(token)
+            if sampler is not None:
+                path = _profile_path(request)
+                # Off the event loop: the join waits up to one sampling interval
+                await run_in_threadpool(_finish_profile, sampler, path)
+                logger.info(f"Profile for {request.method} {request.url.path} written to {path}")
+        
+        response.headers["X-Query-Count"] = str(stats.count)
+        response.headers["X-Query-Time-Ms"] = f"{stats.total_ms:.1f}"
+        response.headers["X-Response-Time-Ms"] = f"{elapsed_ms:.1f}"
+        
+        if stats.count >= settings.query_count_warn:
+            logger.warning(
+                f"{request.method} {request.url.path} issued {stats.count} queries "
+                f"({stats.total_ms:.1f} ms in SQL, {elapsed_ms:.1f} ms total)"
+            )
+        
+        return response
+    
+    logger.info(
+        f"Profiling enabled (header={settings.profiling_header} "
+        f"{'with token' if settings.profiling_token else 'disabled, no PROFILING_TOKEN'}, "
+        f"sample_rate={settings.profiling_sample_rate}, slow_query_ms={settings.slow_query_ms})"
+    )
@@ -68,6 +68,73 @@ class AssetListResponse(BaseModel):
     total: int
 
 
+class TelemetryWindowResponse(BaseModel):
+    """Response schema for the samples of one asset metric."""
+    asset_id: int
+    asset_code: str
+    metric: str
+    window_minutes: int
+    timestamps: List[datetime]
+    values: List[float]
+
+
+class RuntimeForecastResponse(BaseModel):
+    """Predicted threshold crossing of a runtime policy."""
+    policy_id: int
+    metric: str
+    threshold: float
+    severity: str
+    description: str
+    last_value: Optional[float] = None
+    last_reading_at: Optional[datetime] = None
+    rate_per_hour: Optional[float] = None
+    predicted_at: Optional[datetime] = None
+    hours_remaining: Optional[float] = None
+    next_check_at: Optional[datetime] = None
+    alert_id: Optional[int] = None
+
+
+class AssetForecastResponse(BaseModel):
+    """Response schema for the runtime forecasts of an asset."""
+    asset_id: int
+    asset_code: str
+    forecasts: List[RuntimeForecastResponse]
+
+
+# ============================================
+# Policy Schemas
+# ============================================
+
+class BacktestAlertResponse(BaseModel):
+    """Alert a policy would have produced during a backtest."""
+    asset_id: int
+    asset_code: str
+    triggered_at: datetime
+    cleared_at: Optional[datetime] = None
+    metric_value: Optional[float] = None
+
+
+class PolicyBacktestResponse(BaseModel):
+    """Response schema for a policy backtest (replayed policy and its alerts)."""
+    policy_id: int
+    rule_type: str
+    metric: str
+    threshold: Optional[float] = None
+    condition: Optional[str] = None
+    window_minutes: Optional[int] = None
+    expression: Optional[str] = None
+    severity: str
+    start: datetime
+    end: datetime
+    interval_seconds: int
+    assets_evaluated: int
+    evaluations: int
+    assets_alerted: int
+    total: int
+    alerts: List[BacktestAlertResponse]
+    elapsed_ms: float
+
+
 # ============================================
 # Alert Schemas
 # ============================================
@@ -0,0 +1,93 @@
+"""
+Statistical anomaly scoring for the rule engine.
+
+zscore policies compare each asset against its own history instead of a
+fixed limit: every cycle the windowed average of the policy metric is
+scored against an exponentially weighted (EWMA) mean and variance kept per
+asset, and the policy threshold/condition apply to the resulting z-score
+(e.g. threshold 3.0 with '>' flags values three deviations above normal).
+
+Baselines live in NumPy arrays aligned with the assets of the policy type,
+so a whole fleet is scored and updated in a handful of array operations.
+They are kept in memory and rebuilt after a restart (scoring starts once
+an asset has ANOMALY_MIN_SAMPLES cycles of history).
+"""
+
+import logging
+from typing import List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Policy conditions as element-wise comparisons (NaN never matches)
+CONDITIONS = {
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+    "=": np.equal,
+}
+
+# Lower bound on the baseline deviation, for perfectly flat series
+MIN_STD = 1e-6
+
+
+class EwmaBaseline:
+    """EWMA mean/variance of one policy metric for every asset of a type."""
+    
+    def __init__(self, alpha: float, min_samples: int):
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self.asset_ids: List[int] = []
+        self.mean = np.zeros(0)
+        self.var = np.zeros(0)
+        self.count = np.zeros(0, dtype=np.int64)
+    
+    def align(self, asset_ids: List[int]):
+        """Reorder the arrays to match asset_ids; new assets start empty."""
+        if asset_ids == self.asset_ids:
+            return
+        position = {asset_id: i for i, asset_id in enumerate(self.asset_ids)}
+        old = np.array([position.get(asset_id, -1) for asset_id in asset_ids], dtype=np.int64)
+        known = old >= 0
+        
+        mean = np.zeros(len(asset_ids))
+        var = np.zeros(len(asset_ids))
+        count = np.zeros(len(asset_ids), dtype=np.int64)
+        mean[known] = self.mean[old[known]]
+        var[known] = self.var[old[known]]
+        count[known] = self.count[old[known]]
+        
+        self.asset_ids = list(asset_ids)
+        self.mean, self.var, self.count = mean, var, count
+    
+    def score(self, asset_ids: List[int], values: np.ndarray, limit: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score values (NaN = no data) against the baselines, then fold them in.
+        
+        Returns (z-scores, scored mask); z is NaN for assets without data or
+        with fewer than min_samples cycles of history. Values beyond `limit`
+        deviations are clipped before updating, so an ongoing fault keeps
+        scoring high while a lasting level shift is still learned.
+        """
+        self.align(asset_ids)
+        present = ~np.isnan(values)
+        std = np.maximum(np.sqrt(self.var), MIN_STD)
+        scored = present & (self.count >= self.min_samples)
+        
+        z = np.full(len(values), np.nan)
+        z[scored] = (values[scored] - self.mean[scored]) / std[scored]
+        
+        # Plain running mean/variance (weight 1/n) until the EWMA weight
+        # takes over, so young baselines do not underestimate the variance
+        alpha = np.maximum(self.alpha, 1.0 / (self.count[present] + 1))
+        bound = abs(limit) * std
+        x = np.where(scored, np.clip(values, self.mean - bound, self.mean + bound), values)
+        diff = x[present] - self.mean[present]
+        increment = alpha * diff
+        self.mean[present] += increment
+        self.var[present] = (1 - alpha) * (self.var[present] + diff * increment)
+        self.count[present] += 1
+        
+        return z, scored
@@ -0,0 +1,65 @@
+"""
+History archival for the Maintenance 4.0 Platform.
+
+Moves closed alerts and finished work orders older than the retention age
+out of the hot monthly partitions into the archive tables, so the indexes
+used by the rule engine and the dashboard only cover recent history.
+Daily partitions of the optional PostgreSQL telemetry table are created
+ahead and dropped past TELEMETRY_RETENTION_DAYS. The partition logic
+itself lives in database/init.sql.
+"""
+
+import logging
+
+from sqlalchemy import text
+
+from ..config import settings
+from ..database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryArchiver:
+    """Maintains alert/work order partitions and archives closed history."""
+    
+    def __init__(self):
+        self.logger = logging.getLogger(self.__class__.__name__)
+    
+    def run(self):
+        """Create upcoming hot partitions and archive closed history."""
+        db = SessionLocal()
+        try:
+            db.execute(
+                text("SELECT ensure_hot_partitions(:months)"),
+                {"months": settings.partition_months_ahead}
+            )
+            
+            db.execute(text("SELECT ensure_telemetry_partitions(2)"))
+            telemetry_dropped = db.execute(
+                text("SELECT drop_telemetry_partitions(make_interval(days => :days))"),
+                {"days": settings.telemetry_retention_days}
+            ).scalar()
+            
+            result = db.execute(
+                text("SELECT * FROM archive_closed_history(make_interval(days => :days))"),
+                {"days": settings.archive_retention_days}
+            ).one()
+            db.commit()
+            
+            self.logger.info(
+                f"Archived {result.alerts_archived} alerts and "
+                f"{result.work_orders_archived} work orders older than "
+                f"{settings.archive_retention_days} days, "
+                f"dropped {result.partitions_dropped} empty partitions "
+                f"and {telemetry_dropped} expired telemetry partitions"
+            )
+            
+        except Exception as e:
+            self.logger.error(f"Error during history archival: {e}")
+            db.rollback()
+        finally:
+            db.close()
+
+
+# Singleton instance
+history_archiver = HistoryArchiver()
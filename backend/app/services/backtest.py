@@ -0,0 +1,284 @@
+"""
+Policy backtesting over historical telemetry.
+
+Replays a maintenance policy, or a candidate variant with another
+threshold, condition, window or expression, over a past period and
+returns the alerts it would have produced. History is not queried
+minute by minute: one bulk date_histogram per batch of assets
+(get_metric_histograms) returns count/sum/min/max per interval bucket, and
+the rule engine's windowed lookups are rebuilt from those buckets with
+NumPy rolling sums and sliding windows.
+
+Each bucket end is one evaluation cycle (interval_seconds, by default
+BACKTEST_INTERVAL_SECONDS; pass RULE_ENGINE_INTERVAL to replay the live
+cadence exactly, at the cost of more buckets); windows are rounded up to
+whole buckets. Latest
+value lookups (no window, runtime counters) use the last non-empty bucket:
+its average, or its maximum for counters. An alert is counted each time a
+violation starts on an asset, as if the previous one had been closed when
+the condition cleared. Runtime forecast pre-alerts are not replayed.
+"""
+
+import logging
+import math
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from sqlalchemy.engine import Row
+
+from ..config import settings
+from .anomaly import CONDITIONS, EwmaBaseline
+from .compound import compile_expression
+from .registry import catalog
+from .telemetry import telemetry_backend
+
+logger = logging.getLogger(__name__)
+
+# Rule types a backtest can replay
+BACKTEST_RULE_TYPES = {"threshold", "runtime", "rate_of_change", "zscore", "compound"}
+
+# Policy fields a candidate variant can override
+VARIANT_FIELDS = ("threshold", "condition", "window_minutes", "expression")
+
+BacktestAlert = namedtuple(
+    "BacktestAlert", ["asset_id", "asset_code", "triggered_at", "cleared_at", "metric_value"]
+)
+
+BacktestResult = namedtuple(
+    "BacktestResult",
+    ["policy", "start", "end", "interval_seconds", "assets_evaluated", "evaluations", "alerts", "elapsed_ms"]
+)
+
+
+class BacktestUnavailable(Exception):
+    """Telemetry history could not be read."""
+
+
+def policy_variant(policy: Row, **overrides) -> Row:
+    """Copy of a policy row with some VARIANT_FIELDS replaced (None = keep)."""
+    values = policy._asdict()
+    for field, value in overrides.items():
+        if field not in VARIANT_FIELDS:
+            raise ValueError(f"Unknown policy field: {field}")
+        if value is not None:
+            values[field] = value
+    return namedtuple("Policy", values)(**values)
+
+
+def _epoch(dt: datetime) -> float:
+    """Epoch seconds of a naive UTC datetime."""
+    return dt.replace(tzinfo=timezone.utc).timestamp()
+
+
+class _Buckets:
+    """Dense per-bucket stats of one metric for a batch of assets."""
+    
+    def __init__(self, assets: int, buckets: int):
+        self.count = np.zeros((assets, buckets))
+        self.sum = np.zeros((assets, buckets))
+        self.min = np.full((assets, buckets), np.inf)
+        self.max = np.full((assets, buckets), -np.inf)
+    
+    def fill(self, row: int, histogram: Optional[tuple], start: float, interval: int):
+        """Place an asset's (starts, counts, sums, mins, maxs) histogram columns."""
+        if not histogram:
+            return
+        starts, counts, sums, mins, maxs = (np.asarray(column, dtype=float) for column in histogram)
+        index = ((starts - start) // interval).astype(np.int64)
+        keep = (index >= 0) & (index < self.count.shape[1])
+        index = index[keep]
+        self.count[row, index] = counts[keep]
+        self.sum[row, index] = sums[keep]
+        self.min[row, index] = mins[keep]
+        self.max[row, index] = maxs[keep]
+    
+    def rolling(self, agg: str, n: int) -> np.ndarray:
+        """Aggregate over the last n buckets at each bucket (NaN without samples)."""
+        count = self._rolling_sum(self.count, n)
+        if agg == "count":
+            return count
+        if agg == "avg":
+            with np.errstate(invalid="ignore", divide="ignore"):
+                value = self._rolling_sum(self.sum, n) / count
+        else:
+            source = self.max if agg == "max" else self.min
+            fill = np.full((source.shape[0], n - 1), -np.inf if agg == "max" else np.inf)
+            padded = np.concatenate([fill, source], axis=1)
+            windows = sliding_window_view(padded, n, axis=1)
+            value = windows.max(axis=2) if agg == "max" else windows.min(axis=2)
+        return np.where(count > 0, value, np.nan)
+    
+    def latest(self, agg: str) -> np.ndarray:
+        """Value of the last non-empty bucket at each bucket (NaN before the first)."""
+        buckets = self.count.shape[1]
+        if agg == "max":
+            value = self.max
+        else:
+            with np.errstate(invalid="ignore", divide="ignore"):
+                value = self.sum / self.count
+        last = np.maximum.accumulate(np.where(self.count > 0, np.arange(buckets), -1), axis=1)
+        filled = np.take_along_axis(value, np.maximum(last, 0), axis=1)
+        return np.where(last >= 0, filled, np.nan)
+    
+    @staticmethod
+    def _rolling_sum(values: np.ndarray, n: int) -> np.ndarray:
+        totals = np.concatenate([np.zeros((values.shape[0], 1)), np.cumsum(values, axis=1)], axis=1)
+        upper = np.arange(1, values.shape[1] + 1)
+        return totals[:, upper] - totals[:, np.maximum(upper - n, 0)]
+
+
+class PolicyBacktester:
+    """Replays policies over historical telemetry."""
+    
+    def __init__(self):
+        self.logger = logging.getLogger(self.__class__.__name__)
+    
+    def run(
+        self,
+        policy: Row,
+        start: datetime,
+        end: datetime,
+        interval_seconds: Optional[int] = None,
+        site_id: Optional[int] = None
+    ) -> BacktestResult:
+        """
+        Alerts a policy would have produced between start and end (naive UTC).
+        
+        Raises ValueError for an unsupported rule type, an invalid expression
+        or condition, a period longer than BACKTEST_MAX_DAYS or more than
+        BACKTEST_MAX_CYCLES evaluation cycles, and BacktestUnavailable when
+        the telemetry backend fails.
+        """
+        started = time.perf_counter()
+        if policy.rule_type not in BACKTEST_RULE_TYPES:
+            raise ValueError(f"Rule type {policy.rule_type!r} cannot be backtested")
+        if end <= start:
+            raise ValueError("Backtest period is empty")
+        if end - start > timedelta(days=settings.backtest_max_days):
+            raise ValueError(f"Backtest period exceeds {settings.backtest_max_days} days")
+        
+        expression = None
+        if policy.rule_type == "compound":
+            expression = compile_expression(policy.expression or "")
+            metrics = sorted(expression.metrics)
+        else:
+            if policy.condition not in CONDITIONS or policy.threshold is None:
+                raise ValueError(f"Invalid condition {policy.condition!r} or threshold {policy.threshold!r}")
+            metrics = [policy.metric]
+        
+        interval = int(interval_seconds or settings.backtest_interval_seconds)
+        # Align on the histogram buckets (multiples of the interval since the epoch)
+        first = math.floor(_epoch(start) / interval) * interval
+        buckets = max(1, math.floor((_epoch(end) - first) / interval))
+        if buckets > settings.backtest_max_cycles:
+            raise ValueError(
+                f"Backtest needs {buckets} cycles, more than {settings.backtest_max_cycles}: "
+                f"use a longer interval or a shorter period"
+            )
+        aligned_start = datetime.utcfromtimestamp(first)
+        aligned_end = datetime.utcfromtimestamp(first + buckets * interval)
+        
+        assets = catalog.get_assets(policy.asset_type)
+        if site_id is not None:
+            assets = [asset for asset in assets if asset.site_id == site_id]
+        
+        alerts: List[BacktestAlert] = []
+        # Bound the dense per-batch arrays whatever the number of cycles
+        batch_size = max(1, min(settings.backtest_batch_assets, settings.backtest_max_cells // buckets))
+        for i in range(0, len(assets), batch_size):
+            batch = assets[i:i + batch_size]
+            try:
+                histograms = telemetry_backend.get_metric_histograms(
+                    [asset.code for asset in batch], metrics, aligned_start, aligned_end, interval
+                )
+            except Exception as e:
+                self.logger.error(f"Error reading telemetry history: {e}")
+                raise BacktestUnavailable(str(e)) from e
+            stats: Dict[str, _Buckets] = {}
+            for metric in metrics:
+                stats[metric] = _Buckets(len(batch), buckets)
+                for row, asset in enumerate(batch):
+                    stats[metric].fill(row, histograms.get(asset.code, {}).get(metric), first, interval)
+            
+            values, violated = self._evaluate(policy, expression, batch, stats, interval)
+            alerts.extend(self._episodes(batch, values, violated, first, interval))
+        
+        alerts.sort(key=lambda alert: (alert.triggered_at, alert.asset_code))
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.logger.info(
+            f"Backtested policy {policy.id} on {len(assets)} assets x {buckets} cycles: "
+            f"{len(alerts)} alerts in {elapsed_ms:.0f} ms"
+        )
+        return BacktestResult(policy, aligned_start, aligned_end, interval, len(assets), buckets, alerts, elapsed_ms)
+    
+    def _evaluate(self, policy: Row, expression, batch: List[Row], stats: Dict[str, _Buckets], interval: int):
+        """(values, violated) arrays of shape (assets, cycles) for one batch."""
+        window = int(policy.window_minutes or 0)
+        # Windowed lookups of the rule engine default to 5 minutes
+        span = max(1, math.ceil((window or 5) * 60 / interval))
+        
+        if expression is not None:
+            terms = sorted(expression.terms)
+            aggregates = {term: stats[term.metric].rolling(term.agg, span) for term in terms}
+            has_data = np.logical_or.reduce([buckets.rolling("count", span) > 0 for buckets in stats.values()])
+            return aggregates[terms[0]], expression.mask(aggregates) & has_data
+        
+        metric = stats[policy.metric]
+        compare = CONDITIONS[policy.condition]
+        if policy.rule_type == "threshold":
+            values = metric.rolling("avg", span) if window > 0 else metric.latest("avg")
+        elif policy.rule_type == "runtime":
+            values = metric.latest("max")
+        elif policy.rule_type == "rate_of_change":
+            values = metric.rolling("max", span)
+        else:
+            # zscore: score each cycle against baselines built over the period
+            values = metric.rolling("avg", span)
+            baseline = EwmaBaseline(settings.anomaly_ewma_alpha, settings.anomaly_min_samples)
+            asset_ids = [asset.id for asset in batch]
+            violated = np.zeros(values.shape, dtype=bool)
+            for cycle in range(values.shape[1]):
+                z, scored = baseline.score(asset_ids, values[:, cycle], policy.threshold)
+                violated[:, cycle] = scored & compare(z, policy.threshold)
+            return values, violated
+        
+        return values, compare(values, policy.threshold)
+    
+    def _episodes(
+        self,
+        batch: List[Row],
+        values: np.ndarray,
+        violated: np.ndarray,
+        first: float,
+        interval: int
+    ) -> List[BacktestAlert]:
+        """One alert per violation episode, triggered at the cycle it starts."""
+        padded = np.concatenate([np.zeros((len(batch), 1), dtype=bool), violated], axis=1)
+        starts = padded[:, 1:] & ~padded[:, :-1]
+        ends = ~padded[:, 1:] & padded[:, :-1]
+        
+        alerts = []
+        for row in np.flatnonzero(starts.any(axis=1)).tolist():
+            asset = batch[row]
+            cleared = np.flatnonzero(ends[row]).tolist()
+            for n, cycle in enumerate(np.flatnonzero(starts[row]).tolist()):
+                value = values[row, cycle]
+                alerts.append(BacktestAlert(
+                    asset_id=asset.id,
+                    asset_code=asset.code,
+                    triggered_at=datetime.utcfromtimestamp(first + (cycle + 1) * interval),
+                    cleared_at=(
+                        datetime.utcfromtimestamp(first + (cleared[n] + 1) * interval)
+                        if n < len(cleared) else None
+                    ),
+                    metric_value=float(value) if not np.isnan(value) else None
+                ))
+        return alerts
+
+
+# Singleton instance
+policy_backtester = PolicyBacktester()
@@ -0,0 +1,234 @@
+"""
+Compound (multi-metric) policy expressions.
+
+A compound policy stores a boolean expression over windowed aggregates of
+several metrics, e.g.
+
+    avg(temp_supply_air) > 20 AND avg(power_kw) > 14
+
+Grammar (keywords are case-insensitive):
+
+    expr       := and_expr ("OR" and_expr)*
+    and_expr   := not_expr ("AND" not_expr)*
+    not_expr   := "NOT" not_expr | "(" expr ")" | comparison
+    comparison := term op number
+    term       := agg "(" metric ")" | metric      (a bare metric means avg)
+    agg        := avg | max | min | count
+    op         := > | >= | < | <= | =
+
+All terms share the policy's window_minutes, so the aggregates every
+compound policy of an asset type needs are fetched with a single request
+(see get_asset_aggregates) and the expressions are evaluated in memory.
+A comparison on a metric without data is unknown, and unknowns propagate
+as in SQL (three-valued logic): NOT unknown is unknown, AND is false if any
+operand is false, OR is true if any operand is true. A policy fires only
+when its expression is true, so `NOT avg(x) > 5` does not fire for assets
+without x.
+"""
+
+import re
+from collections import namedtuple
+from typing import Dict, Optional, Set
+
+import numpy as np
+
+from .anomaly import CONDITIONS
+
+AGGREGATES = ("avg", "max", "min", "count")
+
+# (agg, metric) pair fetched for a compound policy
+Term = namedtuple("Term", ["agg", "metric"])
+
+# Expression tree nodes
+Comparison = namedtuple("Comparison", ["term", "op", "value"])
+Not = namedtuple("Not", ["operand"])
+And = namedtuple("And", ["operands"])
+Or = namedtuple("Or", ["operands"])
+
+_TOKEN = re.compile(r"\s*(?:(>=|<=|>|<|=)|(\()|(\))|(-?\d+(?:\.\d+)?)|([A-Za-z_][A-Za-z0-9_]*))")
+
+
+def _tokenize(text: str):
+    tokens = []
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if not match or match.end() == position:
+            raise ValueError(f"Unexpected character at {position} in {text!r}")
+        op, lparen, rparen, number, word = match.groups()
+        if op:
+            tokens.append(("op", op))
+        elif lparen:
+            tokens.append(("(", lparen))
+        elif rparen:
+            tokens.append((")", rparen))
+        elif number:
+            tokens.append(("number", float(number)))
+        else:
+            keyword = word.upper()
+            tokens.append((keyword, word) if keyword in ("AND", "OR", "NOT") else ("name", word))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    """Recursive descent parser for the grammar above."""
+    
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = _tokenize(text)
+        self.position = 0
+    
+    def _peek(self, offset: int = 0):
+        index = self.position + offset
+        return self.tokens[index][0] if index < len(self.tokens) else None
+    
+    def _take(self, kind: str):
+        if self._peek() != kind:
+            found = self.tokens[self.position][1] if self.position < len(self.tokens) else "end of expression"
+            raise ValueError(f"Expected {kind} but found {found!r} in {self.text!r}")
+        token = self.tokens[self.position]
+        self.position += 1
+        return token[1]
+    
+    def parse(self):
+        node = self._or()
+        if self.position != len(self.tokens):
+            raise ValueError(f"Unexpected {self.tokens[self.position][1]!r} in {self.text!r}")
+        return node
+    
+    def _or(self):
+        operands = [self._and()]
+        while self._peek() == "OR":
+            self._take("OR")
+            operands.append(self._and())
+        return operands[0] if len(operands) == 1 else Or(tuple(operands))
+    
+    def _and(self):
+        operands = [self._not()]
+        while self._peek() == "AND":
+            self._take("AND")
+            operands.append(self._not())
+        return operands[0] if len(operands) == 1 else And(tuple(operands))
+    
+    def _not(self):
+        if self._peek() == "NOT":
+            self._take("NOT")
+            return Not(self._not())
+        if self._peek() == "(":
+            self._take("(")
+            node = self._or()
+            self._take(")")
+            return node
+        return self._comparison()
+    
+    def _comparison(self):
+        name = self._take("name")
+        if self._peek() == "(":
+            agg = name.lower()
+            if agg not in AGGREGATES:
+                raise ValueError(f"Unknown aggregation {name!r} in {self.text!r}")
+            self._take("(")
+            metric = self._take("name")
+            self._take(")")
+        else:
+            agg, metric = "avg", name
+        op = self._take("op")
+        value = self._take("number")
+        return Comparison(Term(agg, metric), op, value)
+
+
+class CompoundExpression:
+    """Parsed compound policy expression."""
+    
+    def __init__(self, text: str):
+        self.text = text
+        self.tree = _Parser(text).parse()
+        self.terms: Set[Term] = set()
+        self._collect(self.tree)
+    
+    def _collect(self, node):
+        if isinstance(node, Comparison):
+            self.terms.add(node.term)
+        elif isinstance(node, Not):
+            self._collect(node.operand)
+        else:
+            for operand in node.operands:
+                self._collect(operand)
+    
+    @property
+    def metrics(self) -> Set[str]:
+        return {term.metric for term in self.terms}
+    
+    def evaluate(self, values: Dict[Term, float]) -> bool:
+        """Whether the expression holds (is true, not unknown) for one asset's aggregates."""
+        return self._evaluate(self.tree, values) is True
+    
+    def _evaluate(self, node, values) -> Optional[bool]:
+        """True, False or None (unknown)."""
+        if isinstance(node, Comparison):
+            value = values.get(node.term)
+            if value is None:
+                return None
+            return bool(CONDITIONS[node.op](value, node.value))
+        if isinstance(node, Not):
+            result = self._evaluate(node.operand, values)
+            return None if result is None else not result
+        results = [self._evaluate(operand, values) for operand in node.operands]
+        decisive = isinstance(node, Or)
+        if decisive in results:
+            return decisive
+        return None if None in results else not decisive
+    
+    def mask(self, values: Dict[Term, np.ndarray]) -> np.ndarray:
+        """Element-wise evaluate over arrays of aggregates (NaN = no data), for backtests."""
+        shape = np.shape(next(iter(values.values())))
+        return self._mask(self.tree, values, shape)[0]
+    
+    def _mask(self, node, values, shape):
+        """(true, false) masks; elements in neither are unknown."""
+        if isinstance(node, Comparison):
+            value = values.get(node.term)
+            if value is None:
+                return np.zeros(shape, dtype=bool), np.zeros(shape, dtype=bool)
+            with np.errstate(invalid="ignore"):
+                holds = CONDITIONS[node.op](value, node.value)
+            return holds, ~np.isnan(value) & ~holds
+        if isinstance(node, Not):
+            true, false = self._mask(node.operand, values, shape)
+            return false, true
+        masks = [self._mask(operand, values, shape) for operand in node.operands]
+        trues = [true for true, _ in masks]
+        falses = [false for _, false in masks]
+        if isinstance(node, And):
+            return np.logical_and.reduce(trues), np.logical_or.reduce(falses)
+        return np.logical_or.reduce(trues), np.logical_and.reduce(falses)
+    
+    def describe(self, values: Dict[Term, float]) -> str:
+        """Term values for alert messages, e.g. 'avg(power_kw)=15.20'."""
+        parts = []
+        for term in sorted(self.terms):
+            value = values.get(term)
+            shown = f"{value:.2f}" if value is not None else "n/a"
+            parts.append(f"{term.agg}({term.metric})={shown}")
+        return ", ".join(parts)
+
+
+_cache: Dict[str, CompoundExpression] = {}
+
+
+def compile_expression(text: str) -> CompoundExpression:
+    """Parse an expression, caching by text (raises ValueError when invalid)."""
+    expression = _cache.get(text)
+    if expression is None:
+        expression = _cache[text] = CompoundExpression(text)
+    return expression
+
+
+def first_value(expression: CompoundExpression, values: Dict[Term, float]) -> Optional[float]:
+    """Value of the first term with data, stored as the alert metric_value."""
+    for term in sorted(expression.terms):
+        if values.get(term) is not None:
+            return values[term]
+    return None
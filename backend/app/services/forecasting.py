@@ -0,0 +1,120 @@
+"""
+Remaining-useful-life forecasting for runtime policies.
+
+Runtime metrics (run_hours, door_cycles) are counters that only grow
+until maintenance resets them. Each reading the rule engine takes
+updates an exponentially weighted usage rate per asset/policy, from which
+the threshold crossing time is extrapolated and stored in
+runtime_forecasts.
+
+The forecast also schedules the next reading: halfway to the predicted
+crossing, at most FORECAST_REFRESH_MINUTES away, so a counter far from
+its limit is read a few times a day instead of every cycle and the
+checks tighten as the crossing approaches.
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy.engine import Row
+
+from ..config import settings
+from ..models.forecast import RuntimeForecast
+
+logger = logging.getLogger(__name__)
+
+# Conditions a growing counter eventually crosses
+FORECAST_CONDITIONS = {">", ">="}
+
+# Readings closer together than this do not update the rate
+MIN_RATE_INTERVAL_HOURS = 1 / 60
+
+
+def is_forecastable(policy: Row) -> bool:
+    """Whether a policy's crossing can be forecast from a usage rate."""
+    return policy.rule_type == "runtime" and policy.condition in FORECAST_CONDITIONS
+
+
+class RuntimeForecaster:
+    """Fits usage rates and predicts threshold crossings."""
+    
+    def __init__(self):
+        self.logger = logging.getLogger(self.__class__.__name__)
+    
+    def is_due(self, forecast: Optional[RuntimeForecast], now: datetime) -> bool:
+        """Whether the metric needs to be read this cycle."""
+        return forecast is None or forecast.next_check_at <= now
+    
+    def observe(
+        self,
+        forecast: Optional[RuntimeForecast],
+        asset: Row,
+        policy: Row,
+        value: float,
+        now: datetime
+    ) -> RuntimeForecast:
+        """Fold a reading into the forecast (created on the first reading)."""
+        if forecast is None:
+            forecast = RuntimeForecast(
+                asset_id=asset.id,
+                policy_id=policy.id,
+                last_value=value,
+                last_reading_at=now
+            )
+        else:
+            hours = (now - forecast.last_reading_at).total_seconds() / 3600
+            if value < forecast.last_value:
+                # Counter reset (maintenance done): start a new fit
+                self.logger.info(f"{asset.code}/{policy.metric} counter reset, restarting forecast")
+                forecast.rate_per_hour = None
+                forecast.alert_id = None
+                forecast.last_value = value
+                forecast.last_reading_at = now
+            elif hours >= MIN_RATE_INTERVAL_HOURS:
+                rate = (value - forecast.last_value) / hours
+                if forecast.rate_per_hour is None:
+                    forecast.rate_per_hour = rate
+                else:
+                    alpha = settings.forecast_rate_alpha
+                    forecast.rate_per_hour = alpha * rate + (1 - alpha) * forecast.rate_per_hour
+                forecast.last_value = value
+                forecast.last_reading_at = now
+        
+        forecast.predicted_at = self._predict(forecast, policy.threshold)
+        forecast.next_check_at = self._next_check(forecast, value, policy.threshold, now)
+        return forecast
+    
+    def _predict(self, forecast: RuntimeForecast, threshold: float) -> Optional[datetime]:
+        """Extrapolated threshold crossing time, None without usage."""
+        if forecast.last_value >= threshold:
+            return forecast.last_reading_at
+        if not forecast.rate_per_hour or forecast.rate_per_hour <= 0:
+            return None
+        hours = (threshold - forecast.last_value) / forecast.rate_per_hour
+        # A crossing more than a century away is as good as none
+        if hours > 24 * 365 * 100:
+            return None
+        return forecast.last_reading_at + timedelta(hours=hours)
+    
+    def _next_check(self, forecast: RuntimeForecast, value: float, threshold: float, now: datetime) -> datetime:
+        """When the metric should be read next."""
+        refresh = timedelta(minutes=settings.forecast_refresh_minutes)
+        if forecast.rate_per_hour is None:
+            # Second reading fits the first rate
+            return now + timedelta(seconds=settings.rule_engine_interval)
+        if value > threshold or forecast.predicted_at is None:
+            # Crossed (alert handled by the caller) or not moving
+            return now + refresh
+        return now + min((forecast.predicted_at - now) / 2, refresh)
+    
+    def is_imminent(self, forecast: RuntimeForecast, now: datetime) -> bool:
+        """Whether the crossing is predicted within FORECAST_LEAD_HOURS."""
+        return (
+            forecast.predicted_at is not None
+            and forecast.predicted_at - now <= timedelta(hours=settings.forecast_lead_hours)
+        )
+
+
+# Singleton instance
+runtime_forecaster = RuntimeForecaster()
@@ -0,0 +1,441 @@
+"""
+Memory-mapped hot telemetry store.
+
+Keeps the most recent samples of every asset/metric series in fixed-size
+ring buffers, fed directly from the Kafka telemetry topics. The rings are
+rows of a few contiguous arrays backed by memory-mapped files in
+HOT_STORE_DIR:
+
+- timestamps.f8: (max_series, capacity) sample times, epoch seconds
+- values.f4:     (max_series, capacity) metric values
+- writes.i8:     (max_series,) samples ever written per series; the next
+  sample goes to column writes % capacity
+- series.json:   row of each "asset_id/metric" series
+- state.json:    Kafka offsets applied to the arrays, and covered_since,
+  the time from which the store holds every sample (moved forward when a
+  ring evicts a newer sample or the feed has a gap)
+
+The arrays are flushed before the offsets are saved, so a restarted
+backend resumes consuming where it stopped with its history already on
+disk instead of re-querying Elasticsearch. A crash in between replays at
+most HOT_STORE_FLUSH_SECONDS of messages; samples not newer than the
+latest one of their ring are skipped, so replays do not duplicate.
+
+Readers get windows as views on the mapped arrays (copied only when a
+window wraps around the end of its ring).
+
+Only one process may feed a HOT_STORE_DIR: the store holds an exclusive
+lock (flock on a .lock file) while it is open. A process that finds the
+lock held (uvicorn --workers N, several replicas on one volume) does not
+start its feed; its empty store covers nothing, so every lookup goes to
+the wrapped backend.
+"""
+
+import fcntl
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import msgpack
+import numpy as np
+import orjson
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+LOCK_FILE = ".lock"
+
+
+class HotStoreLocked(Exception):
+    """HOT_STORE_DIR is held by another process."""
+
+
+def _sample_time(value: str) -> float:
+    """Epoch seconds for an ISO 8601 UTC timestamp."""
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+def _decode_record(record) -> dict:
+    """Decode a JSON or MessagePack bridge message, using its content-type header."""
+    headers = dict(record.headers or ())
+    if headers.get("content-type") == b"application/x-msgpack":
+        return msgpack.unpackb(record.value)
+    return orjson.loads(record.value)
+
+
+class HotTelemetryStore:
+    """Ring buffers of recent telemetry per asset/metric, in mapped files."""
+    
+    def __init__(self, path: str, capacity: int, max_series: int):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.path = path
+        self.capacity = capacity
+        self.max_series = max_series
+        self.timestamps = None
+        self.values = None
+        self.writes = None
+        self.series: Dict[Tuple[int, str], int] = {}
+        self.offsets: Dict[str, int] = {}
+        self.covered_since: Optional[float] = None
+        self._dirty_series = False
+        self._full_warned = False
+        self._lock_file = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+    
+    # ----------------------------------------
+    # Files
+    # ----------------------------------------
+    
+    def _map(self, name: str, dtype, shape):
+        """Map an array file, creating it (sparse, zero-filled) if missing."""
+        file = os.path.join(self.path, name)
+        mode = "r+" if os.path.exists(file) else "w+"
+        return np.memmap(file, dtype=dtype, mode=mode, shape=shape)
+    
+    def _write_json(self, name: str, data):
+        """Atomically replace a JSON sidecar file."""
+        file = os.path.join(self.path, name)
+        with open(file + ".tmp", "wb") as f:
+            f.write(orjson.dumps(data))
+        os.replace(file + ".tmp", file)
+    
+    def _read_json(self, name: str):
+        file = os.path.join(self.path, name)
+        if not os.path.exists(file):
+            return None
+        with open(file, "rb") as f:
+            return orjson.loads(f.read())
+    
+    def open(self):
+        """Lock the directory, map the arrays and load the series table and Kafka state."""
+        os.makedirs(self.path, exist_ok=True)
+        lock_file = open(os.path.join(self.path, LOCK_FILE), "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            raise HotStoreLocked(self.path)
+        self._lock_file = lock_file
+        
+        layout = {"capacity": self.capacity, "max_series": self.max_series}
+        if self._read_json("layout.json") not in (None, layout):
+            # Array shapes changed: start over rather than misreading rows
+            self.logger.warning(f"Hot store layout changed, resetting {self.path}")
+            for name in os.listdir(self.path):
+                if name != LOCK_FILE:
+                    os.remove(os.path.join(self.path, name))
+        self._write_json("layout.json", layout)
+        
+        shape = (self.max_series, self.capacity)
+        self.timestamps = self._map("timestamps.f8", np.float64, shape)
+        self.values = self._map("values.f4", np.float32, shape)
+        self.writes = self._map("writes.i8", np.int64, (self.max_series,))
+        
+        series = self._read_json("series.json") or {}
+        self.series = {}
+        for key, row in series.items():
+            asset_id, metric = key.split("/", 1)
+            self.series[(int(asset_id), metric)] = row
+        
+        state = self._read_json("state.json") or {}
+        self.offsets = state.get("offsets", {})
+        self.covered_since = state.get("covered_since")
+        self.logger.info(
+            f"Opened hot store {self.path}: {len(self.series)} series, "
+            f"{len(self.offsets)} partition offsets"
+        )
+    
+    def flush(self):
+        """Persist the arrays, then the series table and Kafka offsets."""
+        self.timestamps.flush()
+        self.values.flush()
+        self.writes.flush()
+        if self._dirty_series:
+            self._write_json(
+                "series.json",
+                {f"{asset_id}/{metric}": row for (asset_id, metric), row in self.series.items()}
+            )
+            self._dirty_series = False
+        self._write_json("state.json", {"offsets": self.offsets, "covered_since": self.covered_since})
+    
+    # ----------------------------------------
+    # Writes
+    # ----------------------------------------
+    
+    def _row(self, asset_id: int, metric: str) -> Optional[int]:
+        """Row of a series, allocated on first sight."""
+        key = (asset_id, metric)
+        row = self.series.get(key)
+        if row is None:
+            if len(self.series) >= self.max_series:
+                if not self._full_warned:
+                    self.logger.warning(f"Hot store full ({self.max_series} series), dropping new series")
+                    self._full_warned = True
+                return None
+            row = len(self.series)
+            # The row may hold unflushed samples of a series lost in a crash
+            self.writes[row] = 0
+            self.series[key] = row
+            self._dirty_series = True
+        return row
+    
+    def append(self, asset_id: int, metric: str, timestamp: float, value: float):
+        """Add a sample to its series ring."""
+        row = self._row(asset_id, metric)
+        if row is None:
+            return
+        n = int(self.writes[row])
+        if n and timestamp <= self.timestamps[row, (n - 1) % self.capacity]:
+            return  # replayed (or out of order) sample
+        column = n % self.capacity
+        if n >= self.capacity and self.covered_since is not None:
+            # The evicted sample is no longer held: coverage starts after it
+            evicted = float(self.timestamps[row, column])
+            if evicted >= self.covered_since:
+                self.covered_since = float(np.nextafter(evicted, np.inf))
+        self.timestamps[row, column] = timestamp
+        self.values[row, column] = value
+        # Publish the sample only once it is written
+        self.writes[row] = n + 1
+    
+    def apply(self, message: dict):
+        """Add the numeric metrics of a bridge message."""
+        asset_id = message.get("asset_id")
+        metrics = message.get("metrics")
+        timestamp = message.get("@timestamp")
+        if asset_id is None or not timestamp or not isinstance(metrics, dict):
+            return
+        sample_time = _sample_time(timestamp)
+        for metric, value in metrics.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            self.append(asset_id, metric, sample_time, value)
+    
+    # ----------------------------------------
+    # Reads
+    # ----------------------------------------
+    
+    def window(
+        self,
+        asset_id: int,
+        metric: str,
+        since: Optional[float] = None,
+        count: Optional[int] = None
+    ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Samples of a series in time order, from `since` or the last `count`.
+        
+        Returns (timestamps, values) arrays, or None for an unknown series.
+        """
+        row = self.series.get((asset_id, metric))
+        if row is None:
+            return None
+        n = int(self.writes[row])
+        size = min(n, self.capacity)
+        end = n % self.capacity
+        
+        timestamps = self.timestamps[row]
+        values = self.values[row]
+        if n > self.capacity and end:
+            # Wrapped: oldest samples are in [end, capacity)
+            start_index = self.capacity - size
+            if since is not None:
+                older = np.searchsorted(timestamps[end:], since)
+                if older < self.capacity - end:
+                    start_index = older
+                else:
+                    start_index = self.capacity - end + np.searchsorted(timestamps[:end], since)
+            if count is not None:
+                start_index = max(start_index, size - count)
+            
+            if start_index >= self.capacity - end:
+                first = start_index - (self.capacity - end)
+                return timestamps[first:end], values[first:end]
+            return (
+                np.concatenate((timestamps[end + start_index:], timestamps[:end])),
+                np.concatenate((values[end + start_index:], values[:end])),
+            )
+        
+        timestamps = timestamps[:size]
+        values = values[:size]
+        first = 0
+        if since is not None:
+            first = int(np.searchsorted(timestamps, since))
+        if count is not None:
+            first = max(first, size - count)
+        return timestamps[first:], values[first:]
+    
+    def aggregate(self, asset_ids: List[int], metric: str, since: float, agg_type: str = "avg") -> np.ndarray:
+        """
+        Aggregate the samples since `since` of many series in one pass.
+        
+        Returns one value per asset id (NaN without samples; count is 0).
+        """
+        rows = np.array([self.series.get((asset_id, metric), -1) for asset_id in asset_ids], dtype=np.int64)
+        known = rows >= 0
+        result = np.full(len(asset_ids), 0.0 if agg_type == "count" else np.nan)
+        if not known.any():
+            return result
+        
+        rows = rows[known]
+        # Unwritten columns of partly filled rings hold stale or zero times
+        filled = np.arange(self.capacity) < np.minimum(self.writes[rows], self.capacity)[:, None]
+        selected = filled & (self.timestamps[rows] >= since)
+        values = np.where(selected, self.values[rows], np.nan)
+        counts = selected.sum(axis=1)
+        
+        if agg_type == "count":
+            result[known] = counts
+            return result
+        has_data = counts > 0
+        reduce = {"avg": np.nanmean, "max": np.nanmax, "min": np.nanmin}[agg_type]
+        aggregated = np.full(len(rows), np.nan)
+        if has_data.any():
+            aggregated[has_data] = reduce(values[has_data], axis=1)
+        result[known] = aggregated
+        return result
+    
+    def covers(self, asset_id: int, metric: str, since: float) -> bool:
+        """Whether the store holds every sample of a series since `since`."""
+        # covered_since is only a lower bound: the feed missed nothing after it
+        if self.covered_since is None or self.covered_since > since:
+            return False
+        row = self.series.get((asset_id, metric))
+        writes = int(self.writes[row]) if row is not None else 0
+        if writes < self.capacity:
+            return True
+        # Full ring: samples older than its oldest one were evicted
+        return bool(self.timestamps[row, writes % self.capacity] <= since)
+    
+    # ----------------------------------------
+    # Kafka feed
+    # ----------------------------------------
+    
+    def _assign(self, consumer):
+        """Assign every partition of the telemetry topics and seek to the stored offsets."""
+        from kafka import TopicPartition
+        
+        partitions = []
+        for topic in settings.hot_store_topics.split(","):
+            ids = consumer.partitions_for_topic(topic)
+            if not ids:
+                self.logger.warning(f"Topic {topic} not found, not consumed by the hot store")
+                continue
+            partitions.extend(TopicPartition(topic, p) for p in sorted(ids))
+        consumer.assign(partitions)
+        
+        # Partitions never consumed start a warmup window back
+        warmup_start = time.time() - settings.hot_store_warmup_minutes * 60
+        fresh = []
+        for tp in partitions:
+            offset = self.offsets.get(f"{tp.topic}:{tp.partition}")
+            if offset is None:
+                fresh.append(tp)
+            else:
+                consumer.seek(tp, offset)
+        if fresh:
+            found = consumer.offsets_for_times({tp: int(warmup_start * 1000) for tp in fresh})
+            for tp in fresh:
+                if found.get(tp) is not None:
+                    consumer.seek(tp, found[tp].offset)
+                else:
+                    consumer.seek_to_end(tp)
+            # Series of these partitions only hold samples from the warmup on
+            self.covered_since = max(self.covered_since or warmup_start, warmup_start)
+        self.logger.info(f"Hot store consuming {len(partitions)} partitions ({len(fresh)} new)")
+    
+    def _consume(self):
+        """Apply telemetry batches from Kafka until stopped."""
+        from kafka import KafkaConsumer
+        from kafka.errors import OffsetOutOfRangeError
+        
+        consumer = None
+        while not self._stop.is_set() and consumer is None:
+            try:
+                consumer = KafkaConsumer(
+                    bootstrap_servers=[settings.kafka_broker],
+                    enable_auto_commit=False,
+                    group_id=None,
+                    # Stored offsets past retention raise instead of silently
+                    # skipping ahead (see OffsetOutOfRangeError below)
+                    auto_offset_reset="none"
+                )
+                self._assign(consumer)
+            except Exception as e:
+                self.logger.warning(f"Hot store Kafka connection failed, retrying: {e}")
+                if consumer is not None:
+                    consumer.close()
+                    consumer = None
+                self._stop.wait(5)
+        if consumer is None:
+            return
+        
+        last_flush = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                try:
+                    polled = consumer.poll(timeout_ms=1000, max_records=5000)
+                except OffsetOutOfRangeError as e:
+                    # Messages were deleted before being applied: restart those
+                    # partitions from the warmup window (moves covered_since)
+                    for tp in e.args[0]:
+                        self.logger.warning(f"Offset of {tp.topic}/{tp.partition} out of range, rewinding")
+                        self.offsets.pop(f"{tp.topic}:{tp.partition}", None)
+                    self._assign(consumer)
+                    continue
+                for tp, records in polled.items():
+                    for record in records:
+                        try:
+                            self.apply(_decode_record(record))
+                        except (ValueError, TypeError, KeyError) as e:
+                            self.logger.error(f"Skipping undecodable record {tp.topic}/{tp.partition}/{record.offset}: {e}")
+                    self.offsets[f"{tp.topic}:{tp.partition}"] = records[-1].offset + 1
+                
+                if time.monotonic() - last_flush >= settings.hot_store_flush_seconds:
+                    self.flush()
+                    last_flush = time.monotonic()
+        except Exception as e:
+            self.logger.error(f"Hot store consumer stopped: {e}")
+        finally:
+            self.flush()
+            consumer.close()
+    
+    def start(self):
+        """Open the store and start feeding it from Kafka (idempotent)."""
+        if self._thread is not None:
+            return
+        try:
+            self.open()
+        except HotStoreLocked:
+            self.logger.warning(
+                f"Hot store {self.path} is used by another process, "
+                f"serving telemetry from the fallback backend"
+            )
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._consume, name="hot-store", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Stop the Kafka feed and persist the store."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=10)
+        self._thread = None
+        # Closing the file releases the flock
+        self._lock_file.close()
+        self._lock_file = None
+
+
+# Singleton instance
+hot_store = HotTelemetryStore(
+    settings.hot_store_dir,
+    settings.hot_store_capacity,
+    settings.hot_store_max_series
+)
@@ -0,0 +1,215 @@
+"""
+Catalog registry for the Maintenance 4.0 Platform.
+
+Keeps an in-process, read-through copy of the small and rarely changing
+catalog tables (sites, assets, maintenance policies), indexed by id, code
+and asset type. Shared by the rule engine and the API routes.
+
+Entries are immutable SQLAlchemy rows, not ORM instances: writes still go
+through a session. PostgreSQL triggers (see database/init.sql) send a
+NOTIFY on every change to those tables; a listener thread invalidates the
+matching snapshot so each worker process reloads it on next access.
+Reloads always read the primary (never the replica): a snapshot loaded
+from a lagging replica could predate the change that triggered the NOTIFY
+and would then be cached until CATALOG_CACHE_TTL.
+"""
+
+import logging
+import select
+import threading
+import time
+from typing import Dict, List, Optional
+
+import psycopg2
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database import primary_engine
+from ..models.site import Site
+from ..models.asset import Asset
+from ..models.policy import MaintenancePolicy
+
+logger = logging.getLogger(__name__)
+
+# Channel used by the notify_catalog_change() trigger
+CATALOG_CHANNEL = "catalog_changed"
+
+CATALOG_MODELS = {
+    "sites": Site,
+    "assets": Asset,
+    "maintenance_policies": MaintenancePolicy,
+}
+
+
+class CatalogSnapshot:
+    """Immutable indexes over one load of the catalog tables."""
+    
+    def __init__(self, sites: List[Row], assets: List[Row], policies: List[Row]):
+        self.loaded_at = time.monotonic()
+        
+        self.sites = sites
+        self.sites_by_id: Dict[int, Row] = {s.id: s for s in sites}
+        self.sites_by_code: Dict[str, Row] = {s.code: s for s in sites}
+        
+        self.assets = assets
+        self.assets_by_id: Dict[int, Row] = {a.id: a for a in assets}
+        self.assets_by_code: Dict[str, Row] = {a.code: a for a in assets}
+        self.assets_by_type: Dict[str, List[Row]] = {}
+        self.assets_by_site: Dict[int, List[Row]] = {}
+        for asset in assets:
+            self.assets_by_type.setdefault(asset.type, []).append(asset)
+            self.assets_by_site.setdefault(asset.site_id, []).append(asset)
+        
+        self.policies = policies
+        self.policies_by_id: Dict[int, Row] = {p.id: p for p in policies}
+        self.active_policies_by_type: Dict[str, List[Row]] = {}
+        for policy in policies:
+            if policy.active:
+                self.active_policies_by_type.setdefault(policy.asset_type, []).append(policy)
+
+
+class CatalogRegistry:
+    """Read-through cache of sites, assets and policies."""
+    
+    def __init__(self):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._lock = threading.Lock()
+        # Bumped by invalidate(); a load that overlapped a bump is not kept
+        self._generation = 0
+        self._generation_lock = threading.Lock()
+        self._listener: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+    
+    # ----------------------------------------
+    # Lookups
+    # ----------------------------------------
+    
+    def get_site(self, site_id: int) -> Optional[Row]:
+        return self._current().sites_by_id.get(site_id)
+    
+    def get_site_by_code(self, code: str) -> Optional[Row]:
+        return self._current().sites_by_code.get(code)
+    
+    def get_sites(self) -> List[Row]:
+        return self._current().sites
+    
+    def get_asset(self, asset_id: int) -> Optional[Row]:
+        return self._current().assets_by_id.get(asset_id)
+    
+    def get_asset_by_code(self, code: str) -> Optional[Row]:
+        return self._current().assets_by_code.get(code)
+    
+    def get_assets(self, asset_type: Optional[str] = None) -> List[Row]:
+        snapshot = self._current()
+        if asset_type is None:
+            return snapshot.assets
+        return snapshot.assets_by_type.get(asset_type, [])
+    
+    def get_site_assets(self, site_id: int) -> List[Row]:
+        return self._current().assets_by_site.get(site_id, [])
+    
+    def get_policy(self, policy_id: int) -> Optional[Row]:
+        return self._current().policies_by_id.get(policy_id)
+    
+    def get_active_policies(self, asset_type: Optional[str] = None) -> List[Row]:
+        snapshot = self._current()
+        if asset_type is None:
+            return [p for policies in snapshot.active_policies_by_type.values() for p in policies]
+        return snapshot.active_policies_by_type.get(asset_type, [])
+    
+    # ----------------------------------------
+    # Loading and invalidation
+    # ----------------------------------------
+    
+    def invalidate(self):
+        """Drop the current snapshot; the next lookup reloads it."""
+        with self._generation_lock:
+            self._generation += 1
+            self._snapshot = None
+    
+    def _current(self) -> CatalogSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - snapshot.loaded_at < settings.catalog_cache_ttl:
+            return snapshot
+        
+        with self._lock:
+            # Another thread may have reloaded while we waited
+            snapshot = self._snapshot
+            if snapshot is None or time.monotonic() - snapshot.loaded_at >= settings.catalog_cache_ttl:
+                generation = self._generation
+                snapshot = self._load()
+                with self._generation_lock:
+                    # Invalidated while loading: the load may predate the
+                    # change, so serve it to this caller only
+                    if generation == self._generation:
+                        self._snapshot = snapshot
+            return snapshot
+    
+    def _load(self) -> CatalogSnapshot:
+        # Primary only; through the API pool when a request triggers the reload
+        db = Session(bind=primary_engine())
+        try:
+            tables = {
+                name: db.query(*model.__table__.columns).all()
+                for name, model in CATALOG_MODELS.items()
+            }
+        finally:
+            db.close()
+        
+        self.logger.debug(
+            f"Loaded catalog: {len(tables['sites'])} sites, {len(tables['assets'])} assets, "
+            f"{len(tables['maintenance_policies'])} policies"
+        )
+        return CatalogSnapshot(tables["sites"], tables["assets"], tables["maintenance_policies"])
+    
+    # ----------------------------------------
+    # LISTEN/NOTIFY
+    # ----------------------------------------
+    
+    def start_listener(self):
+        """Start the background thread listening for catalog changes."""
+        if self._listener and self._listener.is_alive():
+            return
+        self._stop.clear()
+        self._listener = threading.Thread(target=self._listen, name="catalog-listener", daemon=True)
+        self._listener.start()
+    
+    def stop_listener(self):
+        """Stop the listener thread."""
+        self._stop.set()
+        if self._listener:
+            self._listener.join(timeout=5)
+    
+    def _listen(self):
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(settings.database_url)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                conn.cursor().execute(f"LISTEN {CATALOG_CHANNEL}")
+                # Changes may have been missed while disconnected
+                self.invalidate()
+                self.logger.info(f"Listening for catalog changes on '{CATALOG_CHANNEL}'")
+                
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    if conn.notifies:
+                        tables = {n.payload for n in conn.notifies}
+                        conn.notifies.clear()
+                        self.logger.debug(f"Catalog changed: {', '.join(sorted(tables))}")
+                        self.invalidate()
+                        
+            except Exception as e:
+                self.logger.warning(f"Catalog listener error: {e}")
+                self._stop.wait(5)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+
+# Singleton instance
+catalog = CatalogRegistry()
@@ -2,31 +2,43 @@
 Rule Engine for Maintenance 4.0 Platform.
 
 Evaluates maintenance policies against telemetry data from Elasticsearch
+(or the PostgreSQL telemetry table, see telemetry.py)
 and creates alerts and work orders when thresholds are exceeded.
 """
 
 import logging
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import Session
 
 from ..database import SessionLocal
-from ..models.site import Site
 from ..models.asset import Asset
-from ..models.policy import MaintenancePolicy
 from ..models.alert import Alert
 from ..models.workorder import WorkOrder
-from ..elasticsearch_client import es_client
+from ..models.forecast import RuntimeForecast
+from ..config import settings
+from .anomaly import CONDITIONS, EwmaBaseline
+from .compound import compile_expression, first_value
+from .forecasting import is_forecastable, runtime_forecaster
+from .registry import catalog
+from .telemetry import telemetry_backend
 
 logger = logging.getLogger(__name__)
 
+# Rule types evaluated for all assets of a type at once
+FLEET_RULE_TYPES = {"zscore", "compound"}
+
 
 class RuleEngine:
     """Engine for evaluating maintenance rules."""
     
     def __init__(self):
         self.logger = logging.getLogger(self.__class__.__name__)
+        # zscore baselines by (policy id, metric, window)
+        self._baselines: Dict[Tuple[int, str, int], EwmaBaseline] = {}
     
     def evaluate_all_policies(self):
         """Evaluate all active policies for all assets."""
@@ -34,26 +46,42 @@ class RuleEngine:
         
         db = SessionLocal()
         try:
-            # Get all active policies
-            policies = db.query(MaintenancePolicy).filter(
-                MaintenancePolicy.active == True
-            ).all()
+            # Active policies and assets come from the catalog registry
+            policies = catalog.get_active_policies()
             
             self.logger.info(f"Found {len(policies)} active policies")
             
-            # Get all assets
-            assets = db.query(Asset).all()
-            
             alerts_created = 0
             
-            for asset in assets:
+            # Runtime forecasts decide which counters need reading this cycle
+            forecasts = {
+                (f.asset_id, f.policy_id): f for f in db.query(RuntimeForecast).all()
+            }
+            
+            for asset in catalog.get_assets():
                 # Get policies matching this asset type
-                matching_policies = [p for p in policies if p.asset_type == asset.type]
+                matching_policies = catalog.get_active_policies(asset.type)
                 
                 for policy in matching_policies:
+                    if policy.rule_type in FLEET_RULE_TYPES:
+                        continue
+                    if is_forecastable(policy):
+                        if self._evaluate_runtime_policy(db, asset, policy, forecasts):
+                            alerts_created += 1
+                        continue
                     if self._evaluate_policy(db, asset, policy):
                         alerts_created += 1
             
+            # zscore policies score all assets of their type at once
+            for policy in policies:
+                if policy.rule_type == "zscore":
+                    alerts_created += self._evaluate_anomaly_policy(db, policy)
+            
+            # compound policies share one multi-metric fetch per type and window
+            alerts_created += self._evaluate_compound_policies(
+                db, [policy for policy in policies if policy.rule_type == "compound"]
+            )
+            
             self.logger.info(f"Rule evaluation complete. Created {alerts_created} new alerts.")
             
         except Exception as e:
@@ -62,7 +90,7 @@ class RuleEngine:
         finally:
             db.close()
     
-    def _evaluate_policy(self, db: Session, asset: Asset, policy: MaintenancePolicy) -> bool:
+    def _evaluate_policy(self, db: Session, asset: Row, policy: Row) -> bool:
         """
         Evaluate a single policy for an asset.
         
@@ -92,53 +120,292 @@ class RuleEngine:
                 return False
             
             # Condition violated - create alert
-            self.logger.warning(
-                f"ALERT: {asset.code} - {policy.description} "
-                f"(value={metric_value}, threshold={policy.threshold})"
+            self._create_alert(
+                db, asset, policy, metric_value,
+                f"{policy.description} - Valeur: {metric_value:.2f}, Seuil: {policy.threshold}"
             )
+            return True
             
-            alert = Alert(
-                asset_id=asset.id,
-                policy_id=policy.id,
-                severity=policy.severity,
-                status="open",
-                message=f"{policy.description} - Valeur: {metric_value:.2f}, Seuil: {policy.threshold}",
-                metric_value=metric_value
-            )
-            db.add(alert)
-            db.flush()  # Get alert ID
-            
-            # Create work order for HIGH and MEDIUM severity
-            if policy.severity in ["HIGH", "MEDIUM"]:
-                work_order = WorkOrder(
-                    alert_id=alert.id,
-                    priority=policy.severity,
-                    status="open"
-                )
-                db.add(work_order)
-                self.logger.info(f"Created work order for alert {alert.id}")
+        except Exception as e:
+            self.logger.error(f"Error evaluating policy {policy.id} for asset {asset.code}: {e}")
+            return False
+    
+    def _evaluate_runtime_policy(self, db: Session, asset: Row, policy: Row, forecasts: dict) -> bool:
+        """
+        Evaluate a runtime policy, reading the counter only when its forecast is due.
+        
+        Each reading refines the usage-rate forecast. Within
+        FORECAST_LEAD_HOURS of the predicted crossing a LOW alert and work
+        order are created ahead of time; that alert is escalated to the
+        policy severity once the limit is actually crossed.
+        
+        Returns True if an alert was created, False otherwise.
+        """
+        key = (asset.id, policy.id)
+        forecast = forecasts.get(key)
+        now = datetime.utcnow()
+        if not runtime_forecaster.is_due(forecast, now):
+            return False
+        
+        try:
+            value = telemetry_backend.get_latest_metric(asset.code, policy.metric)
+            if value is None:
+                self.logger.debug(f"No data for {asset.code}/{policy.metric}")
+                return False
             
-            # Update asset status
-            if policy.severity == "HIGH":
-                asset.status = "CRITICAL"
-            elif policy.severity == "MEDIUM" and asset.status != "CRITICAL":
-                asset.status = "WARNING"
+            forecast = forecasts[key] = runtime_forecaster.observe(forecast, asset, policy, value, now)
+            db.add(forecast)
+            
+            open_alert = db.query(Alert).filter(
+                Alert.asset_id == asset.id,
+                Alert.policy_id == policy.id,
+                Alert.status == "open"
+            ).first()
+            if forecast.alert_id is not None and (open_alert is None or open_alert.id != forecast.alert_id):
+                # The pre-alert was acknowledged or closed: a new one may be raised
+                forecast.alert_id = None
+            
+            if self._check_condition(value, policy.threshold, policy.condition):
+                if open_alert is None:
+                    self._create_alert(
+                        db, asset, policy, value,
+                        f"{policy.description} - Valeur: {value:.2f}, Seuil: {policy.threshold}"
+                    )
+                    return True
+                if open_alert.id == forecast.alert_id:
+                    self._escalate_forecast_alert(db, asset, policy, open_alert, value)
+                    forecast.alert_id = None
+            
+            elif (
+                settings.forecast_lead_hours > 0
+                and forecast.alert_id is None
+                and open_alert is None
+                and runtime_forecaster.is_imminent(forecast, now)
+            ):
+                # No rate yet when the first reading already sits at the threshold
+                rate = f", {forecast.rate_per_hour:.2f}/h" if forecast.rate_per_hour is not None else ""
+                alert = self._create_alert(
+                    db, asset, policy, value,
+                    f"{policy.description} - Prevision: seuil {policy.threshold} atteint vers "
+                    f"{forecast.predicted_at:%Y-%m-%d %H:%M} UTC "
+                    f"(valeur {value:.2f}{rate})",
+                    severity="LOW"
+                )
+                forecast.alert_id = alert.id
+                db.add(forecast)
+                # Forecast alerts get a work order even at LOW severity
+                db.add(WorkOrder(alert_id=alert.id, priority="LOW", status="open"))
+                self.logger.info(
+                    f"Forecast: {asset.code}/{policy.metric} crosses {policy.threshold} "
+                    f"around {forecast.predicted_at:%Y-%m-%d %H:%M}, work order pre-created"
+                )
             
             db.commit()
-            return True
+            return False
             
         except Exception as e:
             self.logger.error(f"Error evaluating policy {policy.id} for asset {asset.code}: {e}")
+            db.rollback()
             return False
     
-    def _get_metric_value(self, asset: Asset, policy: MaintenancePolicy) -> Optional[float]:
+    def _escalate_forecast_alert(self, db: Session, asset: Row, policy: Row, alert: Alert, value: float):
+        """Turn a pre-created forecast alert into the policy alert once the limit is crossed."""
+        self.logger.warning(
+            f"ALERT: {asset.code} - {policy.description} "
+            f"(value={value}, threshold={policy.threshold}, forecast alert {alert.id} escalated)"
+        )
+        alert.severity = policy.severity
+        alert.metric_value = value
+        alert.message = f"{policy.description} - Valeur: {value:.2f}, Seuil: {policy.threshold}"
+        db.query(WorkOrder).filter(
+            WorkOrder.alert_id == alert.id,
+            WorkOrder.status.in_(["open", "in_progress"])
+        ).update({"priority": policy.severity}, synchronize_session=False)
+        self._update_asset_status(db, asset, policy.severity)
+    
+    def _evaluate_anomaly_policy(self, db: Session, policy: Row) -> int:
+        """
+        Evaluate a zscore policy for every asset of its type.
+        
+        One batched telemetry fetch returns the windowed average of each
+        asset; the values are scored against the per-asset EWMA baselines
+        in a single NumPy pass. Returns the number of alerts created.
+        """
+        assets = catalog.get_assets(policy.asset_type)
+        if not assets:
+            return 0
+        
+        window = int(policy.window_minutes or 5)
+        latest = telemetry_backend.get_metric_aggregations(
+            [asset.code for asset in assets], policy.metric, window, "avg"
+        )
+        values = np.array([latest.get(asset.code, np.nan) for asset in assets], dtype=float)
+        
+        key = (policy.id, policy.metric, window)
+        baseline = self._baselines.get(key)
+        if baseline is None:
+            baseline = self._baselines[key] = EwmaBaseline(
+                settings.anomaly_ewma_alpha, settings.anomaly_min_samples
+            )
+        z, scored = baseline.score([asset.id for asset in assets], values, policy.threshold)
+        
+        compare = CONDITIONS.get(policy.condition)
+        if compare is None:
+            return 0
+        violations = np.flatnonzero(scored & compare(z, policy.threshold))
+        
+        alerts_created = 0
+        for i in violations.tolist():
+            asset = assets[i]
+            try:
+                if self._has_open_alert(db, asset, policy):
+                    continue
+                self._create_alert(
+                    db, asset, policy, float(values[i]),
+                    f"{policy.description} - Valeur: {values[i]:.2f}, "
+                    f"Ecart: {z[i]:.1f} sigma, Seuil: {policy.threshold}"
+                )
+                alerts_created += 1
+            except Exception as e:
+                self.logger.error(f"Error evaluating policy {policy.id} for asset {asset.code}: {e}")
+                db.rollback()
+        
+        self.logger.info(
+            f"Scored {int(scored.sum())}/{len(assets)} {policy.asset_type} assets on "
+            f"{policy.metric} (policy {policy.id}), {len(violations)} anomalies"
+        )
+        return alerts_created
+    
+    def _evaluate_compound_policies(self, db: Session, policies: List[Row]) -> int:
+        """
+        Evaluate compound policies for every asset of their types.
+        
+        Policies are grouped by asset type and window; each group issues a
+        single get_asset_aggregates request for all the (agg, metric) terms
+        its expressions reference, and the expressions are evaluated in
+        memory. Returns the number of alerts created.
+        """
+        groups: Dict[Tuple[str, int], List[Row]] = {}
+        for policy in policies:
+            groups.setdefault((policy.asset_type, int(policy.window_minutes or 5)), []).append(policy)
+        
+        alerts_created = 0
+        for (asset_type, window), group in groups.items():
+            expressions = {}
+            for policy in group:
+                try:
+                    expressions[policy.id] = compile_expression(policy.expression or "")
+                except ValueError as e:
+                    self.logger.error(f"Invalid expression for policy {policy.id}: {e}")
+            
+            assets = catalog.get_assets(asset_type)
+            terms = sorted({term for expression in expressions.values() for term in expression.terms})
+            if not assets or not terms:
+                continue
+            
+            aggregates = telemetry_backend.get_asset_aggregates(
+                [asset.code for asset in assets], terms, window
+            )
+            
+            for policy in group:
+                expression = expressions.get(policy.id)
+                if expression is None:
+                    continue
+                violations = 0
+                for asset in assets:
+                    values = aggregates.get(asset.code)
+                    if not values or not expression.evaluate(values):
+                        continue
+                    violations += 1
+                    try:
+                        if self._has_open_alert(db, asset, policy):
+                            continue
+                        self._create_alert(
+                            db, asset, policy, first_value(expression, values),
+                            f"{policy.description} - {expression.describe(values)}"
+                        )
+                        alerts_created += 1
+                    except Exception as e:
+                        self.logger.error(f"Error evaluating policy {policy.id} for asset {asset.code}: {e}")
+                        db.rollback()
+                
+                self.logger.info(
+                    f"Evaluated compound policy {policy.id} on {len(aggregates)}/{len(assets)} "
+                    f"{asset_type} assets, {violations} violations"
+                )
+        
+        return alerts_created
+    
+    def _has_open_alert(self, db: Session, asset: Row, policy: Row) -> bool:
+        """Whether the asset already has an open alert for the policy."""
+        return db.query(Alert.id).filter(
+            Alert.asset_id == asset.id,
+            Alert.policy_id == policy.id,
+            Alert.status == "open"
+        ).first() is not None
+    
+    def _create_alert(
+        self,
+        db: Session,
+        asset: Row,
+        policy: Row,
+        metric_value: float,
+        message: str,
+        severity: Optional[str] = None
+    ) -> Alert:
+        """Create an alert (and work order) for a violated policy and commit."""
+        severity = severity or policy.severity
+        self.logger.warning(
+            f"ALERT: {asset.code} - {policy.description} "
+            f"(value={metric_value}, threshold={policy.expression or policy.threshold})"
+        )
+        
+        alert = Alert(
+            asset_id=asset.id,
+            policy_id=policy.id,
+            severity=severity,
+            status="open",
+            message=message,
+            metric_value=metric_value
+        )
+        db.add(alert)
+        db.flush()  # Get alert ID
+        
+        # Create work order for HIGH and MEDIUM severity
+        if severity in ["HIGH", "MEDIUM"]:
+            work_order = WorkOrder(
+                alert_id=alert.id,
+                priority=severity,
+                status="open"
+            )
+            db.add(work_order)
+            self.logger.info(f"Created work order for alert {alert.id}")
+        
+        self._update_asset_status(db, asset, severity)
+        db.commit()
+        return alert
+    
+    def _update_asset_status(self, db: Session, asset: Row, severity: str):
+        """Raise the asset status for an alert (catalog rows are read-only, update in SQL)."""
+        if severity == "HIGH":
+            db.query(Asset).filter(
+                Asset.id == asset.id,
+                Asset.status != "CRITICAL"
+            ).update({"status": "CRITICAL"}, synchronize_session=False)
+        elif severity == "MEDIUM":
+            db.query(Asset).filter(
+                Asset.id == asset.id,
+                Asset.status != "CRITICAL"
+            ).update({"status": "WARNING"}, synchronize_session=False)
+    
+    def _get_metric_value(self, asset: Row, policy: Row) -> Optional[float]:
         """Get the metric value for evaluation."""
         
         if policy.rule_type == "threshold":
             # Use average or max depending on window
             if policy.window_minutes and policy.window_minutes > 0:
                 # For threshold rules with time window, use average
-                return es_client.get_metric_aggregation(
+                return telemetry_backend.get_metric_aggregation(
                     asset_code=asset.code,
                     metric=policy.metric,
                     window_minutes=policy.window_minutes,
@@ -146,15 +413,15 @@ class RuleEngine:
                 )
             else:
                 # No window - get latest value
-                return es_client.get_latest_metric(asset.code, policy.metric)
+                return telemetry_backend.get_latest_metric(asset.code, policy.metric)
         
         elif policy.rule_type == "runtime":
             # For runtime metrics (run_hours, door_cycles), get latest value
-            return es_client.get_latest_metric(asset.code, policy.metric)
+            return telemetry_backend.get_latest_metric(asset.code, policy.metric)
         
         elif policy.rule_type == "rate_of_change":
             # Get values over window and calculate rate
-            values = es_client.get_recent_metric_values(
+            values = telemetry_backend.get_recent_metric_values(
                 asset.code,
                 policy.metric,
                 count=int(policy.window_minutes or 5)
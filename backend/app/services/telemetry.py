@@ -0,0 +1,482 @@
+"""
+Telemetry backends for rule evaluation.
+
+The rule engine and the telemetry endpoint only need a few lookups per
+asset and metric: a windowed aggregate (for one asset or a whole fleet),
+the most recent values, the latest value and the raw samples of a window.
+Compound policies also need several aggregates of several metrics per asset
+at once, and policy backtests per-bucket stats over long periods. Any
+object with the methods of ElasticsearchClient (get_metric_aggregation,
+get_metric_aggregations, get_asset_aggregates, get_recent_metric_values,
+get_latest_metric, get_metric_window, get_metric_histograms) can serve
+them; telemetry_backend is the one selected by TELEMETRY_BACKEND:
+
+- elasticsearch (default): the telemetry indices, via es_client
+- postgres: the daily-partitioned telemetry table written by the
+  optional PostgreSQL sink (indexer/pg_sink.py), so small deployments can
+  drop Elasticsearch from the rule evaluation path
+
+With HOT_STORE_ENABLED, lookups are answered from the memory-mapped hot
+store (hot_store.py) whenever it covers the requested window, and fall
+through to that backend otherwise (always for backtest histories).
+"""
+
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import text
+
+from ..config import settings
+from ..database import service_engine
+from ..elasticsearch_client import Histogram, es_client
+from .hot_store import hot_store
+from .registry import catalog
+
+logger = logging.getLogger(__name__)
+
+# Aggregations supported by all backends
+AGGREGATIONS = {"avg", "max", "min", "count"}
+
+# Hot store equivalents of the value aggregations
+HOT_AGGREGATIONS = {"avg": np.mean, "max": np.max, "min": np.min}
+
+# Memory for the bucket hash aggregate of backtest histograms (one group
+# per asset, metric and interval, spilled to disk with the default 4MB)
+HISTOGRAM_WORK_MEM = "256MB"
+
+
+class PostgresTelemetryBackend:
+    """Telemetry lookups on the PostgreSQL telemetry table."""
+    
+    def __init__(self):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._metric_ids: Dict[str, int] = {}
+        self._metrics_loaded_at = float("-inf")
+    
+    def _metric_id(self, metric: str) -> Optional[int]:
+        """Id of a metric name, if the sink has registered it."""
+        metric_id = self._metric_ids.get(metric)
+        if metric_id is None:
+            # Metrics are registered by the sink on first sight; reload
+            # the names at most once per catalog TTL
+            if time.monotonic() - self._metrics_loaded_at < settings.catalog_cache_ttl:
+                return None
+            with service_engine().connect() as conn:
+                self._metric_ids = dict(conn.execute(text("SELECT name, id FROM telemetry_metrics")).all())
+            self._metrics_loaded_at = time.monotonic()
+            metric_id = self._metric_ids.get(metric)
+        return metric_id
+    
+    def _series(self, asset_code: str, metric: str) -> Optional[Dict[str, int]]:
+        """Bind parameters (asset_id, metric_id) of a series, if known."""
+        asset = catalog.get_asset_by_code(asset_code)
+        if asset is None:
+            return None
+        
+        metric_id = self._metric_id(metric)
+        if metric_id is None:
+            return None
+        
+        return {"asset_id": asset.id, "metric_id": metric_id}
+    
+    def get_metric_aggregation(
+        self,
+        asset_code: str,
+        metric: str,
+        window_minutes: int,
+        agg_type: str = "avg"
+    ) -> Optional[float]:
+        """Aggregated metric value for an asset over a time window."""
+        if agg_type not in AGGREGATIONS:
+            raise ValueError(f"Unsupported aggregation: {agg_type}")
+        
+        try:
+            params = self._series(asset_code, metric)
+            if params is None:
+                return None
+            
+            now = datetime.utcnow()
+            params.update(start=now - timedelta(minutes=window_minutes), end=now)
+            with service_engine().connect() as conn:
+                value = conn.execute(
+                    text(
+                        f"SELECT {agg_type}(value) FROM telemetry "
+                        "WHERE asset_id = :asset_id AND metric_id = :metric_id "
+                        "AND ts >= :start AND ts <= :end"
+                    ),
+                    params
+                ).scalar()
+            return float(value) if value is not None else None
+        
+        except Exception as e:
+            self.logger.error(f"Error querying telemetry table: {e}")
+            return None
+    
+    def get_metric_aggregations(
+        self,
+        asset_codes: List[str],
+        metric: str,
+        window_minutes: int,
+        agg_type: str = "avg"
+    ) -> Dict[str, float]:
+        """Aggregated metric value by asset code, for many assets at once."""
+        if agg_type not in AGGREGATIONS:
+            raise ValueError(f"Unsupported aggregation: {agg_type}")
+        
+        try:
+            metric_id = self._metric_id(metric)
+            assets = [catalog.get_asset_by_code(code) for code in asset_codes]
+            codes = {asset.id: asset.code for asset in assets if asset is not None}
+            if metric_id is None or not codes:
+                return {}
+            
+            now = datetime.utcnow()
+            with service_engine().connect() as conn:
+                rows = conn.execute(
+                    text(
+                        f"SELECT asset_id, {agg_type}(value) AS value FROM telemetry "
+                        "WHERE asset_id = ANY(:asset_ids) AND metric_id = :metric_id "
+                        "AND ts >= :start AND ts <= :end GROUP BY asset_id"
+                    ),
+                    {
+                        "asset_ids": list(codes),
+                        "metric_id": metric_id,
+                        "start": now - timedelta(minutes=window_minutes),
+                        "end": now,
+                    }
+                ).all()
+            return {codes[row.asset_id]: float(row.value) for row in rows}
+        
+        except Exception as e:
+            self.logger.error(f"Error querying telemetry table: {e}")
+            return {}
+    
+    def get_asset_aggregates(
+        self,
+        asset_codes: List[str],
+        aggregates: List[Tuple[str, str]],
+        window_minutes: int
+    ) -> Dict[str, Dict[Tuple[str, str], float]]:
+        """(agg_type, metric) aggregates by asset code, in one query."""
+        for agg_type, _ in aggregates:
+            if agg_type not in AGGREGATIONS:
+                raise ValueError(f"Unsupported aggregation: {agg_type}")
+        
+        try:
+            metrics = {metric: self._metric_id(metric) for _, metric in aggregates}
+            names = {metric_id: metric for metric, metric_id in metrics.items() if metric_id is not None}
+            assets = [catalog.get_asset_by_code(code) for code in asset_codes]
+            codes = {asset.id: asset.code for asset in assets if asset is not None}
+            if not names or not codes:
+                return {}
+            
+            now = datetime.utcnow()
+            with service_engine().connect() as conn:
+                rows = conn.execute(
+                    text(
+                        "SELECT asset_id, metric_id, avg(value) AS avg, max(value) AS max, "
+                        "min(value) AS min, count(value) AS count FROM telemetry "
+                        "WHERE asset_id = ANY(:asset_ids) AND metric_id = ANY(:metric_ids) "
+                        "AND ts >= :start AND ts <= :end GROUP BY asset_id, metric_id"
+                    ),
+                    {
+                        "asset_ids": list(codes),
+                        "metric_ids": list(names),
+                        "start": now - timedelta(minutes=window_minutes),
+                        "end": now,
+                    }
+                ).all()
+            
+            values: Dict[str, Dict[Tuple[str, str], float]] = {}
+            for row in rows:
+                metric = names[row.metric_id]
+                asset_values = values.setdefault(codes[row.asset_id], {})
+                for agg_type, agg_metric in aggregates:
+                    if agg_metric == metric:
+                        asset_values[(agg_type, metric)] = float(getattr(row, agg_type))
+            return values
+        
+        except Exception as e:
+            self.logger.error(f"Error querying telemetry table: {e}")
+            return {}
+    
+    def get_recent_metric_values(
+        self,
+        asset_code: str,
+        metric: str,
+        count: int = 5
+    ) -> List[float]:
+        """Most recent metric values for an asset, newest first."""
+        try:
+            params = self._series(asset_code, metric)
+            if params is None:
+                return []
+            
+            # Recent rows only: the time bound lets the planner prune
+            # older daily partitions
+            params.update(
+                count=count,
+                since=datetime.utcnow() - timedelta(days=settings.telemetry_lookback_days)
+            )
+            with service_engine().connect() as conn:
+                rows = conn.execute(
+                    text(
+                        "SELECT value FROM telemetry "
+                        "WHERE asset_id = :asset_id AND metric_id = :metric_id AND ts >= :since "
+                        "ORDER BY ts DESC LIMIT :count"
+                    ),
+                    params
+                ).scalars().all()
+            return list(rows)
+        
+        except Exception as e:
+            self.logger.error(f"Error querying telemetry table: {e}")
+            return []
+    
+    def get_latest_metric(self, asset_code: str, metric: str) -> Optional[float]:
+        """Get the latest value of a metric for an asset."""
+        values = self.get_recent_metric_values(asset_code, metric, count=1)
+        return values[0] if values else None
+    
+    def get_metric_window(
+        self,
+        asset_code: str,
+        metric: str,
+        window_minutes: int
+    ) -> Tuple[List[datetime], List[float]]:
+        """Samples of a metric over a time window, oldest first."""
+        try:
+            params = self._series(asset_code, metric)
+            if params is None:
+                return [], []
+            
+            params.update(start=datetime.utcnow() - timedelta(minutes=window_minutes))
+            with service_engine().connect() as conn:
+                rows = conn.execute(
+                    text(
+                        "SELECT ts, value FROM telemetry "
+                        "WHERE asset_id = :asset_id AND metric_id = :metric_id AND ts >= :start "
+                        "ORDER BY ts"
+                    ),
+                    params
+                ).all()
+            return [row.ts for row in rows], [row.value for row in rows]
+        
+        except Exception as e:
+            self.logger.error(f"Error querying telemetry table: {e}")
+            return [], []
+    
+    def get_metric_histograms(
+        self,
+        asset_codes: List[str],
+        metrics: List[str],
+        start: datetime,
+        end: datetime,
+        interval_seconds: int
+    ) -> Dict[str, Dict[str, Histogram]]:
+        """
+        Per-bucket (starts, counts, sums, mins, maxs) columns of metrics by
+        asset code, in any order. Errors are raised, not logged as no data.
+        """
+        names = {self._metric_id(metric): metric for metric in metrics}
+        names.pop(None, None)
+        assets = [catalog.get_asset_by_code(code) for code in asset_codes]
+        codes = {asset.id: asset.code for asset in assets if asset is not None}
+        if not names or not codes:
+            return {}
+        
+        # Buckets aligned on multiples of the interval since the epoch,
+        # as Elasticsearch fixed_interval histograms; one row per series
+        # with (unsorted) array columns keeps the transfer compact
+        with service_engine().connect() as conn:
+            conn.execute(text(f"SET LOCAL work_mem = '{HISTOGRAM_WORK_MEM}'"))
+            rows = conn.execute(
+                text(
+                    "WITH buckets AS ("
+                    "SELECT asset_id, metric_id, "
+                    "date_bin(make_interval(secs => :interval), ts, TIMESTAMP '1970-01-01') AS bucket, "
+                    "count(*)::int4 AS count, sum(value) AS sum, min(value) AS min, max(value) AS max "
+                    "FROM telemetry "
+                    "WHERE asset_id = ANY(:asset_ids) AND metric_id = ANY(:metric_ids) "
+                    "AND ts >= :start AND ts < :end "
+                    "GROUP BY 1, 2, 3) "
+                    "SELECT asset_id, metric_id, "
+                    "array_agg(extract(epoch FROM bucket)::int8) AS starts, "
+                    "array_agg(count) AS counts, array_agg(sum) AS sums, "
+                    "array_agg(min) AS mins, array_agg(max) AS maxs "
+                    "FROM buckets GROUP BY asset_id, metric_id"
+                ),
+                {
+                    "interval": interval_seconds,
+                    "asset_ids": list(codes),
+                    "metric_ids": list(names),
+                    "start": start,
+                    "end": end,
+                }
+            ).all()
+        
+        results: Dict[str, Dict[str, Histogram]] = {}
+        for row in rows:
+            results.setdefault(codes[row.asset_id], {})[names[row.metric_id]] = (
+                row.starts, row.counts, row.sums, row.mins, row.maxs
+            )
+        return results
+
+
+class HotStoreTelemetryBackend:
+    """Telemetry lookups on the hot store, falling back to another backend."""
+    
+    def __init__(self, store, fallback):
+        self.store = store
+        self.fallback = fallback
+    
+    def _asset_id(self, asset_code: str) -> Optional[int]:
+        asset = catalog.get_asset_by_code(asset_code)
+        return asset.id if asset else None
+    
+    def get_metric_aggregation(
+        self,
+        asset_code: str,
+        metric: str,
+        window_minutes: int,
+        agg_type: str = "avg"
+    ) -> Optional[float]:
+        """Aggregated metric value for an asset over a time window."""
+        if agg_type not in AGGREGATIONS:
+            raise ValueError(f"Unsupported aggregation: {agg_type}")
+        
+        asset_id = self._asset_id(asset_code)
+        since = time.time() - window_minutes * 60
+        if asset_id is None or not self.store.covers(asset_id, metric, since):
+            return self.fallback.get_metric_aggregation(asset_code, metric, window_minutes, agg_type)
+        
+        window = self.store.window(asset_id, metric, since=since)
+        values = window[1] if window else np.empty(0)
+        if agg_type == "count":
+            return float(len(values))
+        if not len(values):
+            return None
+        return float(HOT_AGGREGATIONS[agg_type](values))
+    
+    def get_metric_aggregations(
+        self,
+        asset_codes: List[str],
+        metric: str,
+        window_minutes: int,
+        agg_type: str = "avg"
+    ) -> Dict[str, float]:
+        """Aggregated metric value by asset code, for many assets at once."""
+        if agg_type not in AGGREGATIONS:
+            raise ValueError(f"Unsupported aggregation: {agg_type}")
+        
+        since = time.time() - window_minutes * 60
+        covered = {}
+        missing = []
+        for code in asset_codes:
+            asset_id = self._asset_id(code)
+            if asset_id is not None and self.store.covers(asset_id, metric, since):
+                covered[code] = asset_id
+            else:
+                missing.append(code)
+        
+        results = self.store.aggregate(list(covered.values()), metric, since, agg_type)
+        values = {
+            code: float(value)
+            for code, value in zip(covered, results)
+            if not np.isnan(value)
+        }
+        if missing:
+            values.update(self.fallback.get_metric_aggregations(missing, metric, window_minutes, agg_type))
+        return values
+    
+    def get_asset_aggregates(
+        self,
+        asset_codes: List[str],
+        aggregates: List[Tuple[str, str]],
+        window_minutes: int
+    ) -> Dict[str, Dict[Tuple[str, str], float]]:
+        """(agg_type, metric) aggregates by asset code, for many assets at once."""
+        for agg_type, _ in aggregates:
+            if agg_type not in AGGREGATIONS:
+                raise ValueError(f"Unsupported aggregation: {agg_type}")
+        
+        # Assets are served from the store only if it covers all their metrics
+        since = time.time() - window_minutes * 60
+        metrics = {metric for _, metric in aggregates}
+        covered = {}
+        missing = []
+        for code in asset_codes:
+            asset_id = self._asset_id(code)
+            if asset_id is not None and all(self.store.covers(asset_id, metric, since) for metric in metrics):
+                covered[code] = asset_id
+            else:
+                missing.append(code)
+        
+        values: Dict[str, Dict[Tuple[str, str], float]] = {code: {} for code in covered}
+        for agg_type, metric in aggregates:
+            results = self.store.aggregate(list(covered.values()), metric, since, agg_type)
+            for code, value in zip(covered, results):
+                if not np.isnan(value):
+                    values[code][(agg_type, metric)] = float(value)
+        if missing:
+            values.update(self.fallback.get_asset_aggregates(missing, aggregates, window_minutes))
+        return values
+    
+    def get_recent_metric_values(
+        self,
+        asset_code: str,
+        metric: str,
+        count: int = 5
+    ) -> List[float]:
+        """Most recent metric values for an asset, newest first."""
+        asset_id = self._asset_id(asset_code)
+        window = self.store.window(asset_id, metric, count=count) if asset_id is not None else None
+        if window is None or not len(window[1]):
+            return self.fallback.get_recent_metric_values(asset_code, metric, count)
+        return window[1][::-1].tolist()
+    
+    def get_latest_metric(self, asset_code: str, metric: str) -> Optional[float]:
+        """Get the latest value of a metric for an asset."""
+        values = self.get_recent_metric_values(asset_code, metric, count=1)
+        return values[0] if values else None
+    
+    def get_metric_window(
+        self,
+        asset_code: str,
+        metric: str,
+        window_minutes: int
+    ) -> Tuple[List[datetime], List[float]]:
+        """Samples of a metric over a time window, oldest first."""
+        asset_id = self._asset_id(asset_code)
+        since = time.time() - window_minutes * 60
+        if asset_id is None or not self.store.covers(asset_id, metric, since):
+            return self.fallback.get_metric_window(asset_code, metric, window_minutes)
+        
+        window = self.store.window(asset_id, metric, since=since)
+        if window is None:
+            return [], []
+        timestamps, values = window
+        return [datetime.utcfromtimestamp(ts) for ts in timestamps.tolist()], values.tolist()
+    
+    def get_metric_histograms(
+        self,
+        asset_codes: List[str],
+        metrics: List[str],
+        start: datetime,
+        end: datetime,
+        interval_seconds: int
+    ) -> Dict[str, Dict[str, Histogram]]:
+        """Backtest histories are older than the hot store, served by the fallback."""
+        return self.fallback.get_metric_histograms(asset_codes, metrics, start, end, interval_seconds)
+
+
+# Singleton instance
+if settings.telemetry_backend == "postgres":
+    telemetry_backend = PostgresTelemetryBackend()
+else:
+    telemetry_backend = es_client
+if settings.hot_store_enabled:
+    telemetry_backend = HotStoreTelemetryBackend(hot_store, telemetry_backend)
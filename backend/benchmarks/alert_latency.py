@@ -0,0 +1,382 @@
+"""
+Anomaly-to-alert latency benchmark.
+
+Injects faults into a benchmark fleet (site BENCH-S1, simulator fleet
+model) and measures how long after each fault starts the first alert for
+that asset appears, with missed detections and false positives.
+
+Simulated mode (default) runs the real rule engine against PostgreSQL
+(DATABASE_URL) but replaces Elasticsearch with an in-memory telemetry
+store and drives a virtual clock, so hours of telemetry run in seconds
+and rule_engine_interval / policy windows can be swept:
+
+    cd backend
+    python -m benchmarks.alert_latency --intervals 30,60,120 --windows db,5,15
+
+Live mode publishes the same fleet through MQTT to a running stack and
+polls alerts.triggered_at (the backend's own interval and windows apply):
+
+    python -m benchmarks.alert_latency --live --mqtt-broker localhost
+
+Only the BENCH-S1 site, its assets and their alerts/work orders are
+created or deleted; other data is left untouched. Needs the backend and
+simulator requirements installed.
+"""
+
+import sys
+import time
+import random
+import bisect
+import logging
+import argparse
+from collections import namedtuple
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import text
+
+# Simulator modules (fleet model with fault injection)
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "simulator"))
+
+from fleet_model import Fault, FleetModel  # noqa: E402
+from simulator import EQUIPMENT  # noqa: E402
+
+from app import main as _app  # noqa: E402,F401  (configures mappers)
+from app.database import SessionLocal  # noqa: E402
+from app.services import rule_engine as rule_engine_module  # noqa: E402
+from app.services.registry import catalog  # noqa: E402
+
+logger = logging.getLogger("alert-latency")
+
+BENCH_SITE = "BENCH-S1"
+
+Detection = namedtuple("Detection", ["asset_code", "metric", "severity", "detected_at"])
+
+
+# ==========================================
+# Benchmark fleet
+# ==========================================
+
+def bench_topics(assets_per_type):
+    """Simulator topics of the benchmark fleet."""
+    return [
+        f"{BENCH_SITE.lower()}/{asset_type}/{n}"
+        for asset_type in EQUIPMENT
+        for n in range(1, assets_per_type + 1)
+    ]
+
+
+def topic_asset_code(topic):
+    """Asset code for a simulator topic, as resolved by the bridge registry."""
+    site, asset_type, n = topic.split("/")
+    return f"{site.upper()}-{asset_type.upper()}_{n}"
+
+
+def seed_bench_fleet(db, topics):
+    """Create the benchmark site and assets if missing."""
+    db.execute(text(
+        "INSERT INTO sites (code, name, address) VALUES (:code, 'Benchmark site', 'Simulated') "
+        "ON CONFLICT (code) DO NOTHING"
+    ), {"code": BENCH_SITE})
+    db.execute(text(
+        "INSERT INTO assets (code, type, site_id, status) "
+        "SELECT :code, :type, id, 'OK' FROM sites WHERE code = :site "
+        "ON CONFLICT (code) DO NOTHING"
+    ), [
+        {"code": topic_asset_code(topic), "type": topic.split("/")[1].upper(), "site": BENCH_SITE}
+        for topic in topics
+    ])
+    db.commit()
+
+
+def reset_bench_alerts(db):
+    """Delete alerts, work orders and forecasts of the benchmark assets and reset their status."""
+    bench_assets = "SELECT a.id FROM assets a JOIN sites s ON s.id = a.site_id WHERE s.code = :site"
+    db.execute(text(
+        f"DELETE FROM work_orders WHERE alert_id IN (SELECT id FROM alerts WHERE asset_id IN ({bench_assets}))"
+    ), {"site": BENCH_SITE})
+    db.execute(text(f"DELETE FROM alerts WHERE asset_id IN ({bench_assets})"), {"site": BENCH_SITE})
+    db.execute(text(f"DELETE FROM runtime_forecasts WHERE asset_id IN ({bench_assets})"), {"site": BENCH_SITE})
+    db.execute(text(f"UPDATE assets SET status = 'OK' WHERE id IN ({bench_assets})"), {"site": BENCH_SITE})
+    db.commit()
+
+
+def new_detections(db, after_id):
+    """Alerts of benchmark assets with id > after_id, and the highest alert id."""
+    rows = db.execute(text(
+        "SELECT al.id, a.code, p.metric, al.severity, al.triggered_at "
+        "FROM alerts al "
+        "JOIN assets a ON a.id = al.asset_id "
+        "JOIN sites s ON s.id = a.site_id "
+        "LEFT JOIN maintenance_policies p ON p.id = al.policy_id "
+        "WHERE s.code = :site AND al.id > :after_id "
+        "ORDER BY al.id"
+    ), {"site": BENCH_SITE, "after_id": after_id}).all()
+    return rows, max([after_id] + [row.id for row in rows])
+
+
+def count_work_orders(db):
+    """Work orders created for benchmark alerts."""
+    return db.execute(text(
+        "SELECT count(*) FROM work_orders w "
+        "JOIN alerts al ON al.id = w.alert_id "
+        "JOIN assets a ON a.id = al.asset_id "
+        "JOIN sites s ON s.id = a.site_id "
+        "WHERE s.code = :site"
+    ), {"site": BENCH_SITE}).scalar()
+
+
+def schedule_faults(topics, fault_fraction, warmup, spread, duration, seed):
+    """One fault on a random share of assets, starting within [warmup, warmup + spread)."""
+    rng = random.Random(seed)
+    faulted = rng.sample(topics, max(1, int(len(topics) * fault_fraction)))
+    return [Fault(topic, None, warmup + rng.uniform(0, spread), duration) for topic in sorted(faulted)]
+
+
+# ==========================================
+# Simulated mode: virtual clock and in-memory telemetry
+# ==========================================
+
+class InMemoryTelemetryStore:
+    """
+    Telemetry backend (see app/services/telemetry.py) backed by per-asset/metric series.
+    
+    Samples become visible ingest_delay seconds after their timestamp, as
+    they would once indexed; `now` is the virtual clock in seconds.
+    """
+    
+    def __init__(self, ingest_delay=0.0):
+        self.ingest_delay = ingest_delay
+        self.now = 0.0
+        self.series = {}
+    
+    def add(self, timestamp, asset_code, metric, value):
+        times, values = self.series.setdefault((asset_code, metric), ([], []))
+        times.append(timestamp + self.ingest_delay)
+        values.append(value)
+    
+    def _visible(self, asset_code, metric, since=None):
+        times, values = self.series.get((asset_code, metric), ([], []))
+        end = bisect.bisect_right(times, self.now)
+        start = 0 if since is None else bisect.bisect_left(times, since)
+        return values[start:end]
+    
+    def get_metric_aggregation(self, asset_code, metric, window_minutes, agg_type="avg"):
+        values = self._visible(asset_code, metric, since=self.now - window_minutes * 60)
+        if agg_type == "count":
+            return float(len(values))
+        if not values:
+            return None
+        return {"avg": np.mean, "max": np.max, "min": np.min}[agg_type](values).item()
+    
+    def get_metric_aggregations(self, asset_codes, metric, window_minutes, agg_type="avg"):
+        values = {
+            code: self.get_metric_aggregation(code, metric, window_minutes, agg_type)
+            for code in asset_codes
+        }
+        return {code: value for code, value in values.items() if value is not None}
+    
+    def get_asset_aggregates(self, asset_codes, aggregates, window_minutes):
+        results = {}
+        for agg_type, metric in aggregates:
+            values = self.get_metric_aggregations(asset_codes, metric, window_minutes, agg_type)
+            for code, value in values.items():
+                results.setdefault(code, {})[(agg_type, metric)] = value
+        return results
+    
+    def get_recent_metric_values(self, asset_code, metric, count=5):
+        return self._visible(asset_code, metric)[-count:][::-1]
+    
+    def get_latest_metric(self, asset_code, metric):
+        values = self._visible(asset_code, metric)
+        return values[-1] if values else None
+
+
+def _with_window(policy, window_minutes):
+    """Copy of a policy row with another window_minutes."""
+    values = policy._asdict()
+    values["window_minutes"] = window_minutes
+    return namedtuple("Policy", values)(**values)
+
+
+class BenchCatalog:
+    """Catalog view limited to the benchmark assets, with optional policy windows."""
+    
+    def __init__(self, window_minutes=None):
+        self.window_minutes = window_minutes
+    
+    def get_assets(self, asset_type=None):
+        site = catalog.get_site_by_code(BENCH_SITE)
+        return [a for a in catalog.get_assets(asset_type) if a.site_id == site.id]
+    
+    def get_active_policies(self, asset_type=None):
+        policies = catalog.get_active_policies(asset_type)
+        if self.window_minutes is None:
+            return policies
+        return [
+            _with_window(p, self.window_minutes) if p.window_minutes else p
+            for p in policies
+        ]
+
+
+def run_simulated(topics, faults, interval, window, args):
+    """Run one configuration on a virtual clock; returns detections by asset code."""
+    store = InMemoryTelemetryStore(args.ingest_delay)
+    model = FleetModel(topics, EQUIPMENT, seed=args.seed, faults=faults)
+    rule_engine_module.telemetry_backend = store
+    rule_engine_module.catalog = BenchCatalog(window)
+    # A fresh engine per configuration: zscore baselines trained by the
+    # previous run (faults included) would skew its latencies
+    engine = rule_engine_module.RuleEngine()
+    
+    db = SessionLocal()
+    try:
+        reset_bench_alerts(db)
+        _, last_id = new_detections(db, 0)
+        detections = []
+        end = max(f.start + f.duration for f in faults) + args.grace
+        next_evaluation = interval
+        t = 0.0
+        while t <= end:
+            values = model.tick(t, args.sample_interval)
+            for topic, metrics in model.samples(values):
+                asset_code = topic_asset_code(topic)
+                for metric, value in metrics.items():
+                    store.add(t, asset_code, metric, value)
+            
+            t += args.sample_interval
+            while next_evaluation <= t:
+                store.now = next_evaluation
+                engine.evaluate_all_policies()
+                rows, last_id = new_detections(db, last_id)
+                detections.extend(
+                    Detection(row.code, row.metric, row.severity, next_evaluation) for row in rows
+                )
+                next_evaluation += interval
+        return detections, count_work_orders(db)
+    finally:
+        db.close()
+
+
+# ==========================================
+# Live mode: running stack
+# ==========================================
+
+def run_live(topics, faults, args):
+    """Publish the benchmark fleet over MQTT and poll alerts.triggered_at."""
+    import paho.mqtt.client as mqtt
+    from telemetry_codec import encode_payload
+    
+    client = mqtt.Client(client_id="alert-latency-benchmark")
+    client.connect(args.mqtt_broker, args.mqtt_port, 60)
+    client.loop_start()
+    
+    model = FleetModel(topics, EQUIPMENT, seed=args.seed, faults=faults)
+    db = SessionLocal()
+    try:
+        reset_bench_alerts(db)
+        _, last_id = new_detections(db, 0)
+        detections = []
+        started = datetime.utcnow().timestamp()
+        end = max(f.start + f.duration for f in faults) + args.grace
+        elapsed = 0.0
+        while elapsed <= end:
+            timestamp = datetime.utcnow().isoformat() + "Z"
+            for topic, metrics in model.samples(model.tick(elapsed, args.sample_interval)):
+                client.publish(topic, encode_payload({"timestamp": timestamp, "metrics": metrics}))
+            
+            rows, last_id = new_detections(db, last_id)
+            detections.extend(
+                Detection(row.code, row.metric, row.severity, row.triggered_at.timestamp() - started)
+                for row in rows
+            )
+            time.sleep(max(0.0, started + elapsed + args.sample_interval - datetime.utcnow().timestamp()))
+            elapsed = datetime.utcnow().timestamp() - started
+        return detections, count_work_orders(db)
+    finally:
+        db.close()
+        client.loop_stop()
+        client.disconnect()
+
+
+# ==========================================
+# Report
+# ==========================================
+
+def summarize(label, faults, detections, work_orders):
+    """Log latency percentiles, misses and false positives for one configuration."""
+    fault_by_code = {topic_asset_code(f.topic): f for f in faults}
+    first_alert = {}
+    false_positives = 0
+    for detection in detections:
+        fault = fault_by_code.get(detection.asset_code)
+        if fault is None or detection.detected_at < fault.start:
+            false_positives += 1
+        elif detection.asset_code not in first_alert:
+            first_alert[detection.asset_code] = detection.detected_at - fault.start
+    
+    latencies = np.array(sorted(first_alert.values()))
+    missed = len(faults) - len(latencies)
+    if len(latencies):
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        latency = f"p50={p50:.0f}s p95={p95:.0f}s p99={p99:.0f}s max={latencies.max():.0f}s"
+    else:
+        latency = "no detections"
+    logger.info(
+        f"{label}: {latency}, detected={len(latencies)}/{len(faults)}, missed={missed}, "
+        f"false_positives={false_positives}, alerts={len(detections)}, work_orders={work_orders}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure anomaly-to-alert latency")
+    parser.add_argument("--assets-per-type", type=int, default=10, help="Benchmark assets of each type")
+    parser.add_argument("--fault-fraction", type=float, default=0.3, help="Share of assets given a fault")
+    parser.add_argument("--fault-duration", type=float, default=1800, help="Fault length in seconds")
+    parser.add_argument("--warmup", type=float, default=1200, help="Seconds of normal data before faults")
+    parser.add_argument("--spread", type=float, default=1800, help="Fault start times spread in seconds")
+    parser.add_argument("--grace", type=float, default=600, help="Seconds to keep running after the last fault")
+    parser.add_argument("--sample-interval", type=float, default=10, help="Seconds between samples per asset")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--intervals", default="120", help="Simulated rule_engine_interval values (s)")
+    parser.add_argument("--windows", default="db", help="Policy window_minutes values, 'db' = as configured")
+    parser.add_argument("--ingest-delay", type=float, default=2.0, help="Simulated sensor-to-index delay (s)")
+    parser.add_argument("--live", action="store_true", help="Run against the running stack in real time")
+    parser.add_argument("--mqtt-broker", default="localhost")
+    parser.add_argument("--mqtt-port", type=int, default=1883)
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    logging.getLogger("RuleEngine").setLevel(logging.ERROR)
+    
+    topics = bench_topics(args.assets_per_type)
+    db = SessionLocal()
+    try:
+        seed_bench_fleet(db, topics)
+    finally:
+        db.close()
+    catalog.invalidate()
+    
+    faults = schedule_faults(topics, args.fault_fraction, args.warmup, args.spread, args.fault_duration, args.seed)
+    logger.info(f"{len(topics)} benchmark assets, {len(faults)} faults of {args.fault_duration:.0f}s")
+    
+    if args.live:
+        detections, work_orders = run_live(topics, faults, args)
+        summarize("live", faults, detections, work_orders)
+        return
+    
+    for interval in [int(v) for v in args.intervals.split(",")]:
+        for window in args.windows.split(","):
+            window_minutes = None if window == "db" else int(window)
+            started = time.perf_counter()
+            detections, work_orders = run_simulated(topics, faults, interval, window_minutes, args)
+            summarize(
+                f"interval={interval}s window={window if window_minutes is None else f'{window_minutes}min'} "
+                f"({time.perf_counter() - started:.1f}s wall)",
+                faults, detections, work_orders
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Fast list serialization (FAST_SERIALIZATION) must not change the responses.
+
+The alert, work order and asset list endpoints encode plain row dicts with
+orjson in fast mode and go through the Pydantic response schemas otherwise;
+both must produce the same JSON. Runs against the database of DATABASE_URL
+(database/init.sql schema) and is skipped when it is unreachable.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app.config import settings
+from app.database import SessionLocal, engine
+from app.main import app
+from app.models.alert import Alert
+from app.models.workorder import WorkOrder
+from app.services.registry import catalog
+
+
+def _database_available() -> bool:
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        return True
+    except Exception:
+        return False
+
+
+pytestmark = pytest.mark.skipif(not _database_available(), reason="PostgreSQL not reachable")
+
+
+@pytest.fixture(scope="module")
+def seeded():
+    """An asset with open and closed alerts, one of them with a work order."""
+    asset = catalog.get_assets()[0]
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        db.execute(text("SELECT ensure_hot_partitions(0)"))
+        alerts = [
+            Alert(
+                asset_id=asset.id, policy_id=None, triggered_at=now, severity="HIGH",
+                status="open", message="serialization test: open", metric_value=27.125
+            ),
+            Alert(
+                asset_id=asset.id, policy_id=None, triggered_at=now - timedelta(minutes=5),
+                severity="LOW", status="closed", message="serialization test: closed",
+                metric_value=None, acknowledged_at=now - timedelta(minutes=4), closed_at=now
+            ),
+        ]
+        db.add_all(alerts)
+        db.flush()
+        work_order = WorkOrder(
+            alert_id=alerts[0].id, created_at=now, status="open", priority="HIGH", notes=None
+        )
+        db.add(work_order)
+        db.commit()
+        yield asset
+        
+        db.delete(work_order)
+        for alert in alerts:
+            db.delete(alert)
+        db.commit()
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize("url", [
+    "/api/v1/alerts?limit=500",
+    "/api/v1/alerts?status=open&severity=HIGH",
+    "/api/v1/workorders?limit=500",
+    "/api/v1/sites/{site_id}/assets",
+])
+def test_fast_serialization_matches_schema(seeded, monkeypatch, url):
+    client = TestClient(app)
+    url = url.format(site_id=seeded.site_id)
+    
+    monkeypatch.setattr(settings, "fast_serialization", False)
+    slow = client.get(url)
+    monkeypatch.setattr(settings, "fast_serialization", True)
+    fast = client.get(url)
+    
+    assert slow.status_code == fast.status_code == 200
+    assert fast.json() == slow.json()
+    assert fast.json()["total"] > 0
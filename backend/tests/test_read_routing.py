@@ -0,0 +1,91 @@
+"""
+Reads made on behalf of API requests must not use the worker pool.
+
+Catalog reloads and PostgreSQL telemetry lookups are shared by the rule
+engine and the API. Inside a request, telemetry lookups check out
+connections from read_engine (DATABASE_READ_URL); catalog reloads, whose
+snapshot is cached for every caller, stay on the primary through
+api_engine. Needs
+DATABASE_READ_URL pointing at a second PostgreSQL instance (a replica, or
+any server holding a copy of the schema); skipped otherwise.
+"""
+
+from collections import Counter
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, text
+
+from app.config import settings
+from app.database import api_engine, api_request, engine, read_engine
+from app.main import app
+from app.services.registry import catalog
+from app.services.telemetry import PostgresTelemetryBackend
+
+
+def _system_identifier(target):
+    with target.connect() as conn:
+        return conn.execute(text("SELECT system_identifier FROM pg_control_system()")).scalar()
+
+
+def _second_instance() -> bool:
+    if not settings.database_read_url:
+        return False
+    try:
+        return _system_identifier(engine) != _system_identifier(read_engine)
+    except Exception:
+        return False
+
+
+pytestmark = pytest.mark.skipif(
+    not _second_instance(), reason="DATABASE_READ_URL is not a second reachable PostgreSQL instance"
+)
+
+
+@pytest.fixture
+def checkouts():
+    """Connection checkouts per pool ("worker", "api", "read") during a test."""
+    counts = Counter()
+    listeners = []
+    for name, target in (("worker", engine), ("api", api_engine), ("read", read_engine)):
+        def listener(*args, name=name):
+            counts[name] += 1
+        event.listen(target.pool, "checkout", listener)
+        listeners.append((target.pool, listener))
+    yield counts
+    for pool, listener in listeners:
+        event.remove(pool, "checkout", listener)
+
+
+def test_catalog_reload_in_request_uses_primary(checkouts):
+    catalog.invalidate()
+    response = TestClient(app).get("/api/v1/sites")
+    
+    assert response.status_code == 200
+    # The snapshot is cached for every caller: never load it from a replica
+    assert checkouts["api"] == 1
+    assert checkouts["worker"] == 0
+
+
+def test_catalog_reload_outside_requests_uses_worker_pool(checkouts):
+    catalog.invalidate()
+    catalog.get_sites()
+    
+    assert checkouts["worker"] == 1
+    assert checkouts["read"] == 0
+
+
+def test_telemetry_reads_in_request_use_read_pool(checkouts):
+    asset = catalog.get_assets()[0]
+    backend = PostgresTelemetryBackend()
+    checkouts.clear()
+    
+    token = api_request.set(True)
+    try:
+        backend.get_metric_window(asset.code, "power_kw", 60)
+        backend.get_metric_aggregations([asset.code], "power_kw", 5, "avg")
+    finally:
+        api_request.reset(token)
+    
+    assert checkouts["read"] > 0
+    assert checkouts["worker"] == 0
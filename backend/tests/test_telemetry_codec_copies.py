@@ -0,0 +1,26 @@
+"""
+The simulator and the MQTT bridge each ship a copy of telemetry_codec.py.
+
+They are built from separate Docker contexts, so the module cannot be
+shared by import; both copies must stay byte-identical or devices and the
+bridge would disagree on the binary encoding (metric ids, schema version).
+"""
+
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+COPIES = [REPO_ROOT / "simulator" / "telemetry_codec.py", REPO_ROOT / "mqtt-bridge" / "telemetry_codec.py"]
+
+
+def test_codec_copies_are_identical():
+    missing = [str(path) for path in COPIES if not path.exists()]
+    if missing:
+        pytest.skip(f"not running from a full checkout: {', '.join(missing)} missing")
+    
+    first, second = (path.read_bytes() for path in COPIES)
+    assert first == second, (
+        "simulator/telemetry_codec.py and mqtt-bridge/telemetry_codec.py have diverged; "
+        "apply the change to both copies"
+    )
@@ -26,50 +26,376 @@ CREATE TABLE maintenance_policies (
     id SERIAL PRIMARY KEY,
     asset_type VARCHAR(20) NOT NULL,
     metric VARCHAR(50) NOT NULL,
-    rule_type VARCHAR(20) NOT NULL CHECK (rule_type IN ('threshold', 'runtime', 'rate_of_change')),
-    threshold FLOAT NOT NULL,
-    condition VARCHAR(5) NOT NULL CHECK (condition IN ('>', '<', '>=', '<=', '=')),
+    rule_type VARCHAR(20) NOT NULL CHECK (rule_type IN ('threshold', 'runtime', 'rate_of_change', 'zscore', 'compound')),
+    threshold FLOAT,
+    condition VARCHAR(5) CHECK (condition IN ('>', '<', '>=', '<=', '=')),
     window_minutes INTEGER,
     severity VARCHAR(10) NOT NULL CHECK (severity IN ('LOW', 'MEDIUM', 'HIGH')),
     description TEXT NOT NULL,
     active BOOLEAN DEFAULT TRUE,
-    created_at TIMESTAMP DEFAULT NOW()
+    created_at TIMESTAMP DEFAULT NOW(),
+    -- compound policies: boolean expression over several metrics (see
+    -- backend/app/services/compound.py); metric holds the first one
+    expression TEXT,
+    CHECK (
+        CASE WHEN rule_type = 'compound'
+            THEN expression IS NOT NULL
+            ELSE threshold IS NOT NULL AND condition IS NOT NULL
+        END
+    )
 );
 
 -- Alerts table
+-- Range-partitioned by month on triggered_at (see PARTITIONING below).
+-- The partition key must be part of the primary key.
 CREATE TABLE alerts (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     asset_id INTEGER REFERENCES assets(id) ON DELETE CASCADE,
     policy_id INTEGER REFERENCES maintenance_policies(id) ON DELETE SET NULL,
-    triggered_at TIMESTAMP DEFAULT NOW(),
+    triggered_at TIMESTAMP NOT NULL DEFAULT NOW(),
     severity VARCHAR(10) NOT NULL CHECK (severity IN ('LOW', 'MEDIUM', 'HIGH')),
     status VARCHAR(10) DEFAULT 'open' CHECK (status IN ('open', 'ack', 'closed')),
     message TEXT NOT NULL,
     metric_value FLOAT,
     acknowledged_at TIMESTAMP,
-    closed_at TIMESTAMP
-);
+    closed_at TIMESTAMP,
+    PRIMARY KEY (id, triggered_at)
+) PARTITION BY RANGE (triggered_at);
 
 -- Work Orders table
+-- Range-partitioned by month on created_at. alert_id cannot reference the
+-- partitioned alerts table (its unique key includes triggered_at), so the
+-- link is kept by the application and the archival job.
 CREATE TABLE work_orders (
-    id SERIAL PRIMARY KEY,
-    alert_id INTEGER REFERENCES alerts(id) ON DELETE CASCADE,
-    created_at TIMESTAMP DEFAULT NOW(),
+    id SERIAL,
+    alert_id INTEGER NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
     closed_at TIMESTAMP,
     status VARCHAR(20) DEFAULT 'open' CHECK (status IN ('open', 'in_progress', 'done', 'cancelled')),
     priority VARCHAR(10) DEFAULT 'MEDIUM' CHECK (priority IN ('LOW', 'MEDIUM', 'HIGH')),
     assigned_to VARCHAR(100),
-    notes TEXT
+    notes TEXT,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- Archive tables (cold history), partitioned by year
+CREATE TABLE alerts_archive (LIKE alerts INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+    PARTITION BY RANGE (triggered_at);
+
+CREATE TABLE work_orders_archive (LIKE work_orders INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+    PARTITION BY RANGE (created_at);
+
+-- Remaining-useful-life forecasts of runtime policies (run_hours,
+-- door_cycles): usage rate fitted from successive readings, predicted
+-- threshold crossing and when the rule engine next needs to read the
+-- metric (see backend/app/services/forecasting.py)
+CREATE TABLE runtime_forecasts (
+    asset_id INTEGER NOT NULL REFERENCES assets(id) ON DELETE CASCADE,
+    policy_id INTEGER NOT NULL REFERENCES maintenance_policies(id) ON DELETE CASCADE,
+    last_value FLOAT NOT NULL,
+    last_reading_at TIMESTAMP NOT NULL,
+    rate_per_hour FLOAT,
+    predicted_at TIMESTAMP,
+    next_check_at TIMESTAMP NOT NULL,
+    alert_id INTEGER,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (asset_id, policy_id)
 );
 
+-- Telemetry metric names, referenced by id from the narrow telemetry rows
+CREATE TABLE telemetry_metrics (
+    id SMALLSERIAL PRIMARY KEY,
+    name VARCHAR(50) UNIQUE NOT NULL
+);
+
+-- Optional telemetry sink for the rule engine (TELEMETRY_BACKEND=postgres),
+-- written in COPY batches by indexer/pg_sink.py. Range-partitioned by day
+-- on ts (UTC); no foreign keys to keep ingestion cheap.
+CREATE TABLE telemetry (
+    asset_id INTEGER NOT NULL,
+    metric_id SMALLINT NOT NULL,
+    ts TIMESTAMP NOT NULL,
+    value DOUBLE PRECISION NOT NULL
+) PARTITION BY RANGE (ts);
+
 -- Indexes for performance
 CREATE INDEX idx_assets_site_id ON assets(site_id);
 CREATE INDEX idx_assets_type ON assets(type);
 CREATE INDEX idx_alerts_asset_id ON alerts(asset_id);
-CREATE INDEX idx_alerts_status ON alerts(status);
+CREATE INDEX idx_alerts_triggered_at ON alerts(triggered_at);
 CREATE INDEX idx_alerts_severity ON alerts(severity);
+-- Open alerts are a tiny fraction of the history: the rule engine's
+-- "already open" check and the dashboard counters only use this index
+CREATE INDEX idx_alerts_open ON alerts(asset_id, policy_id) WHERE status = 'open';
 CREATE INDEX idx_work_orders_status ON work_orders(status);
 CREATE INDEX idx_work_orders_alert_id ON work_orders(alert_id);
+CREATE INDEX idx_work_orders_open ON work_orders(created_at) WHERE status IN ('open', 'in_progress');
+CREATE INDEX idx_alerts_archive_asset_id ON alerts_archive(asset_id);
+CREATE INDEX idx_work_orders_archive_alert_id ON work_orders_archive(alert_id);
+-- Rows arrive in time order: a BRIN index covers time-range scans at a
+-- fraction of a btree's size; rule lookups use the per-series btree
+CREATE INDEX idx_telemetry_ts ON telemetry USING BRIN (ts);
+CREATE INDEX idx_telemetry_series ON telemetry(asset_id, metric_id, ts);
+
+-- =============================================
+-- CATALOG CHANGE NOTIFICATIONS
+-- =============================================
+
+-- Backend workers cache sites, assets and policies in memory and
+-- LISTEN on this channel to invalidate them (payload: table name).
+-- Row-level triggers skip updates that change nothing (e.g. the rule
+-- engine re-raising an asset status); notifications with the same payload
+-- are merged by PostgreSQL within a transaction, so bulk writes send one.
+CREATE OR REPLACE FUNCTION notify_catalog_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('catalog_changed', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER sites_catalog_change
+    AFTER INSERT OR DELETE ON sites
+    FOR EACH ROW EXECUTE FUNCTION notify_catalog_change();
+
+CREATE TRIGGER sites_catalog_update
+    AFTER UPDATE ON sites
+    FOR EACH ROW WHEN (OLD.* IS DISTINCT FROM NEW.*)
+    EXECUTE FUNCTION notify_catalog_change();
+
+CREATE TRIGGER sites_catalog_truncate
+    AFTER TRUNCATE ON sites
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_catalog_change();
+
+CREATE TRIGGER assets_catalog_change
+    AFTER INSERT OR DELETE ON assets
+    FOR EACH ROW EXECUTE FUNCTION notify_catalog_change();
+
+CREATE TRIGGER assets_catalog_update
+    AFTER UPDATE ON assets
+    FOR EACH ROW WHEN (OLD.* IS DISTINCT FROM NEW.*)
+    EXECUTE FUNCTION notify_catalog_change();
+
+CREATE TRIGGER assets_catalog_truncate
+    AFTER TRUNCATE ON assets
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_catalog_change();
+
+CREATE TRIGGER maintenance_policies_catalog_change
+    AFTER INSERT OR DELETE ON maintenance_policies
+    FOR EACH ROW EXECUTE FUNCTION notify_catalog_change();
+
+CREATE TRIGGER maintenance_policies_catalog_update
+    AFTER UPDATE ON maintenance_policies
+    FOR EACH ROW WHEN (OLD.* IS DISTINCT FROM NEW.*)
+    EXECUTE FUNCTION notify_catalog_change();
+
+CREATE TRIGGER maintenance_policies_catalog_truncate
+    AFTER TRUNCATE ON maintenance_policies
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_catalog_change();
+
+-- =============================================
+-- PARTITIONING
+-- =============================================
+
+-- Create the partition of a range-partitioned table covering ts.
+-- bucket is 'day' (telemetry), 'month' (hot tables) or 'year' (archive tables).
+-- Rows of that range already in the parent's default partition (written
+-- before the partition existed) would make CREATE ... PARTITION OF fail:
+-- they are moved into the new table before it is attached.
+-- Callers (pg_sink, every backend's archiver) may race: creation is
+-- serialized per parent by a transaction-level advisory lock.
+CREATE OR REPLACE FUNCTION ensure_partition(parent TEXT, bucket TEXT, ts TIMESTAMP)
+RETURNS VOID AS $$
+DECLARE
+    start_ts TIMESTAMP := date_trunc(bucket, ts);
+    end_ts TIMESTAMP := date_trunc(bucket, ts) + ('1 ' || bucket)::INTERVAL;
+    part_name TEXT := parent || '_p' || to_char(
+        date_trunc(bucket, ts),
+        CASE bucket WHEN 'year' THEN 'YYYY' WHEN 'day' THEN 'YYYY_MM_DD' ELSE 'YYYY_MM' END
+    );
+    default_part REGCLASS;
+    key_column TEXT;
+    has_rows BOOLEAN := FALSE;
+BEGIN
+    IF to_regclass(part_name) IS NOT NULL THEN
+        RETURN;
+    END IF;
+    
+    -- Re-check once the lock is held: a concurrent caller may have created
+    -- it. Query pg_class with a fresh snapshot; to_regclass() goes through
+    -- the catalog cache, which an advisory lock does not refresh.
+    PERFORM pg_advisory_xact_lock(hashtext(parent));
+    IF EXISTS (
+        SELECT 1 FROM pg_class c
+        WHERE c.relname = part_name
+          AND c.relnamespace = (SELECT p.relnamespace FROM pg_class p WHERE p.oid = parent::REGCLASS)
+    ) THEN
+        RETURN;
+    END IF;
+    
+    SELECT NULLIF(pt.partdefid, 0)::REGCLASS,
+           substring(pg_get_partkeydef(pt.partrelid) FROM '\((.*)\)')
+    INTO default_part, key_column
+    FROM pg_partitioned_table pt
+    WHERE pt.partrelid = parent::REGCLASS;
+    
+    IF default_part IS NOT NULL THEN
+        EXECUTE format(
+            'SELECT EXISTS (SELECT 1 FROM %s WHERE %I >= %L AND %I < %L)',
+            default_part, key_column, start_ts, key_column, end_ts
+        ) INTO has_rows;
+    END IF;
+    
+    IF NOT has_rows THEN
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+            part_name, parent, start_ts, end_ts
+        );
+        RETURN;
+    END IF;
+    
+    EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', part_name, parent);
+    EXECUTE format(
+        'WITH moved AS (DELETE FROM %s WHERE %I >= %L AND %I < %L RETURNING *) '
+        'INSERT INTO %I SELECT * FROM moved',
+        default_part, key_column, start_ts, key_column, end_ts, part_name
+    );
+    EXECUTE format(
+        'ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+        parent, part_name, start_ts, end_ts
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Create the monthly hot partitions from the current month up to
+-- months_ahead months in the future.
+CREATE OR REPLACE FUNCTION ensure_hot_partitions(months_ahead INTEGER DEFAULT 3)
+RETURNS VOID AS $$
+DECLARE
+    i INTEGER;
+BEGIN
+    FOR i IN 0..months_ahead LOOP
+        PERFORM ensure_partition('alerts', 'month', (NOW() AT TIME ZONE 'UTC') + make_interval(months => i));
+        PERFORM ensure_partition('work_orders', 'month', (NOW() AT TIME ZONE 'UTC') + make_interval(months => i));
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Move closed alerts and finished work orders older than retention into
+-- the archive tables, then drop the hot partitions left empty.
+-- Closed alerts still referenced by a hot work order stay hot.
+CREATE OR REPLACE FUNCTION archive_closed_history(retention INTERVAL)
+RETURNS TABLE (alerts_archived BIGINT, work_orders_archived BIGINT, partitions_dropped INTEGER) AS $$
+DECLARE
+    cutoff TIMESTAMP := (NOW() AT TIME ZONE 'UTC') - retention;
+    ts TIMESTAMP;
+    part RECORD;
+    is_empty BOOLEAN;
+BEGIN
+    partitions_dropped := 0;
+    
+    FOR ts IN
+        SELECT DISTINCT date_trunc('year', created_at) FROM work_orders
+        WHERE status IN ('done', 'cancelled') AND created_at < cutoff
+    LOOP
+        PERFORM ensure_partition('work_orders_archive', 'year', ts);
+    END LOOP;
+    
+    WITH moved AS (
+        DELETE FROM work_orders
+        WHERE status IN ('done', 'cancelled') AND created_at < cutoff
+        RETURNING *
+    )
+    INSERT INTO work_orders_archive SELECT * FROM moved;
+    GET DIAGNOSTICS work_orders_archived = ROW_COUNT;
+    
+    FOR ts IN
+        SELECT DISTINCT date_trunc('year', triggered_at) FROM alerts
+        WHERE status = 'closed' AND triggered_at < cutoff
+    LOOP
+        PERFORM ensure_partition('alerts_archive', 'year', ts);
+    END LOOP;
+    
+    WITH moved AS (
+        DELETE FROM alerts a
+        WHERE a.status = 'closed' AND a.triggered_at < cutoff
+          AND NOT EXISTS (SELECT 1 FROM work_orders wo WHERE wo.alert_id = a.id)
+        RETURNING a.*
+    )
+    INSERT INTO alerts_archive SELECT * FROM moved;
+    GET DIAGNOSTICS alerts_archived = ROW_COUNT;
+    
+    -- Drop hot monthly partitions that ended before the cutoff and are empty
+    FOR part IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname IN ('alerts', 'work_orders')
+          AND c.relname ~ '_p[0-9]{4}_[0-9]{2}$'
+          AND to_date(right(c.relname, 7), 'YYYY_MM') + INTERVAL '1 month' <= date_trunc('month', cutoff)
+    LOOP
+        EXECUTE format('SELECT NOT EXISTS (SELECT 1 FROM %I)', part.relname) INTO is_empty;
+        IF is_empty THEN
+            EXECUTE format('DROP TABLE %I', part.relname);
+            partitions_dropped := partitions_dropped + 1;
+        END IF;
+    END LOOP;
+    
+    RETURN NEXT;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Create the daily telemetry partitions from today up to days_ahead days
+-- in the future.
+CREATE OR REPLACE FUNCTION ensure_telemetry_partitions(days_ahead INTEGER DEFAULT 2)
+RETURNS VOID AS $$
+DECLARE
+    i INTEGER;
+BEGIN
+    FOR i IN 0..days_ahead LOOP
+        PERFORM ensure_partition('telemetry', 'day', (NOW() AT TIME ZONE 'UTC') + make_interval(days => i));
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Drop the daily telemetry partitions entirely older than retention, and
+-- delete expired rows that landed in the default partition.
+CREATE OR REPLACE FUNCTION drop_telemetry_partitions(retention INTERVAL)
+RETURNS INTEGER AS $$
+DECLARE
+    cutoff TIMESTAMP := (NOW() AT TIME ZONE 'UTC') - retention;
+    part RECORD;
+    dropped INTEGER := 0;
+BEGIN
+    FOR part IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = 'telemetry'
+          AND c.relname ~ '_p[0-9]{4}_[0-9]{2}_[0-9]{2}$'
+          AND to_date(right(c.relname, 10), 'YYYY_MM_DD') + INTERVAL '1 day' <= cutoff
+    LOOP
+        EXECUTE format('DROP TABLE %I', part.relname);
+        dropped := dropped + 1;
+    END LOOP;
+    
+    DELETE FROM telemetry_default WHERE ts < cutoff;
+    
+    RETURN dropped;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Catch-all partitions for rows outside the pre-created ranges
+CREATE TABLE alerts_default PARTITION OF alerts DEFAULT;
+CREATE TABLE work_orders_default PARTITION OF work_orders DEFAULT;
+CREATE TABLE alerts_archive_default PARTITION OF alerts_archive DEFAULT;
+CREATE TABLE work_orders_archive_default PARTITION OF work_orders_archive DEFAULT;
+CREATE TABLE telemetry_default PARTITION OF telemetry DEFAULT;
+
+SELECT ensure_hot_partitions(3);
+SELECT ensure_telemetry_partitions(2);
 
 -- =============================================
 -- SEED DATA
@@ -92,6 +418,12 @@ INSERT INTO assets (code, type, site_id, status) VALUES
     ('CAS-S2-CHILLER_1', 'CHILLER', 2, 'OK'),
     ('CAS-S2-ELEVATOR_1', 'ELEVATOR', 2, 'OK');
 
+-- Telemetry metrics published by the simulator
+INSERT INTO telemetry_metrics (name) VALUES
+    ('temp_out_air'), ('temp_supply_air'), ('power_kw'), ('vibration_level'),
+    ('water_temp_in'), ('water_temp_out'), ('run_hours'),
+    ('motor_temp'), ('door_cycles'), ('speed');
+
 -- Insert Maintenance Policies (from PRD)
 
 -- R1: HVAC - Performance clim degradee
@@ -118,6 +450,15 @@ INSERT INTO maintenance_policies (asset_type, metric, rule_type, threshold, cond
 INSERT INTO maintenance_policies (asset_type, metric, rule_type, threshold, condition, window_minutes, severity, description) VALUES
     ('ELEVATOR', 'door_cycles', 'runtime', 100000.0, '>', NULL, 'MEDIUM', 'Inspection portes a planifier - cycles eleves');
 
+-- R7: HVAC - Derive predictive (zscore: threshold in deviations from the
+-- asset's own EWMA baseline, see backend/app/services/anomaly.py)
+INSERT INTO maintenance_policies (asset_type, metric, rule_type, threshold, condition, window_minutes, severity, description) VALUES
+    ('HVAC', 'power_kw', 'zscore', 3.0, '>', 15, 'LOW', 'Derive consommation electrique - ecart inhabituel pour cet equipement');
+
+-- R8: HVAC - Surcharge clim (compound: both metrics over the same window)
+INSERT INTO maintenance_policies (asset_type, metric, rule_type, expression, window_minutes, severity, description) VALUES
+    ('HVAC', 'temp_supply_air', 'compound', 'avg(temp_supply_air) > 20 AND avg(power_kw) > 14', 15, 'MEDIUM', 'Surcharge clim - soufflage chaud et consommation elevee');
+
 -- =============================================
 -- VIEWS for reporting
 -- =============================================
@@ -0,0 +1,21 @@
+-- =============================================
+-- Load-test fleet matching the simulator's SITE_COUNT / ASSETS_PER_TYPE
+-- Sites CAS-S1..CAS-S<sites>, assets {SITE}-{TYPE}_<n> (topic {site}/{type}/<n>)
+--
+-- Usage:
+--   psql -v sites=20 -v assets_per_type=200 -f database/seed_fleet.sql
+-- Existing sites and assets are kept; the script can be re-run to grow the fleet.
+-- =============================================
+
+INSERT INTO sites (code, name, address)
+SELECT 'CAS-S' || s, 'Load test site ' || s, 'Simulated'
+FROM generate_series(1, :sites) AS s
+ON CONFLICT (code) DO NOTHING;
+
+INSERT INTO assets (code, type, site_id, status)
+SELECT si.code || '-' || t.type || '_' || n, t.type, si.id, 'OK'
+FROM generate_series(1, :sites) AS s
+JOIN sites si ON si.code = 'CAS-S' || s
+CROSS JOIN (VALUES ('HVAC'), ('CHILLER'), ('ELEVATOR')) AS t(type)
+CROSS JOIN generate_series(1, :assets_per_type) AS n
+ON CONFLICT (code) DO NOTHING;
@@ -0,0 +1,77 @@
+#!/bin/bash
+# Elasticsearch bootstrap: ingest pipelines, then index templates
+#
+# Templates reference pipelines (index.default_pipeline), and indexing into
+# an index whose default pipeline is missing fails, so pipelines are
+# installed first and any failure exits non-zero: services writing to
+# Elasticsearch wait for this container to complete successfully.
+
+ELASTICSEARCH_URL="${ELASTICSEARCH_URL:-http://elasticsearch:9200}"
+MAX_RETRIES=60
+RETRY_INTERVAL=5
+
+echo "=========================================="
+echo "Elasticsearch Pipelines and Templates"
+echo "=========================================="
+echo "Elasticsearch URL: $ELASTICSEARCH_URL"
+
+# Wait for Elasticsearch to be ready
+echo ""
+echo "Waiting for Elasticsearch to be ready..."
+retry_count=0
+
+while [ $retry_count -lt $MAX_RETRIES ]; do
+    response=$(curl -s -o /dev/null -w "%{http_code}" "$ELASTICSEARCH_URL/_cluster/health")
+    
+    if [ "$response" = "200" ]; then
+        echo "✅ Elasticsearch is ready!"
+        break
+    fi
+    
+    retry_count=$((retry_count + 1))
+    echo "Attempt $retry_count/$MAX_RETRIES - Elasticsearch not ready (HTTP $response), waiting ${RETRY_INTERVAL}s..."
+    sleep $RETRY_INTERVAL
+done
+
+if [ $retry_count -eq $MAX_RETRIES ]; then
+    echo "❌ Elasticsearch did not become ready in time. Exiting."
+    exit 1
+fi
+
+# PUT a JSON file, exiting on failure
+put() {
+    local path="$1"
+    local file="$2"
+    
+    response=$(curl -s -w "\n%{http_code}" -X PUT "$ELASTICSEARCH_URL/$path" \
+        -H "Content-Type: application/json" \
+        -d @"$file")
+    
+    http_code=$(echo "$response" | tail -n1)
+    body=$(echo "$response" | sed '$d')
+    
+    if [ "$http_code" = "200" ]; then
+        echo "✅ Installed $path"
+    else
+        echo "❌ Failed to install $path (HTTP $http_code)"
+        echo "   Response: $body"
+        exit 1
+    fi
+}
+
+echo ""
+echo "Installing ingest pipelines..."
+for file in /pipelines/*.json; do
+    put "_ingest/pipeline/$(basename "$file" .json)" "$file"
+done
+
+echo ""
+echo "Installing index templates..."
+for file in /templates/*.json; do
+    put "_index_template/$(basename "$file" -template.json)" "$file"
+done
+
+echo ""
+echo "=========================================="
+echo "Elasticsearch setup complete!"
+echo "=========================================="
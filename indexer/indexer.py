@@ -0,0 +1,283 @@
+"""
+Kafka to Elasticsearch Bulk Indexer
+
+Optional replacement for the Logstash telemetry pipeline
+(logstash/pipeline/telemetry.conf): consumes the telemetry topics in
+batches, flattens each record in place into the same document shape
+(metric_* fields, Kafka metadata, latency fields) and
+writes daily telemetry-YYYY.MM.dd indices with the bulk API.
+
+Delivery: offsets are committed only once every record of a batch has
+been indexed or permanently rejected. Rejections with a retryable status
+(429 / 5xx) are retried with backoff; if Elasticsearch is unreachable the
+batch is retried as a whole and consumption pauses. Document ids are
+derived from topic/partition/offset, so a batch redelivered after a crash
+overwrites instead of duplicating.
+
+Run it instead of Logstash (both consume the topics with their own
+consumer groups and would index every record twice).
+"""
+
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+
+import msgpack
+import orjson
+from kafka import KafkaConsumer
+from elasticsearch import Elasticsearch, helpers
+from elasticsearch.exceptions import ConnectionError as ESConnectionError, TransportError
+
+# Configuration
+KAFKA_BROKER = os.getenv("KAFKA_BROKER", "localhost:9092")
+KAFKA_TOPICS = [t for t in os.getenv("KAFKA_TOPICS", "telemetry,telemetry-msgpack").split(",") if t]
+KAFKA_GROUP = os.getenv("KAFKA_GROUP", "es-indexer")
+ELASTICSEARCH_URL = os.getenv("ELASTICSEARCH_URL", "http://localhost:9200")
+INDEX_PREFIX = os.getenv("INDEX_PREFIX", "telemetry-")
+
+# Nested metric objects of bridge messages and their flattened field prefix
+# (metrics_min / metrics_max come from aggregated windows)
+FLATTENED_METRICS = (("metrics", "metric_"), ("metrics_min", "metric_min_"), ("metrics_max", "metric_max_"))
+
+# Records per Kafka poll (one bulk batch), documents per bulk request and
+# concurrent bulk requests per batch
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", 5000))
+BATCH_TIMEOUT_MS = int(os.getenv("BATCH_TIMEOUT_MS", 500))
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", 1000))
+BULK_CHUNK_BYTES = int(os.getenv("BULK_CHUNK_BYTES", 10 * 1024 * 1024))
+BULK_THREADS = int(os.getenv("BULK_THREADS", 4))
+
+# Retries of rejected documents (429 / 5xx) before they are dropped
+MAX_RETRIES = int(os.getenv("MAX_RETRIES", 5))
+RETRY_BACKOFF_SECONDS = float(os.getenv("RETRY_BACKOFF_SECONDS", 0.5))
+STATS_INTERVAL_SECONDS = int(os.getenv("STATS_INTERVAL_SECONDS", 30))
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# Logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger("es-indexer")
+logging.getLogger("elastic_transport").setLevel(logging.WARNING)
+
+# Counters reported every STATS_INTERVAL_SECONDS
+stats_lock = threading.Lock()
+stats = {
+    "consumed": 0,
+    "indexed": 0,
+    "retried": 0,
+    "rejected": 0,
+    "undecodable": 0,
+    "batches": 0,
+}
+
+
+def count(name, n=1):
+    """Increment an indexer counter."""
+    with stats_lock:
+        stats[name] += n
+
+
+def utc_iso(epoch):
+    """ISO 8601 UTC timestamp with microseconds for an epoch time."""
+    return datetime.utcfromtimestamp(epoch).isoformat(timespec="microseconds") + "Z"
+
+
+def iso_to_epoch(value):
+    """Epoch seconds for an ISO 8601 UTC timestamp."""
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+def decode_record(record):
+    """Decode a JSON or MessagePack record, using its content-type header."""
+    headers = dict(record.headers or ())
+    if headers.get("content-type") == b"application/x-msgpack":
+        return msgpack.unpackb(record.value)
+    return orjson.loads(record.value)
+
+
+def build_document(record, received_at, received_iso):
+    """Flatten a bridge message into the telemetry document, in place."""
+    doc = decode_record(record)
+    
+    timestamp = doc.get("@timestamp")
+    if not timestamp:
+        timestamp = doc["@timestamp"] = received_iso
+    
+    doc["pipeline"] = "telemetry"
+    doc["kafka_partition"] = record.partition
+    doc["kafka_offset"] = record.offset
+    doc["kafka_timestamp"] = utc_iso(record.timestamp / 1000)
+    doc["logstash_received_at"] = received_iso
+    
+    # Latency tracing, same fields as the Logstash pipeline
+    try:
+        sensor, bridge_received, produced = (
+            iso_to_epoch(doc[field]) if doc.get(field) else None
+            for field in ("sensor_timestamp", "bridge_received_at", "bridge_produced_at")
+        )
+        if sensor and bridge_received:
+            doc["latency_sensor_to_bridge_ms"] = round((bridge_received - sensor) * 1000, 3)
+        if bridge_received and produced:
+            doc["latency_bridge_queue_ms"] = round((produced - bridge_received) * 1000, 3)
+        if produced:
+            doc["latency_kafka_to_logstash_ms"] = round((received_at - produced) * 1000, 3)
+    except ValueError:
+        doc.setdefault("tags", []).append("_latency_parse_failure")
+    
+    # Flatten metrics into metric_* fields, and the min/max of aggregated
+    # windows into metric_min_* / metric_max_*, stored once (no nested copy)
+    for field, prefix in FLATTENED_METRICS:
+        metrics = doc.pop(field, None)
+        if isinstance(metrics, dict):
+            for key, value in metrics.items():
+                doc[f"{prefix}{key}"] = value
+    
+    # Ensure required fields exist
+    for field in ("site_code", "asset_type", "asset_code"):
+        doc.setdefault(field, "UNKNOWN")
+    
+    return {
+        "_index": f"{INDEX_PREFIX}{timestamp[:4]}.{timestamp[5:7]}.{timestamp[8:10]}",
+        "_id": f"{record.topic}-{record.partition}-{record.offset}",
+        "_source": doc,
+    }
+
+
+def bulk_index(es, actions):
+    """
+    Index actions with parallel bulk requests, retrying rejected documents.
+    
+    Returns once every action is indexed or permanently rejected; raises if
+    Elasticsearch itself is unavailable so the batch is not committed.
+    """
+    attempt = 0
+    while actions:
+        retry = []
+        results = helpers.parallel_bulk(
+            es,
+            actions,
+            thread_count=BULK_THREADS,
+            chunk_size=BULK_CHUNK_SIZE,
+            max_chunk_bytes=BULK_CHUNK_BYTES,
+            raise_on_error=False,
+            raise_on_exception=True
+        )
+        # Results come back in action order
+        for action, (ok, item) in zip(actions, results):
+            if ok:
+                count("indexed")
+                continue
+            error = item.get("index", {})
+            if error.get("status") in RETRYABLE_STATUS and attempt < MAX_RETRIES:
+                retry.append(action)
+            else:
+                count("rejected")
+                logger.error(f"Rejected document {action['_id']}: {error.get('status')} {error.get('error')}")
+        
+        if retry:
+            attempt += 1
+            count("retried", len(retry))
+            logger.warning(f"Retrying {len(retry)} rejected documents (attempt {attempt}/{MAX_RETRIES})")
+            time.sleep(RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+        actions = retry
+
+
+def index_batch(es, records):
+    """Build and bulk index one poll worth of records."""
+    received_at = time.time()
+    received_iso = utc_iso(received_at)
+    actions = []
+    for record in records:
+        try:
+            actions.append(build_document(record, received_at, received_iso))
+        except (ValueError, KeyError, TypeError) as e:
+            count("undecodable")
+            logger.error(f"Skipping undecodable record {record.topic}/{record.partition}/{record.offset}: {e}")
+    
+    # Retry the whole batch while Elasticsearch is unreachable
+    backoff = RETRY_BACKOFF_SECONDS
+    while True:
+        try:
+            bulk_index(es, actions)
+            return
+        except (ESConnectionError, TransportError) as e:
+            logger.error(f"Bulk request failed, retrying in {backoff:.1f}s: {e}")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+
+def report_stats(stop_event):
+    """Periodically log throughput counters."""
+    last = dict(stats)
+    while not stop_event.wait(STATS_INTERVAL_SECONDS):
+        with stats_lock:
+            current = dict(stats)
+        rate = (current["indexed"] - last["indexed"]) / STATS_INTERVAL_SECONDS
+        logger.info(
+            f"Stats: consumed={current['consumed']}, indexed={current['indexed']} ({rate:.1f}/s), "
+            f"retried={current['retried']}, rejected={current['rejected']}, "
+            f"undecodable={current['undecodable']}, batches={current['batches']}"
+        )
+        last = current
+
+
+def create_consumer():
+    """Create the Kafka consumer with retry logic."""
+    max_retries = 30
+    retry_interval = 5
+    
+    for attempt in range(max_retries):
+        try:
+            consumer = KafkaConsumer(
+                *KAFKA_TOPICS,
+                bootstrap_servers=[KAFKA_BROKER],
+                group_id=KAFKA_GROUP,
+                enable_auto_commit=False,
+                auto_offset_reset="earliest",
+                max_poll_records=BATCH_SIZE,
+                fetch_max_bytes=64 * 1024 * 1024
+            )
+            logger.info(f"Connected to Kafka at {KAFKA_BROKER}, consuming {KAFKA_TOPICS} as {KAFKA_GROUP}")
+            return consumer
+        except Exception as e:
+            logger.warning(f"Kafka connection attempt {attempt + 1}/{max_retries} failed: {e}")
+            time.sleep(retry_interval)
+    
+    raise Exception(f"Could not connect to Kafka after {max_retries} attempts")
+
+
+def main():
+    logger.info("Starting Kafka to Elasticsearch indexer...")
+    logger.info(f"Elasticsearch: {ELASTICSEARCH_URL}, batch={BATCH_SIZE}, chunk={BULK_CHUNK_SIZE}, threads={BULK_THREADS}")
+    
+    es = Elasticsearch([ELASTICSEARCH_URL], request_timeout=60)
+    consumer = create_consumer()
+    
+    stop_event = threading.Event()
+    threading.Thread(target=report_stats, args=(stop_event,), daemon=True).start()
+    
+    try:
+        while True:
+            polled = consumer.poll(timeout_ms=BATCH_TIMEOUT_MS, max_records=BATCH_SIZE)
+            records = [record for partition_records in polled.values() for record in partition_records]
+            if not records:
+                continue
+            count("consumed", len(records))
+            index_batch(es, records)
+            # Only acknowledge what has been indexed (or permanently rejected)
+            consumer.commit()
+            count("batches")
+    except KeyboardInterrupt:
+        logger.info("Shutting down...")
+    finally:
+        stop_event.set()
+        consumer.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+MQTT to Kafka Bridge - Throughput Benchmark
+
+Publishes a burst of telemetry messages to MQTT and consumes them back
+from the Kafka topic, reporting the sustained messages/second through
+the running bridge. Run against the docker-compose stack, restarting the
+bridge with different KAFKA_PRODUCER_MODE / KAFKA_* settings to compare.
+The benchmark site is not in the asset catalog, so with the bridge's asset
+registry enabled its messages are routed to KAFKA_UNKNOWN_TOPIC (through
+the same producer); both topics are consumed and counted.
+
+With --codec-only no broker is needed: it measures bytes/message and
+encode/decode CPU time of the JSON and compact binary encodings on both
+the device (MQTT) and Kafka legs.
+
+Usage:
+    python benchmark.py --messages 100000 --assets 500 --encoding msgpack
+    python benchmark.py --codec-only --messages 100000
+"""
+
+import os
+import time
+import logging
+import argparse
+import threading
+
+import msgpack
+import orjson
+import paho.mqtt.client as mqtt
+from kafka import KafkaAdminClient, KafkaConsumer
+from kafka.admin import NewTopic
+from kafka.errors import TopicAlreadyExistsError
+
+from telemetry_codec import ENCODINGS, decode_payload, encode_payload
+
+MQTT_BROKER = os.getenv("MQTT_BROKER", "localhost")
+MQTT_PORT = int(os.getenv("MQTT_PORT", 1883))
+KAFKA_BROKER = os.getenv("KAFKA_BROKER", "localhost:9092")
+KAFKA_TOPIC = os.getenv("KAFKA_TOPIC", "telemetry")
+KAFKA_UNKNOWN_TOPIC = os.getenv("KAFKA_UNKNOWN_TOPIC", "telemetry-unknown")
+
+BENCH_SITE = "bench"
+
+BENCH_PAYLOAD = {
+    "timestamp": "2024-01-01T00:00:00Z",
+    "metrics": {"temp_out_air": 30.1, "temp_supply_air": 16.2, "power_kw": 10.5, "vibration_level": 2.3}
+}
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger("bridge-benchmark")
+
+
+def ensure_unknown_topic():
+    """Create the unknown-asset topic so it can be assigned before publishing."""
+    admin = KafkaAdminClient(bootstrap_servers=[KAFKA_BROKER], client_id="bridge-benchmark-admin")
+    try:
+        admin.create_topics([NewTopic(KAFKA_UNKNOWN_TOPIC, num_partitions=1, replication_factor=1)])
+    except TopicAlreadyExistsError:
+        pass
+    finally:
+        admin.close()
+
+
+def consume(expected, timeout, result):
+    """Count benchmark messages arriving on the telemetry and unknown-asset topics."""
+    topics = {KAFKA_TOPIC, KAFKA_UNKNOWN_TOPIC}
+    consumer = KafkaConsumer(
+        *topics,
+        bootstrap_servers=[KAFKA_BROKER],
+        auto_offset_reset="latest",
+        enable_auto_commit=False,
+        consumer_timeout_ms=int(timeout * 1000)
+    )
+    # Make sure partitions of both topics are assigned before publishing starts
+    deadline = time.monotonic() + timeout
+    while {tp.topic for tp in consumer.assignment()} != topics and time.monotonic() < deadline:
+        consumer.poll(timeout_ms=1000)
+    result["ready"].set()
+    
+    received = 0
+    for record in consumer:
+        if BENCH_SITE.upper().encode() in record.value:
+            received += 1
+            result["topics"][record.topic] = result["topics"].get(record.topic, 0) + 1
+            if received == 1:
+                result["first"] = time.perf_counter()
+            if received >= expected:
+                break
+    result["last"] = time.perf_counter()
+    result["received"] = received
+    consumer.close()
+
+
+def time_per_message(func, arg, messages):
+    """Average CPU microseconds per call of func(arg)."""
+    start = time.process_time()
+    for _ in range(messages):
+        func(arg)
+    return (time.process_time() - start) * 1e6 / messages
+
+
+def codec_benchmark(messages):
+    """Compare payload sizes and codec CPU cost without any broker."""
+    enriched = {
+        "@timestamp": "2024-01-01T00:00:00.012345Z",
+        "site_code": "CAS-S1", "asset_type": "HVAC", "asset_code": "CAS-S1-HVAC-001",
+        "asset_id": 1, "site_id": 1, "source_topic": "cas-s1/hvac/1",
+        "sensor_timestamp": BENCH_PAYLOAD["timestamp"],
+        "bridge_received_at": "2024-01-01T00:00:00.012345Z",
+        "bridge_produced_at": "2024-01-01T00:00:00.012400Z",
+        "metrics": BENCH_PAYLOAD["metrics"],
+    }
+    kafka_codecs = {"json": (orjson.dumps, orjson.loads), "msgpack": (msgpack.packb, msgpack.unpackb)}
+    
+    for encoding in ENCODINGS:
+        device = encode_payload(BENCH_PAYLOAD, encoding)
+        dumps, loads = kafka_codecs[encoding]
+        record = dumps(enriched)
+        logger.info(
+            f"{encoding}: device {len(device)} B/msg, "
+            f"encode {time_per_message(lambda p: encode_payload(p, encoding), BENCH_PAYLOAD, messages):.2f} us, "
+            f"decode {time_per_message(decode_payload, device, messages):.2f} us | "
+            f"kafka {len(record)} B/msg, encode {time_per_message(dumps, enriched, messages):.2f} us, "
+            f"decode {time_per_message(loads, record, messages):.2f} us"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure MQTT -> Kafka bridge throughput")
+    parser.add_argument("--messages", type=int, default=50000, help="Messages to publish")
+    parser.add_argument("--assets", type=int, default=100, help="Distinct asset topics")
+    parser.add_argument("--qos", type=int, default=0, choices=[0, 1], help="MQTT publish QoS")
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds to wait for the tail")
+    parser.add_argument("--encoding", default="json", choices=ENCODINGS, help="Device payload encoding")
+    parser.add_argument("--codec-only", action="store_true", help="Only compare encodings, no brokers")
+    args = parser.parse_args()
+    
+    if args.codec_only:
+        codec_benchmark(args.messages)
+        return
+    
+    ensure_unknown_topic()
+    result = {"ready": threading.Event(), "first": None, "last": None, "received": 0, "topics": {}}
+    consumer_thread = threading.Thread(target=consume, args=(args.messages, args.timeout, result))
+    consumer_thread.start()
+    result["ready"].wait()
+    
+    client = mqtt.Client(client_id="bridge-benchmark")
+    client.connect(MQTT_BROKER, MQTT_PORT, 60)
+    client.loop_start()
+    
+    payload = encode_payload(BENCH_PAYLOAD, args.encoding)
+    
+    logger.info(f"Publishing {args.messages} messages over {args.assets} topics...")
+    start = time.perf_counter()
+    for i in range(args.messages):
+        client.publish(f"{BENCH_SITE}/hvac/{i % args.assets}", payload, qos=args.qos)
+    publish_elapsed = time.perf_counter() - start
+    
+    consumer_thread.join()
+    client.loop_stop()
+    client.disconnect()
+    
+    received = result["received"]
+    total_elapsed = (result["last"] or time.perf_counter()) - start
+    logger.info(f"Published {args.messages} in {publish_elapsed:.2f}s ({args.messages / publish_elapsed:.0f} msg/s)")
+    logger.info(
+        f"Received {received}/{args.messages} from Kafka in {total_elapsed:.2f}s "
+        f"({received / total_elapsed:.0f} msg/s sustained, {args.messages - received} missing, "
+        f"by topic {result['topics']})"
+    )
+
+
+if __name__ == "__main__":
+    main()
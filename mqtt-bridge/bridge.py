@@ -6,47 +6,290 @@ Enriches messages with metadata extracted from topic structure.
 
 Topic format: {site_code}/{asset_type}/{asset_id}
 Example: cas-s1/hvac/1
+
+Scale-out: with MQTT_SHARED_GROUP set, every bridge client joins the
+shared subscription $share/<group>/+/+/+ with a unique client id, so the
+broker load-balances messages across instances. BRIDGE_WORKERS > 1 runs
+that many worker processes per instance, each with its own MQTT client
+and Kafka producer.
+
+Backpressure: the MQTT callback never talks to Kafka. Enriched messages
+go into a bounded in-memory queue drained by a sender thread; when the
+queue is full (Kafka slow or down) they spill to an on-disk spool (see
+spool.py), replayed in order once the queue has drained. Deliveries that
+fail after the producer's retries go to a separate retry spool, replayed
+before anything else so they keep their place ahead of newer messages.
+Each worker process locks the first free spool slot (worker-0, worker-1,
+...) under BRIDGE_SPOOL_DIR, so replicas sharing a volume never share a
+spool and a restarted one picks up the spool of the one it replaces.
+
+Enrichment: with DATABASE_URL set, topics are resolved against an
+in-memory copy of the assets/sites tables (refreshed periodically), so
+messages carry numeric asset_id/site_id. Topics that match no asset are
+routed to KAFKA_UNKNOWN_TOPIC instead of the telemetry topic.
+
+Volume reduction (optional, see telemetry_filter.py): DEADBAND_ENABLED
+drops samples within a per-metric deadband, AGGREGATE_SECONDS replaces
+raw samples with per-asset min/max/avg windows.
+
+Latency tracing: messages carry the sensor timestamp plus the bridge
+receive and produce times; Logstash adds the Kafka offset and its own
+receive time (see logstash/pipeline/telemetry.conf). Per-stage latency
+histograms are served in Prometheus format on METRICS_PORT.
+
+Encoding (see telemetry_codec.py): devices may publish JSON or the compact
+binary format, negotiated per message. KAFKA_ENCODING selects JSON or
+MessagePack records on the Kafka leg; records carry a content-type header.
 """
 
 import os
-import json
+import time
+import queue
+import socket
 import logging
-from datetime import datetime
+import threading
+import multiprocessing
+from datetime import datetime, timezone
 
+import msgpack
+import orjson
+import psycopg2
 import paho.mqtt.client as mqtt
-from kafka import KafkaProducer
+from kafka import KafkaProducer, KafkaAdminClient
+from kafka.admin import NewTopic, NewPartitions
+from kafka.errors import TopicAlreadyExistsError
+
+from spool import Spool, SpoolLocked
+from bridge_metrics import LatencyTracker, start_metrics_server
+from telemetry_codec import CONTENT_TYPES, ENCODINGS, decode_payload, payload_encoding
+from telemetry_filter import DeadbandFilter, WindowAggregator, parse_thresholds
 
 # Configuration
 MQTT_BROKER = os.getenv("MQTT_BROKER", "localhost")
 MQTT_PORT = int(os.getenv("MQTT_PORT", 1883))
 KAFKA_BROKER = os.getenv("KAFKA_BROKER", "localhost:9092")
 KAFKA_TOPIC = os.getenv("KAFKA_TOPIC", "telemetry")
+# Partitions of the telemetry topic; messages are keyed by asset_code so
+# each asset stays ordered within one partition
+KAFKA_TOPIC_PARTITIONS = int(os.getenv("KAFKA_TOPIC_PARTITIONS", 6))
+KAFKA_TOPIC_REPLICATION = int(os.getenv("KAFKA_TOPIC_REPLICATION", 1))
+# Record encoding on the Kafka leg: "json" or "msgpack" (Logstash decodes
+# the telemetry-msgpack topic as MessagePack, point KAFKA_TOPIC there)
+KAFKA_ENCODING = os.getenv("KAFKA_ENCODING", "json")
+if KAFKA_ENCODING not in ENCODINGS:
+    raise ValueError(f"KAFKA_ENCODING must be one of {ENCODINGS}, got {KAFKA_ENCODING!r}")
+KAFKA_HEADERS = [("content-type", CONTENT_TYPES[KAFKA_ENCODING])]
+
+# Asset registry (PostgreSQL); enrichment falls back to topic parsing if unset
+DATABASE_URL = os.getenv("DATABASE_URL", "")
+REGISTRY_REFRESH_SECONDS = int(os.getenv("REGISTRY_REFRESH_SECONDS", 300))
+KAFKA_UNKNOWN_TOPIC = os.getenv("KAFKA_UNKNOWN_TOPIC", "telemetry-unknown")
+
+# Deadband filtering: absolute change per metric required to emit a sample,
+# e.g. "run_hours=0.1,speed=0.05"; metrics without a threshold always pass
+DEADBAND_ENABLED = os.getenv("DEADBAND_ENABLED", "false").lower() == "true"
+DEADBAND_THRESHOLDS = parse_thresholds(os.getenv("DEADBAND_THRESHOLDS", ""))
+DEADBAND_DEFAULT = float(os.getenv("DEADBAND_DEFAULT", 0))
+# Every metric is emitted at least this often, keep below the shortest policy window
+HEARTBEAT_SECONDS = int(os.getenv("HEARTBEAT_SECONDS", 60))
+
+# Pre-aggregation window in seconds (0 disables); cumulative counters keep
+# their last value instead of the average
+AGGREGATE_SECONDS = int(os.getenv("AGGREGATE_SECONDS", 0))
+AGGREGATE_LAST_METRICS = [m for m in os.getenv("AGGREGATE_LAST_METRICS", "run_hours,door_cycles").split(",") if m]
+
+# Prometheus /metrics port (worker N listens on METRICS_PORT + N, 0 disables)
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9108))
+
+# Scale-out: shared subscription group and worker processes per instance
+MQTT_SHARED_GROUP = os.getenv("MQTT_SHARED_GROUP", "")
+BRIDGE_WORKERS = int(os.getenv("BRIDGE_WORKERS", 1))
+MQTT_TOPIC_PATTERN = "+/+/+"
+
+# Producer mode: "reliable" (acks=all, no batching) or "throughput"
+KAFKA_PRODUCER_MODE = os.getenv("KAFKA_PRODUCER_MODE", "reliable")
+KAFKA_ACKS = os.getenv("KAFKA_ACKS", "all" if KAFKA_PRODUCER_MODE == "reliable" else "1")
+KAFKA_LINGER_MS = int(os.getenv("KAFKA_LINGER_MS", 0 if KAFKA_PRODUCER_MODE == "reliable" else 20))
+KAFKA_BATCH_SIZE = int(os.getenv("KAFKA_BATCH_SIZE", 16384 if KAFKA_PRODUCER_MODE == "reliable" else 262144))
+KAFKA_COMPRESSION = os.getenv("KAFKA_COMPRESSION", "none" if KAFKA_PRODUCER_MODE == "reliable" else "lz4")
+# Producer-level retries of a failed batch (0 = fail to the retry spool at once)
+KAFKA_RETRIES = int(os.getenv("KAFKA_RETRIES", 5))
+# Maximum number of sends awaiting a delivery report
+KAFKA_MAX_PENDING = int(os.getenv("KAFKA_MAX_PENDING", 10000))
+# Give up a blocked send (e.g. no broker metadata) after this long and spool it
+KAFKA_MAX_BLOCK_MS = int(os.getenv("KAFKA_MAX_BLOCK_MS", 5000))
+STATS_INTERVAL_SECONDS = int(os.getenv("STATS_INTERVAL_SECONDS", 30))
+
+# In-memory queue between MQTT reception and Kafka production, and the
+# on-disk spool it overflows into
+BRIDGE_QUEUE_SIZE = int(os.getenv("BRIDGE_QUEUE_SIZE", 10000))
+BRIDGE_SPOOL_DIR = os.getenv("BRIDGE_SPOOL_DIR", "/var/spool/mqtt-bridge")
+SPOOL_SEGMENT_BYTES = int(os.getenv("SPOOL_SEGMENT_BYTES", 16 * 1024 * 1024))
+SPOOL_MAX_BYTES = int(os.getenv("SPOOL_MAX_BYTES", 1024 * 1024 * 1024))
 
 # Logging
 logging.basicConfig(
     level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    format="%(asctime)s - %(name)s - %(processName)s - %(levelname)s - %(message)s"
 )
 logger = logging.getLogger("mqtt-bridge")
 
-# Kafka producer (initialized on startup)
+# Kafka producer, spool and retry spool (initialized on startup)
 producer = None
+spool = None
+retry_spool = None
+
+outbound = queue.Queue(maxsize=BRIDGE_QUEUE_SIZE)
+
+# Bounds the number of in-flight sends; released by the delivery callbacks
+pending_sends = threading.BoundedSemaphore(KAFKA_MAX_PENDING)
+
+# Counters reported every STATS_INTERVAL_SECONDS
+stats_lock = threading.Lock()
+stats = {
+    "received": 0,
+    "received_json": 0,
+    "received_msgpack": 0,
+    "submitted": 0,
+    "sent": 0,
+    "failed": 0,
+    "spooled": 0,
+    "replayed": 0,
+    "dropped": 0,
+    "suppressed_messages": 0,
+    "suppressed_metrics": 0,
+    "aggregated": 0,
+}
+
+latency = LatencyTracker()
+
+deadband = DeadbandFilter(DEADBAND_THRESHOLDS, DEADBAND_DEFAULT, HEARTBEAT_SECONDS) if DEADBAND_ENABLED else None
+aggregator = WindowAggregator(AGGREGATE_SECONDS, AGGREGATE_LAST_METRICS) if AGGREGATE_SECONDS > 0 else None
+
+
+def count(name, n=1):
+    """Increment a bridge counter."""
+    with stats_lock:
+        stats[name] += n
+
+
+class AssetRegistry:
+    """
+    Topic to asset metadata cache loaded in bulk from PostgreSQL.
+    
+    Asset codes follow {SITE_CODE}-{TYPE}_{n}, published on the topic
+    {site_code}/{type}/{n}; the cache is keyed by that topic.
+    """
+    
+    def __init__(self, database_url):
+        self.database_url = database_url
+        self.by_topic = {}
+        self.unknown = {}
+        self.loaded = False
+    
+    @property
+    def enabled(self):
+        """True once the registry has been loaded from the database."""
+        return bool(self.database_url) and self.loaded
+    
+    def refresh(self):
+        """Reload all assets and sites in one query."""
+        conn = psycopg2.connect(self.database_url)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT a.id, a.code, a.type, s.id, s.code "
+                    "FROM assets a JOIN sites s ON s.id = a.site_id"
+                )
+                rows = cur.fetchall()
+        finally:
+            conn.close()
+        
+        by_topic = {}
+        for asset_id, asset_code, asset_type, site_id, site_code in rows:
+            prefix = f"{site_code}-{asset_type}_"
+            if not asset_code.startswith(prefix):
+                logger.warning(f"Asset code {asset_code} does not follow {prefix}<n>, not mapped to a topic")
+                continue
+            topic = f"{site_code.lower()}/{asset_type.lower()}/{asset_code[len(prefix):]}"
+            by_topic[topic] = {
+                "site_code": site_code,
+                "asset_type": asset_type,
+                "asset_code": asset_code,
+                "asset_id": asset_id,
+                "site_id": site_id,
+            }
+        
+        # Swap in one assignment so lookups never see a partial map
+        self.by_topic = by_topic
+        self.unknown = {}
+        self.loaded = True
+        logger.info(f"Loaded {len(by_topic)} assets into the topic registry")
+    
+    def refresh_loop(self, stop_event):
+        """Periodically reload the registry, retrying sooner until the first load."""
+        while not stop_event.wait(REGISTRY_REFRESH_SECONDS if self.loaded else 10):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"Asset registry refresh failed, keeping previous data: {e}")
+    
+    def lookup(self, topic):
+        """Metadata for a topic, or None for topics not of the form site/type/id."""
+        meta = self.by_topic.get(topic)
+        if meta is not None:
+            return meta
+        meta = self.unknown.get(topic)
+        if meta is not None:
+            return meta
+        
+        # Fall back to parsing the topic (unknown asset, no numeric ids)
+        topic_parts = topic.split("/")
+        if len(topic_parts) != 3:
+            return None
+        site_code, asset_type, asset_id = topic_parts
+        meta = {
+            "site_code": site_code.upper(),
+            "asset_type": asset_type.upper(),
+            "asset_code": f"{site_code.upper()}-{asset_type.upper()}_{asset_id}",
+        }
+        if len(self.unknown) < 10000:
+            self.unknown[topic] = meta
+        return meta
+
+
+registry = AssetRegistry(DATABASE_URL)
 
 
 def create_kafka_producer():
     """Create Kafka producer with retry logic."""
-    import time
     max_retries = 30
     retry_interval = 5
     
+    acks = KAFKA_ACKS if KAFKA_ACKS == "all" else int(KAFKA_ACKS)
+    compression = None if KAFKA_COMPRESSION == "none" else KAFKA_COMPRESSION
+    
     for attempt in range(max_retries):
         try:
             p = KafkaProducer(
                 bootstrap_servers=[KAFKA_BROKER],
-                value_serializer=lambda v: json.dumps(v).encode('utf-8'),
-                acks='all'
+                key_serializer=str.encode,
+                value_serializer=orjson.dumps if KAFKA_ENCODING == "json" else msgpack.packb,
+                acks=acks,
+                linger_ms=KAFKA_LINGER_MS,
+                batch_size=KAFKA_BATCH_SIZE,
+                compression_type=compression,
+                # A retried batch would land behind later ones with several
+                # requests in flight (kafka-python has no idempotent producer),
+                # so keep a single one whenever retries are enabled
+                max_in_flight_requests_per_connection=1 if KAFKA_RETRIES > 0 else 5,
+                retries=KAFKA_RETRIES,
+                max_block_ms=KAFKA_MAX_BLOCK_MS
+            )
+            logger.info(
+                f"Connected to Kafka at {KAFKA_BROKER} (mode={KAFKA_PRODUCER_MODE}, acks={acks}, "
+                f"linger_ms={KAFKA_LINGER_MS}, batch_size={KAFKA_BATCH_SIZE}, compression={KAFKA_COMPRESSION})"
             )
-            logger.info(f"Connected to Kafka at {KAFKA_BROKER}")
             return p
         except Exception as e:
             logger.warning(f"Kafka connection attempt {attempt + 1}/{max_retries} failed: {e}")
@@ -55,52 +298,314 @@ def create_kafka_producer():
     raise Exception(f"Could not connect to Kafka after {max_retries} attempts")
 
 
+def ensure_kafka_topic():
+    """Create the telemetry topic, or grow it, to KAFKA_TOPIC_PARTITIONS partitions."""
+    admin = KafkaAdminClient(bootstrap_servers=[KAFKA_BROKER], client_id="mqtt-kafka-bridge-admin")
+    try:
+        try:
+            admin.create_topics([NewTopic(
+                name=KAFKA_TOPIC,
+                num_partitions=KAFKA_TOPIC_PARTITIONS,
+                replication_factor=KAFKA_TOPIC_REPLICATION
+            )])
+            logger.info(f"Created Kafka topic {KAFKA_TOPIC} with {KAFKA_TOPIC_PARTITIONS} partitions")
+            return
+        except TopicAlreadyExistsError:
+            pass
+        
+        metadata = admin.describe_topics([KAFKA_TOPIC])[0]
+        current = len(metadata["partitions"])
+        if current < KAFKA_TOPIC_PARTITIONS:
+            # Existing keys may move to another partition after this
+            admin.create_partitions({KAFKA_TOPIC: NewPartitions(total_count=KAFKA_TOPIC_PARTITIONS)})
+            logger.warning(
+                f"Increased Kafka topic {KAFKA_TOPIC} from {current} to {KAFKA_TOPIC_PARTITIONS} "
+                f"partitions; per-asset ordering is only guaranteed for new messages"
+            )
+        else:
+            logger.info(f"Kafka topic {KAFKA_TOPIC} has {current} partitions")
+    finally:
+        admin.close()
+
+
+def utc_iso(epoch):
+    """ISO 8601 UTC timestamp with microseconds for an epoch time."""
+    return datetime.utcfromtimestamp(epoch).isoformat(timespec="microseconds") + "Z"
+
+
+def iso_to_epoch(value):
+    """Epoch seconds for an ISO 8601 timestamp (naive values are UTC)."""
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc).timestamp()
+    return parsed.timestamp()
+
+
+def topic_group(message):
+    """Latency/rate grouping key: the topic without the asset id."""
+    return f"{message['site_code']}/{message['asset_type']}"
+
+
+def on_send_success(group, produced_at, record_metadata):
+    """Delivery callback for a successful Kafka send."""
+    pending_sends.release()
+    count("sent")
+    latency.observe("kafka_ack", group, (time.time() - produced_at) * 1000)
+
+
+def on_send_error(message, exc):
+    """Delivery callback for a failed Kafka send; the message is spooled for replay."""
+    pending_sends.release()
+    count("failed")
+    logger.error(f"Failed to deliver message to Kafka: {exc}")
+    # Older than everything queued or spooled: replayed first
+    spool_message(message, retry_spool)
+
+
+def send_to_kafka(message):
+    """Send a message asynchronously, waiting while the in-flight window is full."""
+    pending_sends.acquire()
+    
+    produced_at = time.time()
+    group = topic_group(message)
+    message["bridge_produced_at"] = utc_iso(produced_at)
+    if "bridge_received_at" in message:
+        latency.observe("queue", group, (produced_at - iso_to_epoch(message["bridge_received_at"])) * 1000)
+    
+    try:
+        future = producer.send(
+            target_topic(message), key=message["asset_code"], value=message, headers=KAFKA_HEADERS
+        )
+    except Exception:
+        pending_sends.release()
+        raise
+    count("submitted")
+    future.add_callback(on_send_success, group, produced_at)
+    future.add_errback(on_send_error, message)
+
+
+def target_topic(message):
+    """Kafka topic for a message: unknown assets are kept out of telemetry."""
+    if registry.enabled and message.get("asset_id") is None:
+        return KAFKA_UNKNOWN_TOPIC
+    return KAFKA_TOPIC
+
+
+def spool_message(message, target=None):
+    """Write a message to the on-disk spool (or the given one)."""
+    if (target or spool).append(orjson.dumps(message)):
+        count("spooled")
+    else:
+        count("dropped")
+        logger.error("Spool is full, dropping message")
+
+
+def enqueue(message):
+    """
+    Hand a message to the sender thread without blocking the MQTT loop.
+    
+    While the spool holds messages, new ones are appended to it as well so
+    that replay preserves arrival order.
+    """
+    if spool.empty():
+        try:
+            outbound.put_nowait(message)
+            return
+        except queue.Full:
+            pass
+    spool_message(message)
+
+
+def apply_deadband(message, now):
+    """Strip metrics within the deadband; returns False if nothing is left to emit."""
+    metrics = message["metrics"]
+    emitted = deadband.apply(message["asset_code"], metrics, now)
+    if len(emitted) < len(metrics):
+        count("suppressed_metrics", len(metrics) - len(emitted))
+        if not emitted:
+            count("suppressed_messages")
+            return False
+        message["metrics"] = emitted
+    return True
+
+
+def publish(message):
+    """Run a message through the volume reduction stages and enqueue it."""
+    now = time.time()
+    
+    if aggregator is not None:
+        metrics = message.pop("metrics")
+        aggregator.add(message["asset_code"], message, metrics, now)
+        return
+    
+    if deadband is not None and not apply_deadband(message, now):
+        return
+    
+    enqueue(message)
+
+
+def aggregate_loop(stop_event):
+    """Emit aggregated windows as they elapse."""
+    interval = min(1.0, AGGREGATE_SECONDS / 10)
+    while True:
+        stopping = stop_event.wait(interval)
+        now = time.time()
+        for message in aggregator.flush(now, force=stopping):
+            count("aggregated")
+            if deadband is None or apply_deadband(message, now):
+                enqueue(message)
+        if stopping:
+            break
+
+
+def next_message(timeout=0.5):
+    """Next message to send: failed deliveries, the in-memory queue, then the spool."""
+    data = retry_spool.pop()
+    if data is not None:
+        count("replayed")
+        return orjson.loads(data)
+    
+    try:
+        return outbound.get_nowait()
+    except queue.Empty:
+        pass
+    
+    data = spool.pop()
+    if data is not None:
+        count("replayed")
+        return orjson.loads(data)
+    
+    try:
+        return outbound.get(timeout=timeout)
+    except queue.Empty:
+        return None
+
+
+def sender_loop(stop_event):
+    """Drain the queue and spool into Kafka."""
+    message = None
+    while True:
+        if message is None:
+            if stop_event.is_set() and outbound.empty():
+                break
+            message = next_message()
+            if message is None:
+                continue
+        
+        try:
+            send_to_kafka(message)
+            message = None
+        except Exception as e:
+            if stop_event.is_set():
+                # Shutting down with Kafka unavailable: keep the rest on disk
+                spool_message(message)
+                while not outbound.empty():
+                    spool_message(outbound.get_nowait())
+                break
+            # Kafka unavailable: hold the message and retry it first, the
+            # queue fills up and overflows to the spool meanwhile
+            logger.warning(f"Kafka send failed, retrying: {e}")
+            stop_event.wait(1)
+
+
+def report_stats(stop_event):
+    """Periodically log throughput and delivery counters."""
+    last = dict(stats)
+    while not stop_event.wait(STATS_INTERVAL_SECONDS):
+        with stats_lock:
+            current = dict(stats)
+        rates = {
+            name: (current[name] - last[name]) / STATS_INTERVAL_SECONDS
+            for name in ("received", "sent")
+        }
+        in_flight = current["submitted"] - current["sent"] - current["failed"]
+        percentiles = ", ".join(
+            f"{stage} p50/p95/p99={p50}/{p95}/{p99}ms"
+            for stage, (p50, p95, p99) in sorted(latency.summary().items())
+        )
+        logger.info(
+            f"Stats: received={current['received']} ({rates['received']:.1f}/s, "
+            f"json={current['received_json']}, msgpack={current['received_msgpack']}), "
+            f"sent={current['sent']} ({rates['sent']:.1f}/s), failed={current['failed']}, "
+            f"in_flight={in_flight}, queue_depth={outbound.qsize()}, "
+            f"spool_bytes={spool.size_bytes + retry_spool.size_bytes}, spooled={current['spooled']}, "
+            f"replayed={current['replayed']}, dropped={current['dropped']}, "
+            f"suppressed_messages={current['suppressed_messages']}, "
+            f"suppressed_metrics={current['suppressed_metrics']}, aggregated={current['aggregated']}"
+        )
+        if percentiles:
+            logger.info(f"Latency: {percentiles}")
+        last = current
+
+
+def subscription_topic():
+    """Topic filter to subscribe to, shared when a group is configured."""
+    if MQTT_SHARED_GROUP:
+        return f"$share/{MQTT_SHARED_GROUP}/{MQTT_TOPIC_PATTERN}"
+    return MQTT_TOPIC_PATTERN
+
+
+def mqtt_client_id(worker_id):
+    """Client id for a worker; unique per process in shared mode."""
+    if MQTT_SHARED_GROUP:
+        return f"mqtt-kafka-bridge-{socket.gethostname()}-{os.getpid()}-{worker_id}"
+    return "mqtt-kafka-bridge"
+
+
 def on_connect(client, userdata, flags, rc):
     """Callback when MQTT client connects."""
     if rc == 0:
         logger.info(f"Connected to MQTT broker at {MQTT_BROKER}:{MQTT_PORT}")
-        # Subscribe to all topics with pattern +/+/+
-        client.subscribe("+/+/+")
-        logger.info("Subscribed to topic pattern: +/+/+")
+        # Subscribe to all topics with pattern +/+/+ (optionally shared)
+        topic = subscription_topic()
+        client.subscribe(topic)
+        logger.info(f"Subscribed to topic pattern: {topic}")
     else:
         logger.error(f"Failed to connect to MQTT broker, return code: {rc}")
 
 
 def on_message(client, userdata, msg):
     """Callback when MQTT message is received."""
-    global producer
+    received_at = time.time()
+    count("received")
     
     try:
-        # Parse topic to extract metadata
+        # Resolve topic to asset metadata
         # Expected format: {site_code}/{asset_type}/{asset_id}
-        topic_parts = msg.topic.split("/")
+        meta = registry.lookup(msg.topic)
         
-        if len(topic_parts) != 3:
+        if meta is None:
             logger.warning(f"Unexpected topic format: {msg.topic}")
             return
         
-        site_code, asset_type, asset_id = topic_parts
-        
-        # Parse payload
-        payload = json.loads(msg.payload.decode('utf-8'))
+        # Parse payload (JSON or compact binary)
+        payload = decode_payload(msg.payload)
+        count(f"received_{payload_encoding(msg.payload)}")
         
-        # Enrich message with metadata
+        # Enrich message with metadata and tracing timestamps
+        received_iso = utc_iso(received_at)
+        sensor_timestamp = payload.get("timestamp")
         enriched_message = {
-            "@timestamp": datetime.utcnow().isoformat() + "Z",
-            "site_code": site_code.upper(),
-            "asset_type": asset_type.upper(),
-            "asset_code": f"{site_code.upper()}-{asset_type.upper()}_{asset_id}",
+            "@timestamp": received_iso,
+            **meta,
             "source_topic": msg.topic,
+            "sensor_timestamp": sensor_timestamp,
+            "bridge_received_at": received_iso,
             "metrics": payload.get("metrics", payload)
         }
         
-        # Forward to Kafka
-        producer.send(KAFKA_TOPIC, value=enriched_message)
+        group = topic_group(enriched_message)
+        latency.count_message(group)
+        if sensor_timestamp:
+            latency.observe("mqtt", group, (received_at - iso_to_epoch(sensor_timestamp)) * 1000)
+        
+        # Filter/aggregate and hand over to the sender thread
+        publish(enriched_message)
         
         logger.debug(f"Forwarded message from {msg.topic} to Kafka topic {KAFKA_TOPIC}")
         
-    except json.JSONDecodeError as e:
-        logger.error(f"Failed to parse JSON payload: {e}")
+    except ValueError as e:
+        logger.error(f"Failed to decode payload from {msg.topic}: {e}")
     except Exception as e:
         logger.error(f"Error processing message: {e}")
 
@@ -111,22 +616,54 @@ def on_disconnect(client, userdata, rc):
         logger.warning(f"Unexpected MQTT disconnection, return code: {rc}")
 
 
-def main():
-    global producer
+def open_spools():
+    """Lock the first spool slot no other bridge process holds."""
+    slot = 0
+    while True:
+        directory = os.path.join(BRIDGE_SPOOL_DIR, f"worker-{slot}")
+        try:
+            main = Spool(directory, SPOOL_SEGMENT_BYTES, SPOOL_MAX_BYTES)
+        except SpoolLocked:
+            slot += 1
+            continue
+        logger.info(f"Using spool {directory}")
+        # Inside the locked slot, so owned by the same process
+        return main, Spool(os.path.join(directory, "retry"), SPOOL_SEGMENT_BYTES, SPOOL_MAX_BYTES)
+
+
+def run_bridge(worker_id=0):
+    """Run one bridge pipeline: MQTT client, enrichment and Kafka producer."""
+    global producer, spool, retry_spool
     
-    logger.info("Starting MQTT to Kafka bridge...")
+    # Each worker process owns a spool directory
+    spool, retry_spool = open_spools()
     
     # Create Kafka producer
     producer = create_kafka_producer()
     
+    # Kafka is reachable now; one worker makes sure the topic is partitioned
+    if worker_id == 0:
+        try:
+            ensure_kafka_topic()
+        except Exception as e:
+            logger.warning(f"Could not create or check Kafka topic {KAFKA_TOPIC}: {e}")
+    
+    # Load asset registry
+    stop_event = threading.Event()
+    if registry.database_url:
+        try:
+            registry.refresh()
+        except Exception as e:
+            logger.warning(f"Could not load asset registry, retrying in background: {e}")
+        threading.Thread(target=registry.refresh_loop, args=(stop_event,), daemon=True).start()
+    
     # Create MQTT client
-    client = mqtt.Client(client_id="mqtt-kafka-bridge")
+    client = mqtt.Client(client_id=mqtt_client_id(worker_id))
     client.on_connect = on_connect
     client.on_message = on_message
     client.on_disconnect = on_disconnect
     
     # Connect to MQTT broker with retry
-    import time
     max_retries = 30
     retry_interval = 5
     
@@ -140,6 +677,23 @@ def main():
     else:
         raise Exception(f"Could not connect to MQTT broker after {max_retries} attempts")
     
+    # Metrics endpoint
+    if METRICS_PORT:
+        try:
+            start_metrics_server(METRICS_PORT + worker_id, lambda: latency.render_prometheus(dict(stats)))
+        except OSError as e:
+            logger.warning(f"Could not start metrics server on port {METRICS_PORT + worker_id}: {e}")
+    
+    # Start sender and stats reporter
+    # The sender stops last, after the aggregator has flushed its windows
+    sender_stop = threading.Event()
+    sender = threading.Thread(target=sender_loop, args=(sender_stop,), name="kafka-sender")
+    sender.start()
+    threading.Thread(target=report_stats, args=(stop_event,), daemon=True).start()
+    if aggregator is not None:
+        aggregating = threading.Thread(target=aggregate_loop, args=(stop_event,), name="aggregator")
+        aggregating.start()
+    
     # Start loop
     logger.info("Bridge is running. Press Ctrl+C to stop.")
     try:
@@ -148,8 +702,47 @@ def main():
         logger.info("Shutting down...")
     finally:
         client.disconnect()
+        stop_event.set()
+        if aggregator is not None:
+            aggregating.join()
+        sender_stop.set()
+        sender.join()
         if producer:
+            producer.flush()
             producer.close()
+        spool.close()
+        retry_spool.close()
+
+
+def main():
+    global MQTT_SHARED_GROUP
+    
+    logger.info("Starting MQTT to Kafka bridge...")
+    
+    if BRIDGE_WORKERS <= 1:
+        run_bridge()
+        return
+    
+    # Without a shared subscription every worker would receive every message
+    if not MQTT_SHARED_GROUP:
+        MQTT_SHARED_GROUP = "mqtt-kafka-bridge"
+        logger.info(f"BRIDGE_WORKERS={BRIDGE_WORKERS} requires a shared subscription, using group '{MQTT_SHARED_GROUP}'")
+    
+    logger.info(f"Starting {BRIDGE_WORKERS} bridge workers")
+    workers = [
+        multiprocessing.Process(target=run_bridge, args=(i,), name=f"worker-{i}")
+        for i in range(BRIDGE_WORKERS)
+    ]
+    for worker in workers:
+        worker.start()
+    
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        logger.info("Shutting down workers...")
+        for worker in workers:
+            worker.join()
 
 
 if __name__ == "__main__":
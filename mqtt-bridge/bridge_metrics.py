@@ -0,0 +1,127 @@
+"""
+Latency histograms and Prometheus endpoint for the MQTT to Kafka bridge.
+
+Histograms are kept per stage and per topic group ({site}/{type}, the
+topic without the asset id, to bound cardinality on large fleets):
+
+- mqtt: sensor timestamp -> bridge reception
+- queue: bridge reception -> handed to the Kafka producer
+- kafka_ack: handed to the producer -> delivery acknowledged
+"""
+
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("mqtt-bridge.metrics")
+
+# Upper bounds in milliseconds
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram."""
+    
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.total = 0
+        self.sum = 0.0
+    
+    def observe(self, value_ms):
+        self.counts[bisect.bisect_left(BUCKETS_MS, value_ms)] += 1
+        self.total += 1
+        self.sum += value_ms
+    
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th quantile."""
+        if not self.total:
+            return None
+        rank = q * self.total
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return BUCKETS_MS[i] if i < len(BUCKETS_MS) else float("inf")
+        return float("inf")
+
+
+class LatencyTracker:
+    """Per stage and topic group histograms plus message counts."""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._messages = {}
+    
+    def count_message(self, group):
+        with self._lock:
+            self._messages[group] = self._messages.get(group, 0) + 1
+    
+    def observe(self, stage, group, value_ms):
+        with self._lock:
+            histogram = self._histograms.get((stage, group))
+            if histogram is None:
+                histogram = self._histograms[(stage, group)] = Histogram()
+            histogram.observe(max(value_ms, 0.0))
+    
+    def summary(self):
+        """p50/p95/p99 per stage across all topic groups."""
+        with self._lock:
+            merged = {}
+            for (stage, _), histogram in self._histograms.items():
+                target = merged.setdefault(stage, Histogram())
+                target.counts = [a + b for a, b in zip(target.counts, histogram.counts)]
+                target.total += histogram.total
+                target.sum += histogram.sum
+        return {
+            stage: (h.percentile(0.5), h.percentile(0.95), h.percentile(0.99))
+            for stage, h in merged.items()
+        }
+    
+    def render_prometheus(self, counters):
+        """Prometheus text exposition of counters, rates and histograms."""
+        lines = []
+        for name, value in counters.items():
+            lines.append(f"# TYPE bridge_{name}_total counter")
+            lines.append(f"bridge_{name}_total {value}")
+        
+        with self._lock:
+            lines.append("# TYPE bridge_topic_messages_total counter")
+            for group, value in sorted(self._messages.items()):
+                lines.append(f'bridge_topic_messages_total{{topic_group="{group}"}} {value}')
+            
+            lines.append("# TYPE bridge_latency_ms histogram")
+            for (stage, group), histogram in sorted(self._histograms.items()):
+                labels = f'stage="{stage}",topic_group="{group}"'
+                cumulative = 0
+                for bound, n in zip(BUCKETS_MS + ("+Inf",), histogram.counts):
+                    cumulative += n
+                    lines.append(f'bridge_latency_ms_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"bridge_latency_ms_sum{{{labels}}} {histogram.sum:.3f}")
+                lines.append(f"bridge_latency_ms_count{{{labels}}} {histogram.total}")
+        return "\n".join(lines) + "\n"
+
+
+def start_metrics_server(port, render):
+    """Serve render() as text on http://0.0.0.0:<port>/metrics."""
+    
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, format, *args):
+            pass
+    
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"Metrics available on port {port} at /metrics")
+    return server
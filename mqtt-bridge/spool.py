@@ -0,0 +1,152 @@
+"""
+Durable on-disk spool for the MQTT to Kafka bridge.
+
+An append-only FIFO of serialized messages stored as numbered segment
+files. Each record is a 4-byte big-endian length followed by the payload.
+Segments are deleted once fully replayed; segments left over from a
+previous run are replayed on startup (at-least-once: a segment that was
+partially replayed before a crash is replayed from its start).
+
+A spool holds an exclusive lock on its directory (flock on a .lock file)
+for as long as it is open, so two processes sharing a volume can never
+write to the same spool; opening a locked directory raises SpoolLocked.
+"""
+
+import os
+import fcntl
+import struct
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger("mqtt-bridge.spool")
+
+HEADER = struct.Struct(">I")
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".log"
+LOCK_FILE = ".lock"
+
+
+class SpoolLocked(Exception):
+    """The spool directory is held by another process."""
+
+
+class Spool:
+    """Bounded, segment-based on-disk message queue."""
+    
+    def __init__(self, directory, segment_bytes, max_bytes):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.dropped = 0
+        
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        
+        self._lock_file = open(os.path.join(directory, LOCK_FILE), "a")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock_file.close()
+            raise SpoolLocked(directory)
+        
+        names = sorted(
+            name for name in os.listdir(directory)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+        )
+        self._segments = deque(os.path.join(directory, name) for name in names)
+        self._next_seq = self._seq(names[-1]) + 1 if names else 0
+        self._size = sum(os.path.getsize(path) for path in self._segments)
+        
+        self._writer = None
+        self._writer_path = None
+        self._writer_size = 0
+        self._reader = None
+        
+        if self._segments:
+            logger.info(f"Found {len(self._segments)} spool segments ({self._size} bytes) to replay")
+    
+    @staticmethod
+    def _seq(name):
+        return int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+    
+    @property
+    def size_bytes(self):
+        """Bytes waiting to be replayed."""
+        return self._size
+    
+    def empty(self):
+        return self._size == 0
+    
+    def append(self, data):
+        """Append a record. Returns False if the spool is full and the record was dropped."""
+        record = HEADER.pack(len(data)) + data
+        with self._lock:
+            if self._size + len(record) > self.max_bytes:
+                self.dropped += 1
+                return False
+            
+            if self._writer is None or self._writer_size >= self.segment_bytes:
+                self._rotate()
+            
+            self._writer.write(record)
+            self._writer.flush()
+            self._writer_size += len(record)
+            self._size += len(record)
+            return True
+    
+    def pop(self):
+        """Return the oldest record, or None if the spool is empty."""
+        with self._lock:
+            while self._segments:
+                path = self._segments[0]
+                if self._reader is None:
+                    self._reader = open(path, "rb")
+                
+                header = self._reader.read(HEADER.size)
+                if len(header) == HEADER.size:
+                    (length,) = HEADER.unpack(header)
+                    data = self._reader.read(length)
+                    if len(data) == length:
+                        self._size -= HEADER.size + length
+                        return data
+                    logger.warning(f"Truncated record at end of {path}, skipping")
+                
+                # End of segment: delete it, including the one being written
+                # once the reader has caught up with the writer
+                self._reader.close()
+                self._reader = None
+                if path == self._writer_path:
+                    self._writer.close()
+                    self._writer = None
+                    self._writer_path = None
+                self._segments.popleft()
+                os.remove(path)
+                if not self._segments:
+                    # Drop any accounting drift from truncated records
+                    self._size = 0
+            return None
+    
+    def close(self):
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+                self._writer_path = None
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+            if self._lock_file is not None:
+                # Closing the file releases the flock
+                self._lock_file.close()
+                self._lock_file = None
+    
+    def _rotate(self):
+        if self._writer is not None:
+            self._writer.close()
+        path = os.path.join(self.directory, f"{SEGMENT_PREFIX}{self._next_seq:010d}{SEGMENT_SUFFIX}")
+        self._next_seq += 1
+        self._writer = open(path, "ab")
+        self._writer_path = path
+        self._writer_size = 0
+        self._segments.append(path)
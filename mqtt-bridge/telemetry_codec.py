@@ -0,0 +1,93 @@
+"""
+Telemetry payload codec shared by the simulator and the MQTT bridge.
+
+Two encodings are supported on the device (MQTT) leg:
+
+- JSON: {"timestamp": "<ISO 8601>", "metrics": {"<name>": value, ...}}
+- Compact binary: a MAGIC byte followed by a MessagePack array
+  [schema_version, timestamp_ms, {metric_id: value, ...}]
+
+Metric names are replaced by the small integer ids of METRIC_IDS; names
+without an id are sent as strings so new metrics still flow before the
+table is updated. The MAGIC byte (0xc1) is never emitted by MessagePack
+and cannot start a JSON document, so decode_payload() negotiates the
+encoding per message and JSON devices keep working unchanged.
+
+This file is copied verbatim to simulator/ and mqtt-bridge/; keep both
+copies identical (backend/tests/test_telemetry_codec_copies.py checks it).
+"""
+
+from datetime import datetime, timezone
+
+import msgpack
+import orjson
+
+MAGIC = b"\xc1"
+SCHEMA_VERSION = 1
+
+JSON = "json"
+MSGPACK = "msgpack"
+ENCODINGS = (JSON, MSGPACK)
+
+CONTENT_TYPES = {
+    JSON: b"application/json",
+    MSGPACK: b"application/x-msgpack",
+}
+
+# Append-only: ids are part of the wire format
+METRIC_IDS = {
+    "temp_out_air": 1,
+    "temp_supply_air": 2,
+    "power_kw": 3,
+    "vibration_level": 4,
+    "water_temp_in": 5,
+    "water_temp_out": 6,
+    "run_hours": 7,
+    "motor_temp": 8,
+    "door_cycles": 9,
+    "speed": 10,
+}
+METRIC_NAMES = {metric_id: name for name, metric_id in METRIC_IDS.items()}
+
+
+def _timestamp_ms(value):
+    """Epoch milliseconds for an ISO 8601 timestamp (naive values are UTC)."""
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+
+def _timestamp_iso(value_ms):
+    """ISO 8601 UTC timestamp for epoch milliseconds."""
+    return datetime.utcfromtimestamp(value_ms / 1000).isoformat(timespec="milliseconds") + "Z"
+
+
+def encode_payload(payload, encoding=JSON):
+    """Encode a {"timestamp", "metrics"} telemetry payload."""
+    if encoding == JSON:
+        return orjson.dumps(payload)
+    if encoding != MSGPACK:
+        raise ValueError(f"Unknown telemetry encoding: {encoding}")
+    
+    metrics = {METRIC_IDS.get(name, name): value for name, value in payload["metrics"].items()}
+    return MAGIC + msgpack.packb([SCHEMA_VERSION, _timestamp_ms(payload["timestamp"]), metrics])
+
+
+def decode_payload(data):
+    """Decode a JSON or compact binary payload into the JSON payload shape."""
+    if not data.startswith(MAGIC):
+        return orjson.loads(data)
+    
+    version, timestamp_ms, metrics = msgpack.unpackb(data[1:], strict_map_key=False)
+    if version != SCHEMA_VERSION:
+        raise ValueError(f"Unsupported telemetry schema version: {version}")
+    return {
+        "timestamp": _timestamp_iso(timestamp_ms),
+        "metrics": {METRIC_NAMES.get(key, key): value for key, value in metrics.items()},
+    }
+
+
+def payload_encoding(data):
+    """Encoding of a raw payload, as negotiated by decode_payload()."""
+    return MSGPACK if data.startswith(MAGIC) else JSON
@@ -0,0 +1,127 @@
+"""
+Telemetry volume reduction for the MQTT to Kafka bridge.
+
+Two optional stages applied per asset before messages are queued:
+
+- DeadbandFilter drops metric samples that moved less than a per-metric
+  threshold since the last emitted value, with a heartbeat guaranteeing
+  one emit per metric at least every heartbeat_seconds.
+- WindowAggregator replaces raw samples with one message per asset and
+  window carrying avg (or last, for cumulative counters), min and max.
+
+State is kept per process. With shared subscriptions an asset's samples
+may be spread over several workers, each filtering its own share.
+"""
+
+import threading
+from datetime import datetime
+
+# Decimals kept on window averages: the telemetry index stores metric_*
+# fields as scaled_float with scaling_factor 100 (see
+# elasticsearch/templates/telemetry-template.json), like the raw samples
+METRIC_DECIMALS = 2
+
+
+def parse_thresholds(spec):
+    """Parse "metric=value,metric=value" into a dict of floats."""
+    thresholds = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, value = item.split("=", 1)
+        thresholds[name.strip()] = float(value)
+    return thresholds
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class DeadbandFilter:
+    """Per asset/metric deadband with a heartbeat."""
+    
+    def __init__(self, thresholds, default_threshold=0.0, heartbeat_seconds=60):
+        self.thresholds = thresholds
+        self.default_threshold = default_threshold
+        self.heartbeat_seconds = heartbeat_seconds
+        self._last = {}
+        self._lock = threading.Lock()
+    
+    def apply(self, key, metrics, now):
+        """Return the subset of metrics to emit for this asset."""
+        emitted = {}
+        with self._lock:
+            state = self._last.setdefault(key, {})
+            for name, value in metrics.items():
+                previous = state.get(name)
+                if (
+                    previous is None
+                    or not is_number(value)
+                    or abs(value - previous[0]) >= self.thresholds.get(name, self.default_threshold)
+                    or now - previous[1] >= self.heartbeat_seconds
+                ):
+                    emitted[name] = value
+                    if is_number(value):
+                        state[name] = (value, now)
+        return emitted
+
+
+class WindowAggregator:
+    """Tumbling-window min/max/avg pre-aggregation per asset."""
+    
+    def __init__(self, window_seconds, last_value_metrics=()):
+        self.window_seconds = window_seconds
+        self.last_value_metrics = set(last_value_metrics)
+        self._windows = {}
+        self._lock = threading.Lock()
+    
+    def add(self, key, base, metrics, now):
+        """Accumulate one sample; base holds the message fields besides metrics."""
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None:
+                window = self._windows[key] = {"base": base, "start": now, "count": 0, "metrics": {}}
+            # Fields of the latest sample: the tracing timestamps
+            # (sensor_timestamp, bridge_received_at) then measure the
+            # latency of the value emitted last, not of the window's start
+            window["base"] = base
+            window["count"] += 1
+            for name, value in metrics.items():
+                if not is_number(value):
+                    continue
+                acc = window["metrics"].get(name)
+                if acc is None:
+                    window["metrics"][name] = [value, value, value, 1, value]  # sum, min, max, n, last
+                else:
+                    acc[0] += value
+                    acc[1] = min(acc[1], value)
+                    acc[2] = max(acc[2], value)
+                    acc[3] += 1
+                    acc[4] = value
+    
+    def flush(self, now, force=False):
+        """Return aggregated messages for the windows that have elapsed."""
+        with self._lock:
+            due = [
+                key for key, window in self._windows.items()
+                if force or now - window["start"] >= self.window_seconds
+            ]
+            windows = [self._windows.pop(key) for key in due]
+        
+        messages = []
+        for window in windows:
+            metrics, minimums, maximums = {}, {}, {}
+            for name, (total, low, high, n, last) in window["metrics"].items():
+                metrics[name] = last if name in self.last_value_metrics else round(total / n, METRIC_DECIMALS)
+                minimums[name] = low
+                maximums[name] = high
+            message = dict(window["base"])
+            message["@timestamp"] = datetime.utcfromtimestamp(now).isoformat() + "Z"
+            message["window_start"] = datetime.utcfromtimestamp(window["start"]).isoformat() + "Z"
+            message["sample_count"] = window["count"]
+            message["metrics"] = metrics
+            message["metrics_min"] = minimums
+            message["metrics_max"] = maximums
+            messages.append(message)
+        return messages
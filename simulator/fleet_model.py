@@ -0,0 +1,178 @@
+"""
+Vectorized fleet telemetry model for the sensor simulator.
+
+Each asset type is simulated as NumPy arrays (one row per asset), so a
+tick for thousands of assets is a handful of array operations:
+
+    value = baseline + drift + degradation + noise
+
+- baseline: per-asset operating point inside the metric's normal range
+- drift: slow per-asset sensor/process drift, bounded to half the range
+- degradation: a fraction of assets wear out along an accelerating
+  (quadratic) curve towards the metric's anomaly range
+- noise: Gaussian measurement noise
+
+Scheduled faults (parse_faults) force metrics of specific assets into
+their anomaly range for a time window; the global anomaly switch does the
+same for the whole fleet. Cumulative counters (run_hours, door_cycles)
+are tracked per asset.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+# Fault injection: metric=None affects every metric with an anomaly range
+Fault = namedtuple("Fault", ["topic", "metric", "start", "duration"])
+
+
+def parse_faults(value):
+    """
+    Parse a fault schedule "topic[:metric]@start+duration,..." (seconds
+    from simulator start), e.g. "cas-s1/hvac/1:vibration_level@600+300".
+    """
+    faults = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        target, _, window = item.partition("@")
+        topic, _, metric = target.partition(":")
+        start, _, duration = window.partition("+")
+        faults.append(Fault(topic, metric or None, float(start), float(duration)))
+    return faults
+
+
+class AssetGroup:
+    """Arrays for all simulated assets of one type."""
+    
+    def __init__(self, topics, metrics, rng, drift_per_day, degradation_fraction, degradation_hours):
+        self.topics = topics
+        self.metrics = metrics
+        n = len(topics)
+        self.index = {topic: i for i, topic in enumerate(topics)}
+        
+        self.baseline = {}
+        self.noise = {}
+        self.drift_rate = {}
+        self.drift_limit = {}
+        self.counters = {}
+        for name, config in metrics.items():
+            if config.get("cumulative"):
+                if name == "run_hours":
+                    self.counters[name] = rng.uniform(100, 400, n)
+                else:
+                    self.counters[name] = rng.integers(50000, 90000, n)
+                continue
+            span = config["max"] - config["min"]
+            # Operating point in the middle half of the normal range
+            self.baseline[name] = rng.uniform(config["min"] + span / 4, config["max"] - span / 4, n)
+            self.noise[name] = span / 12
+            self.drift_rate[name] = rng.normal(0, drift_per_day * span / 86400, n)
+            self.drift_limit[name] = span / 2
+        
+        # Degrading assets: start time and duration of the wear-out curve
+        self.degrading = rng.random(n) < degradation_fraction
+        self.degradation_start = rng.uniform(0, degradation_hours * 3600, n)
+        self.degradation_duration = degradation_hours * 3600
+        
+        # Fault windows as (asset index, metric, start, end)
+        self.faults = []
+    
+    def add_fault(self, fault):
+        """Schedule a fault if its asset belongs to this group."""
+        i = self.index.get(fault.topic)
+        if i is None:
+            return False
+        self.faults.append((i, fault.metric, fault.start, fault.start + fault.duration))
+        return True
+    
+    def tick(self, rng, elapsed, dt, anomaly=False):
+        """Metric arrays for all assets, elapsed seconds after start."""
+        n = len(self.topics)
+        progress = np.clip((elapsed - self.degradation_start) / self.degradation_duration, 0, 1)
+        wear = np.where(self.degrading, progress ** 2, 0.0)
+        
+        # Per-metric fault masks active at this time
+        faulted = {}
+        for i, metric, start, end in self.faults:
+            if start <= elapsed < end:
+                for name in ([metric] if metric else self.metrics):
+                    faulted.setdefault(name, np.zeros(n, dtype=bool))[i] = True
+        
+        values = {}
+        for name, config in self.metrics.items():
+            if config.get("cumulative"):
+                if name == "run_hours":
+                    self.counters[name] += dt / 3600
+                else:
+                    self.counters[name] += rng.integers(1, 6, n)
+                values[name] = np.round(self.counters[name], 2)
+                continue
+            
+            drift = np.clip(self.drift_rate[name] * elapsed, -self.drift_limit[name], self.drift_limit[name])
+            value = self.baseline[name] + drift + rng.normal(0, self.noise[name], n)
+            
+            if "anomaly_min" in config:
+                anomaly_mid = (config["anomaly_min"] + config["anomaly_max"]) / 2
+                value += (anomaly_mid - self.baseline[name]) * wear
+                forced = faulted.get(name)
+                if anomaly:
+                    forced = np.ones(n, dtype=bool)
+                if forced is not None and forced.any():
+                    value = np.where(
+                        forced, rng.uniform(config["anomaly_min"], config["anomaly_max"], n), value
+                    )
+            else:
+                # Worn equipment draws more power / runs hotter
+                value *= 1 + 0.1 * wear
+            
+            values[name] = np.round(value, 2)
+        return values
+
+
+class FleetModel:
+    """Vectorized telemetry for a set of asset topics {site}/{type}/{n}."""
+    
+    def __init__(self, topics, equipment, seed=None, drift_per_day=0.02,
+                 degradation_fraction=0.0, degradation_hours=24.0, faults=()):
+        self.rng = np.random.default_rng(seed)
+        by_type = {}
+        for topic in topics:
+            by_type.setdefault(topic.split("/")[1], []).append(topic)
+        self.groups = {
+            asset_type: AssetGroup(
+                group_topics, equipment[asset_type]["metrics"], self.rng,
+                drift_per_day, degradation_fraction, degradation_hours
+            )
+            for asset_type, group_topics in by_type.items()
+        }
+        self.faults = [
+            fault for fault in faults
+            if any(group.add_fault(fault) for group in self.groups.values())
+        ]
+    
+    @property
+    def degrading_topics(self):
+        """Topics of the assets following a degradation curve."""
+        return [
+            topic
+            for group in self.groups.values()
+            for topic, degrading in zip(group.topics, group.degrading)
+            if degrading
+        ]
+    
+    def tick(self, elapsed, dt, anomaly=False):
+        """Metric arrays per asset type for one tick."""
+        return {
+            asset_type: group.tick(self.rng, elapsed, dt, anomaly)
+            for asset_type, group in self.groups.items()
+        }
+    
+    def samples(self, values):
+        """Yield (topic, metrics dict) per asset from a tick's arrays."""
+        for asset_type, metrics in values.items():
+            names = list(metrics)
+            columns = [metrics[name].tolist() for name in names]
+            for topic, row in zip(self.groups[asset_type].topics, zip(*columns)):
+                yield topic, dict(zip(names, row))
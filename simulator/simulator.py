@@ -2,33 +2,84 @@
 Sensor Simulator for Maintenance 4.0 Platform
 
 Generates realistic telemetry data for HVAC, CHILLER, and ELEVATOR equipment.
-Publishes data to MQTT broker.
+Publishes data to MQTT broker, as JSON or the compact binary encoding
+of telemetry_codec.py (PAYLOAD_ENCODING).
+
+Fleet size and load: SITE_COUNT sites (cas-s1..cas-sN) with
+ASSETS_PER_TYPE assets of each type, published on {site}/{type}/{n}.
+Messages are paced by a token bucket at TARGET_RATE messages/second
+(default: every asset once per INTERVAL_SECONDS) and the fleet is split
+across SIM_PROCESSES processes, each with its own MQTT client. Use
+database/seed_fleet.sql to register the same fleet in PostgreSQL.
+
+Values come from the vectorized fleet model (fleet_model.py): per-asset
+drift and noise, DEGRADATION_FRACTION of assets wearing out over
+DEGRADATION_HOURS, and scheduled faults for specific assets (FAULTS).
+
+Record and replay (telemetry_log.py): RECORD_FILE saves every published
+message; SIM_MODE=replay re-publishes the logs matching REPLAY_FILE with
+their original inter-arrival timing, REPLAY_SPEED times faster (0 = as
+fast as possible), so benchmark runs see identical workloads.
 """
 
 import os
-import json
+import glob
 import time
-import random
+import signal
 import logging
+import multiprocessing
 from datetime import datetime
 
 import paho.mqtt.client as mqtt
 
+from fleet_model import FleetModel, parse_faults
+from telemetry_codec import ENCODINGS, encode_payload
+from telemetry_log import TelemetryLog, TelemetryRecorder
+
 # Configuration
 MQTT_BROKER = os.getenv("MQTT_BROKER", "localhost")
 MQTT_PORT = int(os.getenv("MQTT_PORT", 1883))
 INTERVAL_SECONDS = int(os.getenv("INTERVAL_SECONDS", 10))
+# Fleet: sites cas-s1..cas-sN with ASSETS_PER_TYPE assets of each type
+SITE_COUNT = int(os.getenv("SITE_COUNT", 2))
+ASSETS_PER_TYPE = int(os.getenv("ASSETS_PER_TYPE", 1))
+# Messages/second over the whole fleet (0: each asset once per INTERVAL_SECONDS)
+TARGET_RATE = float(os.getenv("TARGET_RATE", 0))
+# Publisher processes, each with its own MQTT client and share of the fleet
+SIM_PROCESSES = int(os.getenv("SIM_PROCESSES", 1))
+STATS_INTERVAL_SECONDS = int(os.getenv("STATS_INTERVAL_SECONDS", 30))
+
+# Fleet model: random seed (empty = random), sensor drift as a fraction of
+# the normal range per day, share of assets degrading over DEGRADATION_HOURS
+SIM_SEED = os.getenv("SIM_SEED", "")
+DRIFT_PER_DAY = float(os.getenv("DRIFT_PER_DAY", 0.02))
+DEGRADATION_FRACTION = float(os.getenv("DEGRADATION_FRACTION", 0))
+DEGRADATION_HOURS = float(os.getenv("DEGRADATION_HOURS", 24))
+# Scheduled faults: "topic[:metric]@start+duration,..." in seconds from start
+FAULTS = parse_faults(os.getenv("FAULTS", ""))
 SIMULATE_ANOMALY = os.getenv("SIMULATE_ANOMALY", "false").lower() == "true"
+# "generate" (fleet model) or "replay" (re-publish recorded logs)
+SIM_MODE = os.getenv("SIM_MODE", "generate")
+# Record published messages (one log per process: <file>.<n> with SIM_PROCESSES > 1)
+RECORD_FILE = os.getenv("RECORD_FILE", "")
+# Logs to replay (glob, one process per file), speed factor (0 = max), loop forever
+REPLAY_FILE = os.getenv("REPLAY_FILE", "")
+REPLAY_SPEED = float(os.getenv("REPLAY_SPEED", 1))
+REPLAY_LOOP = os.getenv("REPLAY_LOOP", "false").lower() == "true"
+# Payload encoding: "json" or "msgpack" (compact binary)
+PAYLOAD_ENCODING = os.getenv("PAYLOAD_ENCODING", "json")
+if PAYLOAD_ENCODING not in ENCODINGS:
+    raise ValueError(f"PAYLOAD_ENCODING must be one of {ENCODINGS}, got {PAYLOAD_ENCODING!r}")
 
 # Logging
 logging.basicConfig(
     level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    format="%(asctime)s - %(name)s - %(processName)s - %(levelname)s - %(message)s"
 )
 logger = logging.getLogger("simulator")
 
 # Equipment definitions
-SITES = ["cas-s1", "cas-s2"]
+SITES = [f"cas-s{i}" for i in range(1, SITE_COUNT + 1)]
 
 EQUIPMENT = {
     "hvac": {
@@ -57,48 +108,61 @@ EQUIPMENT = {
     }
 }
 
-# State for cumulative metrics
-cumulative_state = {}
+def fleet_topics():
+    """All asset topics of the simulated fleet, as {site}/{type}/{n}."""
+    return [
+        f"{site}/{asset_type}/{n}"
+        for site in SITES
+        for asset_type in EQUIPMENT
+        for n in range(1, ASSETS_PER_TYPE + 1)
+    ]
 
 
-def init_cumulative_state():
-    """Initialize cumulative metrics with random starting values."""
-    global cumulative_state
-    for site in SITES:
-        cumulative_state[site] = {
-            "chiller": {"run_hours": random.uniform(100, 400)},
-            "elevator": {"door_cycles": random.randint(50000, 90000)}
-        }
+def fleet_rate(asset_count):
+    """Messages/second for the whole fleet."""
+    return TARGET_RATE if TARGET_RATE > 0 else asset_count / INTERVAL_SECONDS
 
 
-def generate_metric_value(metric_config, is_anomaly=False):
-    """Generate a realistic metric value."""
-    if is_anomaly and "anomaly_min" in metric_config:
-        return round(random.uniform(metric_config["anomaly_min"], metric_config["anomaly_max"]), 2)
-    return round(random.uniform(metric_config["min"], metric_config["max"]), 2)
-
-
-def generate_telemetry(site, asset_type, asset_id, is_anomaly=False):
-    """Generate telemetry payload for an asset."""
-    equipment_config = EQUIPMENT[asset_type]
-    metrics = {}
-    
-    for metric_name, metric_config in equipment_config["metrics"].items():
-        if metric_config.get("cumulative"):
-            # Update cumulative value
-            if asset_type in cumulative_state[site]:
-                if metric_name == "run_hours":
-                    cumulative_state[site][asset_type][metric_name] += INTERVAL_SECONDS / 3600
-                elif metric_name == "door_cycles":
-                    cumulative_state[site][asset_type][metric_name] += random.randint(1, 5)
-                metrics[metric_name] = round(cumulative_state[site][asset_type][metric_name], 2)
-        else:
-            metrics[metric_name] = generate_metric_value(metric_config, is_anomaly)
-    
-    return {
-        "timestamp": datetime.utcnow().isoformat() + "Z",
-        "metrics": metrics
-    }
+class TokenBucket:
+    """Paces messages at a steady rate, allowing bursts of up to `burst`."""
+    
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate / 10)
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+    
+    def take(self, n=1):
+        """Block until n tokens are available, then consume them."""
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= n:
+                self.tokens -= n
+                return
+            time.sleep((n - self.tokens) / self.rate)
+
+
+class PublishStats:
+    """Counts published messages and logs the rate every STATS_INTERVAL_SECONDS."""
+    
+    def __init__(self):
+        self.published = 0
+        self.last_published = 0
+        self.last_report = time.monotonic()
+    
+    def report(self, detail=""):
+        """Log the publish rate if the reporting interval has elapsed."""
+        now = time.monotonic()
+        if now - self.last_report < STATS_INTERVAL_SECONDS:
+            return
+        logger.info(
+            f"Published {self.published} messages "
+            f"({(self.published - self.last_published) / (now - self.last_report):.1f} msg/s{detail})"
+        )
+        self.last_published = self.published
+        self.last_report = now
 
 
 def on_connect(client, userdata, flags, rc):
@@ -115,19 +179,9 @@ def on_disconnect(client, userdata, rc):
         logger.warning(f"Unexpected MQTT disconnection, return code: {rc}")
 
 
-def main():
-    global SIMULATE_ANOMALY
-    
-    logger.info("Starting sensor simulator...")
-    logger.info(f"MQTT Broker: {MQTT_BROKER}:{MQTT_PORT}")
-    logger.info(f"Interval: {INTERVAL_SECONDS} seconds")
-    logger.info(f"Anomaly mode: {SIMULATE_ANOMALY}")
-    
-    # Initialize cumulative state
-    init_cumulative_state()
-    
-    # Create MQTT client
-    client = mqtt.Client(client_id="sensor-simulator")
+def connect_mqtt(client_id):
+    """Create and connect an MQTT client, retrying until the broker is up."""
+    client = mqtt.Client(client_id=client_id)
     client.on_connect = on_connect
     client.on_disconnect = on_disconnect
     
@@ -148,9 +202,41 @@ def main():
     
     # Give time for connection
     time.sleep(2)
+    return client
+
+
+def run_publisher(worker_id, topics, rate, record_path=""):
+    """Publish telemetry for a share of the fleet at `rate` messages/second."""
+    global SIMULATE_ANOMALY
+    
+    model = FleetModel(
+        topics, EQUIPMENT,
+        seed=int(SIM_SEED) + worker_id if SIM_SEED else None,
+        drift_per_day=DRIFT_PER_DAY,
+        degradation_fraction=DEGRADATION_FRACTION,
+        degradation_hours=DEGRADATION_HOURS,
+        faults=FAULTS
+    )
+    if model.faults:
+        logger.info(f"Scheduled faults: {model.faults}")
+    if model.degrading_topics:
+        logger.info(f"{len(model.degrading_topics)} degrading assets, e.g. {model.degrading_topics[:5]}")
+    
+    recorder = None
+    if record_path:
+        recorder = TelemetryRecorder(record_path)
+        logger.info(f"Recording published telemetry to {record_path}")
     
-    logger.info(f"Simulator is running. Generating data for {len(SITES)} sites...")
+    client_id = "sensor-simulator" if SIM_PROCESSES == 1 else f"sensor-simulator-{worker_id}"
+    client = connect_mqtt(client_id)
     
+    bucket = TokenBucket(rate)
+    # Each asset is sampled once per pass over the fleet share
+    started = time.monotonic()
+    last_tick = started - len(topics) / rate
+    logger.info(f"Publishing {len(topics)} assets at {rate:.1f} msg/s")
+    
+    stats = PublishStats()
     try:
         while True:
             # Check for anomaly mode change via environment
@@ -159,23 +245,126 @@ def main():
                 SIMULATE_ANOMALY = current_anomaly
                 logger.info(f"Anomaly mode changed to: {SIMULATE_ANOMALY}")
             
-            for site in SITES:
-                for asset_type in EQUIPMENT.keys():
-                    # Generate and publish telemetry
-                    topic = f"{site}/{asset_type}/1"
-                    payload = generate_telemetry(site, asset_type, 1, SIMULATE_ANOMALY)
-                    
-                    client.publish(topic, json.dumps(payload))
-                    logger.debug(f"Published to {topic}: {payload}")
+            now = time.monotonic()
+            values = model.tick(now - started, now - last_tick, SIMULATE_ANOMALY)
+            last_tick = now
+            
+            for topic, metrics in model.samples(values):
+                bucket.take()
+                payload = {"timestamp": datetime.utcnow().isoformat() + "Z", "metrics": metrics}
+                data = encode_payload(payload, PAYLOAD_ENCODING)
+                client.publish(topic, data)
+                if recorder:
+                    recorder.record(time.monotonic() - started, topic, data)
+                stats.published += 1
             
-            logger.info(f"Published telemetry for all assets (anomaly={SIMULATE_ANOMALY})")
-            time.sleep(INTERVAL_SECONDS)
+            stats.report(f", anomaly={SIMULATE_ANOMALY}")
+    
+    except KeyboardInterrupt:
+        logger.info("Shutting down...")
+    finally:
+        if recorder:
+            recorder.close()
+            logger.info(f"Recorded {recorder.messages} messages to {recorder.path}")
+        client.loop_stop()
+        client.disconnect()
+
+
+def run_replay(worker_id, path):
+    """Re-publish a recorded log with its original timing scaled by REPLAY_SPEED."""
+    log = TelemetryLog(path)
+    client = connect_mqtt(f"sensor-simulator-replay-{worker_id}")
+    logger.info(f"Replaying {path} at {'max speed' if REPLAY_SPEED <= 0 else f'{REPLAY_SPEED}x'}")
+    
+    stats = PublishStats()
+    try:
+        while True:
+            started = time.monotonic()
+            for offset, topic, payload in log:
+                if REPLAY_SPEED > 0:
+                    delay = started + offset / REPLAY_SPEED - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                client.publish(topic, payload)
+                stats.published += 1
+                if stats.published % 1000 == 0:
+                    stats.report()
             
+            logger.info(f"Replay of {path} finished after {time.monotonic() - started:.1f}s ({stats.published} messages)")
+            if not REPLAY_LOOP:
+                break
+    
     except KeyboardInterrupt:
         logger.info("Shutting down...")
     finally:
+        # Let paho flush queued messages before disconnecting
+        time.sleep(1)
         client.loop_stop()
         client.disconnect()
+        log.close()
+
+
+def run_processes(target, args_list):
+    """Run target once per argument tuple, in worker processes when more than one."""
+    if len(args_list) == 1:
+        target(*args_list[0])
+        return
+    
+    processes = [
+        multiprocessing.Process(target=target, args=args, name=f"publisher-{args[0]}")
+        for args in args_list
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        logger.info("Shutting down...")
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+
+
+def handle_sigterm(signum, frame):
+    """Stop like Ctrl-C on docker stop so recordings are flushed."""
+    raise KeyboardInterrupt
+
+
+def main():
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    
+    logger.info("Starting sensor simulator...")
+    logger.info(f"MQTT Broker: {MQTT_BROKER}:{MQTT_PORT}")
+    
+    if SIM_MODE == "replay":
+        paths = sorted(glob.glob(REPLAY_FILE))
+        if not paths:
+            raise Exception(f"No telemetry logs match REPLAY_FILE={REPLAY_FILE!r}")
+        run_processes(run_replay, list(enumerate(paths)))
+        return
+    
+    logger.info(f"Anomaly mode: {SIMULATE_ANOMALY}")
+    logger.info(f"Payload encoding: {PAYLOAD_ENCODING}")
+    
+    topics = fleet_topics()
+    rate = fleet_rate(len(topics))
+    logger.info(
+        f"Fleet: {len(SITES)} sites x {len(EQUIPMENT)} types x {ASSETS_PER_TYPE} assets = {len(topics)} assets, "
+        f"{rate:.1f} msg/s over {SIM_PROCESSES} process(es)"
+    )
+    
+    process_count = min(SIM_PROCESSES, len(topics))
+    run_processes(run_publisher, [
+        (
+            worker_id,
+            topics[worker_id::process_count],
+            rate / process_count,
+            f"{RECORD_FILE}.{worker_id}" if RECORD_FILE and process_count > 1 else RECORD_FILE
+        )
+        for worker_id in range(process_count)
+    ])
 
 
 if __name__ == "__main__":
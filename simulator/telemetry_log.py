@@ -0,0 +1,93 @@
+"""
+Compact on-disk log of published telemetry, for deterministic replays.
+
+File layout: the header b"TLOG" + version byte, then records of two kinds:
+
+- topic:   0x00, topic_id u32, length u16, topic bytes
+- message: 0x01, offset_us u64, topic_id u32, length u32, payload bytes
+
+Topics are written once and referenced by id; offset_us is the time since
+recording started. Payloads are stored exactly as published (JSON or the
+compact binary encoding). TelemetryLog memory-maps a log for replay.
+"""
+
+import mmap
+import struct
+
+MAGIC = b"TLOG"
+VERSION = 1
+
+TOPIC = 0
+MESSAGE = 1
+
+_HEADER = struct.Struct("<4sB")
+_TOPIC = struct.Struct("<BIH")
+_MESSAGE = struct.Struct("<BQII")
+
+
+class TelemetryRecorder:
+    """Appends published messages to a telemetry log."""
+    
+    def __init__(self, path, buffer_bytes=1024 * 1024):
+        self.path = path
+        self.file = open(path, "wb", buffering=buffer_bytes)
+        self.file.write(_HEADER.pack(MAGIC, VERSION))
+        self.topic_ids = {}
+        self.messages = 0
+    
+    def record(self, offset_seconds, topic, payload):
+        """Append one message published offset_seconds after recording started."""
+        topic_id = self.topic_ids.get(topic)
+        if topic_id is None:
+            topic_id = self.topic_ids[topic] = len(self.topic_ids)
+            encoded = topic.encode()
+            self.file.write(_TOPIC.pack(TOPIC, topic_id, len(encoded)) + encoded)
+        self.file.write(_MESSAGE.pack(MESSAGE, int(offset_seconds * 1_000_000), topic_id, len(payload)))
+        self.file.write(payload)
+        self.messages += 1
+    
+    def close(self):
+        """Flush and close the log."""
+        self.file.close()
+
+
+class TelemetryLog:
+    """Read-only, memory-mapped view of a telemetry log."""
+    
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = _HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.map.close()
+            raise ValueError(f"{path} is not a version {VERSION} telemetry log")
+    
+    def __iter__(self):
+        """Yield (offset_seconds, topic, payload) in recording order."""
+        data = self.map
+        topics = {}
+        position = _HEADER.size
+        end = len(data)
+        while position < end:
+            kind = data[position]
+            record = _TOPIC if kind == TOPIC else _MESSAGE
+            if position + record.size > end:
+                break  # truncated tail, e.g. recorder killed mid-write
+            if kind == TOPIC:
+                _, topic_id, length = record.unpack_from(data, position)
+            else:
+                _, offset_us, topic_id, length = record.unpack_from(data, position)
+            position += record.size
+            if position + length > end:
+                break
+            
+            if kind == TOPIC:
+                topics[topic_id] = data[position:position + length].decode()
+            else:
+                yield offset_us / 1_000_000, topics[topic_id], data[position:position + length]
+            position += length
+    
+    def close(self):
+        """Unmap the log."""
+        self.map.close()